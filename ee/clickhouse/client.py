@@ -1,13 +1,19 @@
 import asyncio
 import hashlib
 import json
-from time import time
-from typing import Any, List, Tuple
+import pickle
+import zlib
+from contextlib import contextmanager
+from time import sleep, time
+from typing import Any, Iterator, List, Optional, Tuple
+from uuid import uuid4
 
 import sqlparse
+import statsd
 from aioch import Client
 from asgiref.sync import async_to_sync
 from clickhouse_driver import Client as SyncClient
+from clickhouse_driver.errors import ServerException
 from clickhouse_pool import ChPool
 from django.conf import settings
 
@@ -18,14 +24,27 @@ from posthog.settings import (
     CLICKHOUSE_CA,
     CLICKHOUSE_DATABASE,
     CLICKHOUSE_HOST,
+    CLICKHOUSE_MAX_CONCURRENT_QUERIES_PER_TEAM,
+    CLICKHOUSE_MAX_EXECUTION_TIME,
     CLICKHOUSE_PASSWORD,
     CLICKHOUSE_SECURE,
+    CLICKHOUSE_STREAMING_BLOCK_SIZE,
     CLICKHOUSE_VERIFY,
     PRIMARY_DB,
+    STATSD_PREFIX,
     TEST,
 )
 
 CACHE_TTL = 60  # seconds
+# For how long after CACHE_TTL cached results are still served, while one caller refreshes them
+CACHE_STALE_TTL = 300  # seconds
+
+# Sorted set of query ids currently running for a team, scored by start time
+TEAM_RUNNING_QUERIES_KEY = "clickhouse_running_queries_team_{team_id}"
+
+
+class TooManyConcurrentQueries(Exception):
+    pass
 
 
 if PRIMARY_DB != CLICKHOUSE:
@@ -35,10 +54,16 @@ if PRIMARY_DB != CLICKHOUSE:
     def async_execute(query, args=None):
         return
 
-    def sync_execute(query, args=None):
+    def sync_execute(query, args=None, team_id=None, query_id=None):
         return
 
-    def cache_sync_execute(query, args=None, redis_client=None, ttl=None):
+    def sync_execute_iter(query, args=None, team_id=None):
+        return iter(())
+
+    def cancel_query(query_id):
+        return
+
+    def cache_sync_execute(query, args=None, redis_client=None, ttl=CACHE_TTL):
         return
 
 
@@ -85,39 +110,150 @@ else:
     )
 
     def cache_sync_execute(query, args=None, redis_client=None, ttl=CACHE_TTL):
+        """
+        Run a query, caching the result in Redis for ttl seconds.
+
+        Only one caller runs a query at a time: others wait for its result, or get the previous result if there is one
+        that expired less than CACHE_STALE_TTL seconds ago.
+        """
         if not redis_client:
             redis_client = redis.get_client()
         key = _key_hash(query, args)
-        if redis_client.exists(key):
-            result = _deserialize(redis_client.get(key))
-            return result
+        lock_key = key + b"_lock"
+        counter = statsd.Counter("%s_posthog_clickhouse_cache" % (STATSD_PREFIX,))
+
+        cached = redis_client.get(key)
+        if cached is not None:
+            result, fresh_until = _deserialize(cached)
+            if fresh_until >= time():
+                counter.increment("hit")
+                return result
+            if not redis_client.set(lock_key, 1, nx=True, ex=CLICKHOUSE_MAX_EXECUTION_TIME):
+                counter.increment("stale")
+                return result
         else:
+            counter.increment("miss")
+            deadline = time() + CLICKHOUSE_MAX_EXECUTION_TIME
+            while not redis_client.set(lock_key, 1, nx=True, ex=CLICKHOUSE_MAX_EXECUTION_TIME):
+                # Someone else is running the query already, wait for their result
+                sleep(0.1)
+                cached = redis_client.get(key)
+                if cached is not None:
+                    return _deserialize(cached)[0]
+                if time() > deadline:
+                    break
+
+        try:
             result = sync_execute(query, args)
-            redis_client.set(key, _serialize(result), ex=ttl)
-            return result
+            redis_client.set(key, _serialize(result, time() + ttl), ex=ttl + CACHE_STALE_TTL)
+        finally:
+            redis_client.delete(lock_key)
+        return result
+
+    def sync_execute(query, args=None, team_id=None, query_id=None):
+        """
+        Run a query, cancelling it if we stop waiting for the result for any reason other than an error from ClickHouse
+        (e.g. the worker handling an abandoned request gets killed).
+
+        Analytical reads on behalf of a team pass its team_id: they're tagged with a query id starting with it,
+        limited to CLICKHOUSE_MAX_EXECUTION_TIME seconds, and only CLICKHOUSE_MAX_CONCURRENT_QUERIES_PER_TEAM of them
+        run for a single team at once. Other queries, e.g. ingestion writes, are never throttled or cut short.
+        """
+        if query_id is None:
+            query_id = "{}_{}".format(team_id, uuid4().hex) if team_id is not None else uuid4().hex
 
-    def sync_execute(query, args=None):
         start_time = time()
+        running = False
         try:
-            with ch_sync_pool.get_client() as client:
-                result = client.execute(query, args)
+            with _team_query_slot(team_id, query_id), ch_sync_pool.get_client() as client:
+                running = True
+                try:
+                    result = client.execute(
+                        query,
+                        args,
+                        query_id=query_id,
+                        settings={"max_execution_time": CLICKHOUSE_MAX_EXECUTION_TIME} if team_id is not None else None,
+                    )
+                except ServerException:
+                    running = False
+                    raise
+                running = False
         finally:
+            if running:
+                cancel_query(query_id)
             execution_time = time() - start_time
             if settings.SHELL_PLUS_PRINT_SQL:
                 print(format_sql(query, args))
                 print("Execution time: %.6fs" % (execution_time,))
         return result
 
+    def sync_execute_iter(query, args=None, team_id=None):
+        """
+        Stream the rows of a query block by block, e.g. for exports too large to keep in memory.
+
+        The query is cancelled if iteration stops before the last row.
+        """
+        query_id = "{}_{}".format(team_id, uuid4().hex) if team_id is not None else uuid4().hex
+
+        with ch_sync_pool.get_client() as client:
+            finished = False
+            try:
+                yield from client.execute_iter(
+                    query, args, query_id=query_id, settings={"max_block_size": CLICKHOUSE_STREAMING_BLOCK_SIZE}
+                )
+                finished = True
+            finally:
+                if not finished:
+                    # The connection still has the rest of the result coming, so it can't be reused
+                    client.disconnect()
+                    cancel_query(query_id)
+
+    def cancel_query(query_id):
+        try:
+            with ch_sync_pool.get_client() as client:
+                client.execute("KILL QUERY WHERE query_id = %(query_id)s ASYNC", {"query_id": query_id})
+        except Exception:
+            pass
+
+    @contextmanager
+    def _team_query_slot(team_id: Optional[int], query_id: str) -> Iterator[None]:
+        if team_id is None:
+            yield
+            return
+
+        redis_client = redis.get_client()
+        key = TEAM_RUNNING_QUERIES_KEY.format(team_id=team_id)
+        deadline = time() + CLICKHOUSE_MAX_EXECUTION_TIME
+        while True:
+            now = time()
+            pipeline = redis_client.pipeline()
+            # Entries of processes that died without cleaning up can't be running anymore after the max execution time
+            pipeline.zremrangebyscore(key, 0, now - CLICKHOUSE_MAX_EXECUTION_TIME)
+            pipeline.zadd(key, {query_id: now})
+            pipeline.zrank(key, query_id)
+            pipeline.expire(key, CLICKHOUSE_MAX_EXECUTION_TIME)
+            rank = pipeline.execute()[2]
+            if rank is not None and rank < CLICKHOUSE_MAX_CONCURRENT_QUERIES_PER_TEAM:
+                break
+            redis_client.zrem(key, query_id)
+            if now > deadline:
+                raise TooManyConcurrentQueries("Too many queries running for team {}".format(team_id))
+            sleep(0.1)
+
+        try:
+            yield
+        finally:
+            redis_client.zrem(key, query_id)
+
 
-def _deserialize(result_bytes: bytes) -> List[Tuple]:
-    results = []
-    for x in json.loads(result_bytes):
-        results.append(tuple(x))
-    return results
+def _deserialize(result_bytes: bytes) -> Tuple[List[Tuple], float]:
+    """Returns the cached result and the timestamp until which it is fresh."""
+    return pickle.loads(zlib.decompress(result_bytes))
 
 
-def _serialize(result: Any) -> bytes:
-    return json.dumps(result).encode("utf-8")
+def _serialize(result: Any, fresh_until: float) -> bytes:
+    # Pickle keeps datetimes, UUIDs etc as they come from clickhouse-driver
+    return zlib.compress(pickle.dumps((result, fresh_until), protocol=pickle.HIGHEST_PROTOCOL))
 
 
 def _key_hash(query: str, args: Any) -> bytes:
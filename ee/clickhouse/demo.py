@@ -9,7 +9,6 @@ from django.utils.timezone import now
 
 from ee.clickhouse.models.clickhouse import generate_clickhouse_uuid
 from ee.clickhouse.models.event import create_event
-from ee.clickhouse.models.person import update_person_is_identified, update_person_properties
 from posthog.models import Team
 from posthog.models.element import Element
 from posthog.models.person import Person
@@ -43,8 +42,9 @@ def create_anonymous_users_ch(team: Team, base_url: str) -> None:
 
         if index % 3 == 0:
 
-            update_person_properties(team_id=team.pk, id=person.uuid, properties=demo_data[demo_data_index])
-            update_person_is_identified(team_id=team.pk, id=person.uuid, is_identified=True)
+            person.properties = demo_data[demo_data_index]
+            person.is_identified = True
+            person.save()
             demo_data_index += 1
 
             create_event(
@@ -0,0 +1,72 @@
+import hashlib
+import re
+from collections import Counter
+from time import time
+from typing import Dict, List, Tuple
+
+from ee.clickhouse.client import sync_execute
+from ee.clickhouse.sql.events import (
+    GET_MATERIALIZED_COLUMNS_SQL,
+    MATERIALIZE_PROPERTY_COLUMN_SQL,
+    MATERIALIZED_COLUMN_INDEX_SQL,
+)
+from posthog.models.team import Team
+
+MATERIALIZED_COLUMN_COMMENT_PREFIX = "column_materializer::"
+
+# How many event properties get their own column at most
+MAX_MATERIALIZED_COLUMNS = 20
+
+MATERIALIZED_COLUMNS_CACHE_TTL = 60  # seconds
+_materialized_columns: Tuple[Dict[str, str], float] = ({}, 0)
+
+
+def get_materialized_columns() -> Dict[str, str]:
+    """Property key -> name of the events column the property is materialized in."""
+    global _materialized_columns
+
+    columns, expires_at = _materialized_columns
+    if expires_at < time():
+        columns = {
+            comment[len(MATERIALIZED_COLUMN_COMMENT_PREFIX) :]: column_name
+            for column_name, comment in sync_execute(
+                GET_MATERIALIZED_COLUMNS_SQL, {"comment_prefix": MATERIALIZED_COLUMN_COMMENT_PREFIX + "%"}
+            )
+        }
+        _materialized_columns = (columns, time() + MATERIALIZED_COLUMNS_CACHE_TTL)
+    return columns
+
+
+def materialize(property_key: str) -> str:
+    column_name = materialized_column_name(property_key)
+    sync_execute(
+        MATERIALIZE_PROPERTY_COLUMN_SQL.format(column_name=column_name),
+        {"property": property_key, "comment": MATERIALIZED_COLUMN_COMMENT_PREFIX + property_key},
+    )
+    sync_execute(MATERIALIZED_COLUMN_INDEX_SQL.format(column_name=column_name))
+    global _materialized_columns
+    _materialized_columns = ({}, 0)
+    return column_name
+
+
+def materialized_column_name(property_key: str) -> str:
+    # Keys like "$browser" and "_browser" sanitize to the same name, the hash of the key tells them apart
+    key_hash = hashlib.sha1(property_key.encode("utf-8")).hexdigest()[:8]
+    return "mat_{}_{}".format(re.sub("[^a-zA-Z0-9_]", "_", property_key), key_hash)
+
+
+def get_most_filtered_properties(limit: int = MAX_MATERIALIZED_COLUMNS) -> List[str]:
+    """Event properties used in the most dashboard filters across all teams, see calculate_event_property_usage."""
+    usage: Counter = Counter()
+    for properties in Team.objects.values_list("event_properties_with_usage", flat=True).iterator():
+        for prop in properties or []:
+            if prop.get("usage_count"):
+                usage[prop["key"]] += prop["usage_count"]
+    return [key for key, _ in usage.most_common(limit)]
+
+
+def materialize_most_filtered_properties() -> None:
+    materialized = get_materialized_columns()
+    to_materialize = [key for key in get_most_filtered_properties() if key not in materialized]
+    for property_key in to_materialize[: max(MAX_MATERIALIZED_COLUMNS - len(materialized), 0)]:
+        materialize(property_key)
@@ -0,0 +1,8 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.events import EVENTS_ELEMENTS_CHAIN_INDEX_SQL, EVENTS_EVENT_INDEX_SQL
+
+operations = [
+    migrations.RunSQL(EVENTS_ELEMENTS_CHAIN_INDEX_SQL),
+    migrations.RunSQL(EVENTS_EVENT_INDEX_SQL),
+]
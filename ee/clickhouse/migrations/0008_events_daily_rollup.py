@@ -0,0 +1,13 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.events import (
+    BACKFILL_EVENTS_DAILY_ROLLUP_SQL,
+    EVENTS_DAILY_ROLLUP_MV_SQL,
+    EVENTS_DAILY_ROLLUP_TABLE_SQL,
+)
+
+operations = [
+    migrations.RunSQL(EVENTS_DAILY_ROLLUP_TABLE_SQL),
+    migrations.RunSQL(EVENTS_DAILY_ROLLUP_MV_SQL),
+    migrations.RunSQL(BACKFILL_EVENTS_DAILY_ROLLUP_SQL),
+]
@@ -0,0 +1,27 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.person import PERSON_DICTIONARY_SQL, PERSON_DISTINCT_ID_DICTIONARY_SQL
+
+# The views as of this migration, before 0010 added versions to person and person_distinct_id. 0010 recreates them
+# from the current definitions in ee/clickhouse/sql/person.py
+
+PERSON_DISTINCT_ID_LATEST_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS person_distinct_id_latest AS
+SELECT team_id, distinct_id, argMax(person_id, _timestamp) AS person_id
+FROM person_distinct_id
+GROUP BY team_id, distinct_id
+"""
+
+PERSON_LATEST_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS person_latest AS
+SELECT id, argMax(team_id, _timestamp) AS team_id, argMax(properties, _timestamp) AS properties
+FROM person
+GROUP BY id
+"""
+
+operations = [
+    migrations.RunSQL(PERSON_DISTINCT_ID_LATEST_VIEW_SQL),
+    migrations.RunSQL(PERSON_LATEST_VIEW_SQL),
+    migrations.RunSQL(PERSON_DISTINCT_ID_DICTIONARY_SQL),
+    migrations.RunSQL(PERSON_DICTIONARY_SQL),
+]
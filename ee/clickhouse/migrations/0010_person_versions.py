@@ -0,0 +1,37 @@
+from infi.clickhouse_orm import migrations
+
+from ee.clickhouse.sql.person import (
+    BACKFILL_PERSONS_DISTINCT_ID_VERSIONED_SQL,
+    BACKFILL_PERSONS_VERSIONED_SQL,
+    DROP_PERSON_DICTIONARIES_SQL,
+    DROP_PERSONS_KAFKA_TABLES_SQL,
+    KAFKA_PERSONS_DISTINCT_ID_TABLE_SQL,
+    KAFKA_PERSONS_TABLE_SQL,
+    PERSON_DICTIONARY_SQL,
+    PERSON_DISTINCT_ID_DICTIONARY_SQL,
+    PERSON_DISTINCT_ID_LATEST_VIEW_SQL,
+    PERSON_LATEST_VIEW_SQL,
+    PERSONS_DISTINCT_ID_TABLE_MV_SQL,
+    PERSONS_DISTINCT_ID_VERSIONED_TMP_TABLE_SQL,
+    PERSONS_TABLE_MV_SQL,
+    PERSONS_VERSIONED_TMP_TABLE_SQL,
+    SWAP_PERSONS_VERSIONED_TABLES_SQL,
+)
+
+operations = [
+    *[migrations.RunSQL(sql) for sql in DROP_PERSONS_KAFKA_TABLES_SQL],
+    *[migrations.RunSQL(sql) for sql in DROP_PERSON_DICTIONARIES_SQL],
+    migrations.RunSQL(PERSONS_VERSIONED_TMP_TABLE_SQL),
+    migrations.RunSQL(PERSONS_DISTINCT_ID_VERSIONED_TMP_TABLE_SQL),
+    migrations.RunSQL(BACKFILL_PERSONS_VERSIONED_SQL),
+    migrations.RunSQL(BACKFILL_PERSONS_DISTINCT_ID_VERSIONED_SQL),
+    migrations.RunSQL(SWAP_PERSONS_VERSIONED_TABLES_SQL),
+    migrations.RunSQL(KAFKA_PERSONS_TABLE_SQL),
+    migrations.RunSQL(KAFKA_PERSONS_DISTINCT_ID_TABLE_SQL),
+    migrations.RunSQL(PERSONS_TABLE_MV_SQL),
+    migrations.RunSQL(PERSONS_DISTINCT_ID_TABLE_MV_SQL),
+    migrations.RunSQL(PERSON_DISTINCT_ID_LATEST_VIEW_SQL),
+    migrations.RunSQL(PERSON_LATEST_VIEW_SQL),
+    migrations.RunSQL(PERSON_DISTINCT_ID_DICTIONARY_SQL),
+    migrations.RunSQL(PERSON_DICTIONARY_SQL),
+]
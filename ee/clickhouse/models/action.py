@@ -8,6 +8,8 @@ from posthog.models import Action, Filter
 from posthog.models.action_step import ActionStep
 from posthog.models.event import Selector
 
+REGEX_SPECIAL_CHARACTERS = set(".^$*+?{}[]\\|()")
+
 
 def format_action_filter(action: Action, prepend: str = "", index=0, use_loop: bool = False) -> Tuple[str, Dict]:
     # get action steps
@@ -35,7 +37,9 @@ def format_action_filter(action: Action, prepend: str = "", index=0, use_loop: b
             from ee.clickhouse.models.property import parse_prop_clauses
 
             prop_query, prop_params = parse_prop_clauses(
-                Filter(data={"properties": step.properties}).properties, action.team.pk
+                Filter(data={"properties": step.properties}).properties,
+                action.team.pk,
+                prepend="action_props_{}{}".format(index, prepend),
             )
             conditions.append(prop_query.replace("AND", "", 1))
             params = {**params, **prop_params}
@@ -94,24 +98,55 @@ def _create_regex(selector: Selector) -> str:
     return regex
 
 
+def _required_substrings(selector: Selector) -> List[str]:
+    """Literal parts of the selector that any elements_chain matching _create_regex(selector) has to contain."""
+    substrings = []
+    for tag in selector.parts:
+        tag_name = tag.data.get("tag_name")
+        if tag_name and isinstance(tag_name, str) and _is_literal(tag_name):
+            substrings.append(tag_name)
+        for class_name in tag.data.get("attr_class__contains", []):
+            if _is_literal(class_name):
+                substrings.append(".{}".format(class_name))
+        for key, value in tag.ch_attributes.items():
+            if _is_literal(key) and _is_literal(str(value)):
+                substrings.append('{}="{}"'.format(key, value))
+    return substrings
+
+
+def _is_literal(pattern: str) -> bool:
+    # Anything the regex would interpret as something other than itself can't be required literally
+    return not REGEX_SPECIAL_CHARACTERS.intersection(pattern)
+
+
+def _like_contains(value: str) -> str:
+    return "%{}%".format(value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+
+
 def filter_element(step: ActionStep, prepend: str = "") -> Tuple[List[str], Dict]:
     filters = model_to_dict(step)
     params = {}
     conditions = []
+    # LIKE conditions that are implied by the regexes, but can make use of the elements_chain skip index
+    required_substrings: List[str] = []
 
     if filters.get("selector"):
         selector = Selector(filters["selector"], escape_slashes=False)
         params["{}selector_regex".format(prepend)] = _create_regex(selector)
         conditions.append("match(elements_chain, %({}selector_regex)s)".format(prepend))
+        required_substrings += _required_substrings(selector)
 
     if filters.get("tag_name"):
         params["{}tag_name_regex".format(prepend)] = r"(^|;){}(\.|$|;|:)".format(filters["tag_name"])
         conditions.append("match(elements_chain, %({}tag_name_regex)s)".format(prepend))
+        if _is_literal(filters["tag_name"]):
+            required_substrings.append(filters["tag_name"])
 
     attributes: Dict[str, str] = {}
     for key in ["href", "text"]:
         if filters.get(key):
             attributes[key] = re.escape(filters[key])
+            required_substrings.append('{}="{}"'.format(key, filters[key]))
 
     if len(attributes.keys()) > 0:
         params["{}attributes_regex".format(prepend)] = ".*?({}).*?".format(
@@ -119,4 +154,8 @@ def filter_element(step: ActionStep, prepend: str = "") -> Tuple[List[str], Dict
         )
         conditions.append("match(elements_chain, %({}attributes_regex)s)".format(prepend))
 
+    for index, substring in enumerate(required_substrings):
+        params["{}element_like_{}".format(prepend, index)] = _like_contains(substring)
+        conditions.append("elements_chain LIKE %({}element_like_{})s".format(prepend, index))
+
     return (conditions, params)
@@ -1,5 +1,8 @@
+import base64
+import binascii
 import json
 import uuid
+from datetime import datetime
 from typing import Dict, List, Optional, Tuple, Union
 
 import celery
@@ -137,6 +140,31 @@ class ClickhouseEventSerializer(serializers.Serializer):
         return event[6]
 
 
+def encode_event_cursor(timestamp: datetime, event_uuid: Union[uuid.UUID, str]) -> str:
+    """Opaque token for resuming a list of events after the event with this timestamp and uuid."""
+    timestamp = timestamp.astimezone(pytz.utc) if timestamp.tzinfo else timestamp
+    cursor = json.dumps([timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"), str(event_uuid)])
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_event_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Timestamp (in UTC) and uuid from encode_event_cursor. Raises ValueError for invalid tokens."""
+    try:
+        timestamp, event_uuid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S.%f"), uuid.UUID(event_uuid)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor {}".format(cursor))
+
+
+def event_cursor_params(timestamp: datetime, event_uuid: Union[uuid.UUID, str]) -> Dict[str, str]:
+    """Params of EVENT_CURSOR_CONDITION, for a timestamp in UTC."""
+    return {
+        "cursor_date": timestamp.strftime("%Y-%m-%d"),
+        "cursor_timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        "cursor_uuid": str(event_uuid),
+    }
+
+
 def determine_event_conditions(conditions: Dict[str, Union[str, List[str]]]) -> Tuple[str, Dict]:
     result = ""
     params: Dict[str, Union[str, List[str]]] = {}
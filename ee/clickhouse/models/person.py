@@ -1,10 +1,11 @@
 import datetime
 import json
+import time
 from typing import Any, Dict, List, Optional
 from uuid import UUID, uuid4
 
 from django.db.models.query import QuerySet
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils.timezone import now
 from rest_framework import serializers
@@ -12,8 +13,6 @@ from rest_framework import serializers
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.property import parse_prop_clauses
 from ee.clickhouse.sql.person import (
-    DELETE_PERSON_BY_ID,
-    DELETE_PERSON_DISTINCT_ID_BY_PERSON_ID,
     DELETE_PERSON_EVENTS_BY_ID,
     GET_DISTINCT_IDS_SQL,
     GET_DISTINCT_IDS_SQL_BY_ID,
@@ -23,9 +22,6 @@ from ee.clickhouse.sql.person import (
     INSERT_PERSON_DISTINCT_ID,
     INSERT_PERSON_SQL,
     PERSON_DISTINCT_ID_EXISTS_SQL,
-    UPDATE_PERSON_ATTACHED_DISTINCT_ID,
-    UPDATE_PERSON_IS_IDENTIFIED,
-    UPDATE_PERSON_PROPERTIES,
 )
 from ee.kafka_client.client import ClickhouseProducer
 from ee.kafka_client.topics import KAFKA_PERSON, KAFKA_PERSON_UNIQUE_ID
@@ -41,7 +37,7 @@ if settings.EE_AVAILABLE and is_ee_enabled():
     @receiver(post_save, sender=Person)
     def person_created(sender, instance: Person, created, **kwargs):
         create_person(
-            team_id=instance.team.pk,
+            team_id=instance.team_id,
             properties=instance.properties,
             uuid=str(instance.uuid),
             is_identified=instance.is_identified,
@@ -49,11 +45,37 @@ if settings.EE_AVAILABLE and is_ee_enabled():
 
     @receiver(post_save, sender=PersonDistinctId)
     def person_distinct_id_created(sender, instance: PersonDistinctId, created, **kwargs):
-        create_person_distinct_id(instance.pk, instance.team.pk, instance.distinct_id, str(instance.person.uuid))
+        create_person_distinct_id(instance.pk, instance.team_id, instance.distinct_id, str(instance.person.uuid))
+
+    @receiver(pre_delete, sender=Person)
+    def person_deleting(sender, instance: Person, **kwargs):
+        # The person's distinct ids are deleted along with it, before post_delete is sent. Distinct ids moved to another
+        # person while merging are saved, not deleted, so these are the only ones to mark deleted
+        instance._deleted_distinct_ids = list(  # type: ignore
+            PersonDistinctId.objects.filter(person_id=instance.pk).values_list("id", "distinct_id")
+        )
 
     @receiver(post_delete, sender=Person)
     def person_deleted(sender, instance: Person, **kwargs):
-        delete_person(instance.uuid)
+        delete_person(instance.uuid, team_id=instance.team_id)
+        for pk, distinct_id in getattr(instance, "_deleted_distinct_ids", []):
+            create_person_distinct_id(pk, instance.team_id, distinct_id, str(instance.uuid), is_deleted=True)
+
+
+_last_version = 0
+
+
+def get_version() -> int:
+    """
+    Version of a person or distinct id row inserted now. Rows with a higher version replace the ones before, so this
+    has to keep increasing across processes: microseconds since the epoch, and never the same twice in a process.
+
+    Across processes this relies on their clocks: two changes to the same person made on hosts whose clocks are
+    further apart than the time between the changes can end up applied in the wrong order.
+    """
+    global _last_version
+    _last_version = max(int(time.time() * 1_000_000), _last_version + 1)
+    return _last_version
 
 
 def create_person(
@@ -63,6 +85,7 @@ def create_person(
     sync: bool = False,
     is_identified: bool = False,
     timestamp: Optional[datetime.datetime] = None,
+    is_deleted: bool = False,
 ) -> str:
     if uuid:
         uuid = str(uuid)
@@ -77,26 +100,27 @@ def create_person(
         "properties": json.dumps(properties),
         "is_identified": int(is_identified),
         "created_at": timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        "is_deleted": int(is_deleted),
+        "version": get_version(),
     }
     p = ClickhouseProducer()
     p.produce(topic=KAFKA_PERSON, sql=INSERT_PERSON_SQL, data=data, sync=sync)
     return uuid
 
 
-def update_person_properties(team_id: int, id: str, properties: Dict) -> None:
-    sync_execute(UPDATE_PERSON_PROPERTIES, {"team_id": team_id, "id": id, "properties": json.dumps(properties)})
-
-
-def update_person_is_identified(team_id: int, id: str, is_identified: bool) -> None:
-    sync_execute(
-        UPDATE_PERSON_IS_IDENTIFIED, {"team_id": team_id, "id": id, "is_identified": "1" if is_identified else "0"}
-    )
-
-
-def create_person_distinct_id(id: int, team_id: int, distinct_id: str, person_id: str) -> None:
-    data = {"id": id, "distinct_id": distinct_id, "person_id": person_id, "team_id": team_id}
+def create_person_distinct_id(
+    id: int, team_id: int, distinct_id: str, person_id: str, is_deleted: bool = False, sync: bool = False
+) -> None:
+    data = {
+        "id": id,
+        "distinct_id": distinct_id,
+        "person_id": person_id,
+        "team_id": team_id,
+        "is_deleted": int(is_deleted),
+        "version": get_version(),
+    }
     p = ClickhouseProducer()
-    p.produce(topic=KAFKA_PERSON_UNIQUE_ID, sql=INSERT_PERSON_DISTINCT_ID, data=data)
+    p.produce(topic=KAFKA_PERSON_UNIQUE_ID, sql=INSERT_PERSON_DISTINCT_ID, data=data, sync=sync)
 
 
 def distinct_ids_exist(team_id: int, ids: List[str]) -> bool:
@@ -135,28 +159,29 @@ def merge_people(team_id: int, target: Dict, old_id: UUID, old_props: Dict) -> N
     # merge the properties
     properties = {**old_props, **target["properties"]}
 
-    update_person_properties(team_id=team_id, id=target["id"], properties=properties)
-
-    other_person_distinct_ids = sync_execute(
-        GET_DISTINCT_IDS_SQL_BY_ID, {"person_id": old_id, "team_id": target["team_id"]}
+    create_person(
+        team_id=team_id,
+        uuid=target["id"],
+        properties=properties,
+        is_identified=target["is_identified"],
+        timestamp=target["created_at"],
     )
 
+    other_person_distinct_ids = sync_execute(GET_DISTINCT_IDS_SQL_BY_ID, {"person_id": old_id, "team_id": team_id})
+
     parsed_other_person_distinct_ids = ClickhousePersonDistinctIdSerializer(other_person_distinct_ids, many=True).data
 
     for person_distinct_id in parsed_other_person_distinct_ids:
-        sync_execute(
-            UPDATE_PERSON_ATTACHED_DISTINCT_ID,
-            {"person_id": target["id"], "distinct_id": person_distinct_id["distinct_id"]},
-        )
-    delete_person(old_id)
+        create_person_distinct_id(person_distinct_id["id"], team_id, person_distinct_id["distinct_id"], target["id"])
+    delete_person(old_id, team_id=team_id)
 
 
-def delete_person(person_id: UUID, delete_events: bool = False, team_id: int = False) -> None:
+def delete_person(person_id: UUID, team_id: int, delete_events: bool = False) -> None:
+    """Marks the person deleted. Its distinct ids are marked deleted when they're deleted from Postgres."""
     if delete_events:
         sync_execute(DELETE_PERSON_EVENTS_BY_ID, {"id": person_id, "team_id": team_id})
 
-    sync_execute(DELETE_PERSON_BY_ID, {"id": person_id,})
-    sync_execute(DELETE_PERSON_DISTINCT_ID_BY_PERSON_ID, {"id": person_id,})
+    create_person(team_id=team_id, uuid=str(person_id), is_deleted=True)
 
 
 class ClickhousePersonSerializer(serializers.Serializer):
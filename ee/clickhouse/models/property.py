@@ -1,8 +1,9 @@
 from typing import Any, Dict, List, Optional, Tuple
 
 from ee.clickhouse.client import sync_execute
+from ee.clickhouse.materialized_columns import get_materialized_columns
 from ee.clickhouse.models.cohort import format_filter_query
-from ee.clickhouse.models.util import is_int, is_json
+from ee.clickhouse.models.util import is_int, is_json, person_properties_lookup
 from ee.clickhouse.sql.events import SELECT_PROP_VALUES_SQL, SELECT_PROP_VALUES_SQL_WITH_FILTER
 from ee.clickhouse.sql.person import GET_DISTINCT_IDS_BY_PROPERTY_SQL
 from posthog.models.cohort import Cohort
@@ -27,16 +28,30 @@ def parse_prop_clauses(
                 "AND {table_name}distinct_id IN ({clause})".format(table_name=table_name, clause=person_id_query)
             )
         elif prop.type == "person":
-            filter_query, filter_params = prop_filter_json_extract(prop, idx, "{}person".format(prepend))
-            final.append(
-                "AND {table_name}distinct_id IN ({filter_query})".format(
-                    filter_query=GET_DISTINCT_IDS_BY_PROPERTY_SQL.format(filters=filter_query), table_name=table_name
+            person_properties = person_properties_lookup("{}distinct_id".format(table_name))
+            if person_properties:
+                properties_expr, has_person = person_properties
+                filter_query, filter_params = prop_filter_json_extract(
+                    prop, idx, "{}person".format(prepend), prop_var=properties_expr
+                )
+                final.append("{} {}".format(has_person, filter_query))
+            else:
+                filter_query, filter_params = prop_filter_json_extract(prop, idx, "{}person".format(prepend))
+                final.append(
+                    "AND {table_name}distinct_id IN ({filter_query})".format(
+                        filter_query=GET_DISTINCT_IDS_BY_PROPERTY_SQL.format(filters=filter_query),
+                        table_name=table_name,
+                    )
                 )
-            )
             params.update(filter_params)
         else:
+            materialized_column = get_materialized_columns().get(prop.key)
             filter_query, filter_params = prop_filter_json_extract(
-                prop, idx, prepend, prop_var="{}properties".format(table_name)
+                prop,
+                idx,
+                prepend,
+                prop_var="{}properties".format(table_name),
+                materialized_column="{}{}".format(table_name, materialized_column) if materialized_column else None,
             )
             final.append(
                 "{filter_query} AND {table_name}team_id = %(team_id)s".format(
@@ -48,14 +63,21 @@ def parse_prop_clauses(
 
 
 def prop_filter_json_extract(
-    prop: Property, idx: int, prepend: str = "", prop_var: str = "properties"
+    prop: Property, idx: int, prepend: str = "", prop_var: str = "properties", materialized_column: Optional[str] = None
 ) -> Tuple[str, Dict[str, Any]]:
     operator = prop.operator
+    # Materialized columns hold the same unquoted value, without having to parse the whole properties JSON
+    property_expr = (
+        materialized_column
+        or "trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s))".format(
+            prop_var=prop_var, prepend=prepend, idx=idx
+        )
+    )
     if operator == "is_not":
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): prop.value}
         return (
-            "AND NOT (trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s)) = %(v{prepend}_{idx})s)".format(
-                idx=idx, prepend=prepend, prop_var=prop_var
+            "AND NOT ({property_expr} = %(v{prepend}_{idx})s)".format(
+                idx=idx, prepend=prepend, property_expr=property_expr
             ),
             params,
         )
@@ -63,8 +85,8 @@ def prop_filter_json_extract(
         value = "%{}%".format(prop.value)
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): value}
         return (
-            "AND trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s)) LIKE %(v{prepend}_{idx})s".format(
-                idx=idx, prepend=prepend, prop_var=prop_var
+            "AND {property_expr} LIKE %(v{prepend}_{idx})s".format(
+                idx=idx, prepend=prepend, property_expr=property_expr
             ),
             params,
         )
@@ -72,24 +94,24 @@ def prop_filter_json_extract(
         value = "%{}%".format(prop.value)
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): value}
         return (
-            "AND NOT (trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s)) LIKE %(v{prepend}_{idx})s)".format(
-                idx=idx, prepend=prepend, prop_var=prop_var
+            "AND NOT ({property_expr} LIKE %(v{prepend}_{idx})s)".format(
+                idx=idx, prepend=prepend, property_expr=property_expr
             ),
             params,
         )
     elif operator == "regex":
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): prop.value}
         return (
-            "AND match(trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s)), %(v{prepend}_{idx})s)".format(
-                idx=idx, prepend=prepend, prop_var=prop_var
+            "AND match({property_expr}, %(v{prepend}_{idx})s)".format(
+                idx=idx, prepend=prepend, property_expr=property_expr
             ),
             params,
         )
     elif operator == "not_regex":
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): prop.value}
         return (
-            "AND NOT match(trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s)), %(v{prepend}_{idx})s)".format(
-                idx=idx, prepend=prepend, prop_var=prop_var
+            "AND NOT match({property_expr}, %(v{prepend}_{idx})s)".format(
+                idx=idx, prepend=prepend, property_expr=property_expr
             ),
             params,
         )
@@ -129,11 +151,11 @@ def prop_filter_json_extract(
         elif is_json(prop.value):
             clause = "AND replaceRegexpAll(visitParamExtractRaw({prop_var}, %(k{prepend}_{idx})s),' ', '') = replaceRegexpAll(toString(%(v{prepend}_{idx})s),' ', '')"
         else:
-            clause = "AND trim(BOTH '\"' FROM JSONExtractRaw({prop_var}, %(k{prepend}_{idx})s)) = %(v{prepend}_{idx})s"
+            clause = "AND {property_expr} = %(v{prepend}_{idx})s"
 
         params = {"k{}_{}".format(prepend, idx): prop.key, "v{}_{}".format(prepend, idx): prop.value}
         return (
-            clause.format(idx=idx, prepend=prepend, prop_var=prop_var),
+            clause.format(idx=idx, prepend=prepend, prop_var=prop_var, property_expr=property_expr),
             params,
         )
 
@@ -3,13 +3,13 @@ from typing import Dict, List, Optional
 from uuid import uuid4
 
 from ee.clickhouse.client import sync_execute
-from ee.clickhouse.models.action import filter_event, format_action_filter
+from ee.clickhouse.models.action import _required_substrings, filter_event, format_action_filter
 from ee.clickhouse.models.event import create_event
 from ee.clickhouse.sql.actions import ACTION_QUERY
 from ee.clickhouse.util import ClickhouseTestMixin
 from posthog.models.action import Action
 from posthog.models.action_step import ActionStep
-from posthog.models.event import Event
+from posthog.models.event import Event, Selector
 from posthog.models.person import Person
 from posthog.test.base import BaseTest
 from posthog.test.test_event_model import filter_by_actions_factory
@@ -153,3 +153,11 @@ class TestActionFormat(ClickhouseTestMixin, BaseTest):
         full_query = "SELECT uuid FROM events WHERE {}".format(" AND ".join(query))
         result = sync_execute(full_query, {**params, "team_id": self.team.pk})
         self.assertEqual(len(result), 2)
+
+    def test_element_filter_required_substrings(self):
+        selector = Selector("div:nth-child(2) > a.btn-primary.big", escape_slashes=False)
+        self.assertEqual(_required_substrings(selector), ["a", ".btn-primary", ".big", "div", 'nth-child="2"'])
+
+        # regex special characters can't be required literally
+        selector = Selector("a.c++", escape_slashes=False)
+        self.assertEqual(_required_substrings(selector), ["a"])
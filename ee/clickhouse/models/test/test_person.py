@@ -0,0 +1,54 @@
+from ee.clickhouse.models.person import (
+    create_person,
+    create_person_distinct_id,
+    delete_person,
+    get_person_distinct_ids,
+    get_persons,
+    merge_people,
+)
+from ee.clickhouse.util import ClickhouseTestMixin
+from posthog.models.person import Person
+from posthog.models.utils import UUIDT
+from posthog.test.base import BaseTest
+
+
+class TestClickhousePerson(ClickhouseTestMixin, BaseTest):
+    def _create_person(self, distinct_ids, properties):
+        person_id = create_person(team_id=self.team.pk, uuid=str(UUIDT()), properties=properties)
+        for index, distinct_id in enumerate(distinct_ids):
+            create_person_distinct_id(index, self.team.pk, distinct_id, person_id)
+        return person_id
+
+    def test_merge_people(self):
+        target_id = self._create_person(["target"], {"$os": "Mac"})
+        old_id = self._create_person(["old_1", "old_2"], {"$os": "Windows", "$browser": "Chrome"})
+        target = [person for person in get_persons(self.team.pk) if str(person["id"]) == target_id][0]
+
+        merge_people(self.team.pk, target, old_id, {"$os": "Windows", "$browser": "Chrome"})
+
+        persons = get_persons(self.team.pk)
+        self.assertEqual([str(person["id"]) for person in persons], [target_id])
+        self.assertEqual(persons[0]["properties"], {"$os": "Mac", "$browser": "Chrome"})
+        self.assertEqual(
+            sorted((pdi["distinct_id"], str(pdi["person_id"])) for pdi in get_person_distinct_ids(self.team.pk)),
+            [("old_1", target_id), ("old_2", target_id), ("target", target_id)],
+        )
+
+    def test_delete_person(self):
+        deleted_id = self._create_person(["deleted"], {})
+        kept_id = self._create_person(["kept"], {})
+
+        delete_person(deleted_id, team_id=self.team.pk)
+        create_person_distinct_id(0, self.team.pk, "deleted", deleted_id, is_deleted=True)
+
+        self.assertEqual([str(person["id"]) for person in get_persons(self.team.pk)], [kept_id])
+        self.assertEqual([pdi["distinct_id"] for pdi in get_person_distinct_ids(self.team.pk)], ["kept"])
+
+    def test_delete_person_from_postgres(self):
+        person = Person.objects.create(team=self.team, distinct_ids=["deleted_1", "deleted_2"])
+        kept = Person.objects.create(team=self.team, distinct_ids=["kept"])
+
+        person.delete()
+
+        self.assertEqual([str(person["id"]) for person in get_persons(self.team.pk)], [str(kept.uuid)])
+        self.assertEqual([pdi["distinct_id"] for pdi in get_person_distinct_ids(self.team.pk)], ["kept"])
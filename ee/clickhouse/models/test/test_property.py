@@ -1,6 +1,8 @@
 from uuid import uuid4
 
+from ee.clickhouse import materialized_columns
 from ee.clickhouse.client import sync_execute
+from ee.clickhouse.materialized_columns import materialize, materialized_column_name
 from ee.clickhouse.models.event import create_event
 from ee.clickhouse.models.property import parse_prop_clauses
 from ee.clickhouse.util import ClickhouseTestMixin
@@ -60,3 +62,29 @@ class TestPropFormat(ClickhouseTestMixin, BaseTest):
 
         result = sync_execute(final_query, {**params, "team_id": self.team.pk})
         self.assertEqual(len(result), 1)
+
+    def test_prop_event_materialized(self):
+        column_name = materialize("attr")
+        self.addCleanup(self._drop_materialized_column, column_name)
+
+        _create_event(
+            event="$pageview", team=self.team, distinct_id="whatever", properties={"attr": "some_other_val"},
+        )
+
+        _create_event(
+            event="$pageview", team=self.team, distinct_id="whatever", properties={"attr": "some_val"},
+        )
+
+        filter = Filter(data={"properties": [{"key": "attr", "value": "some_val"}],})
+        query, params = parse_prop_clauses(filter.properties, self.team.pk)
+        self.assertIn(column_name, query)
+        final_query = "SELECT uuid FROM events WHERE team_id = %(team_id)s {}".format(query)
+        result = sync_execute(final_query, {**params, "team_id": self.team.pk})
+        self.assertEqual(len(result), 1)
+
+    def test_materialized_column_names_of_similar_keys_differ(self):
+        self.assertNotEqual(materialized_column_name("$browser"), materialized_column_name("_browser"))
+
+    def _drop_materialized_column(self, column_name: str) -> None:
+        sync_execute("ALTER TABLE events DROP COLUMN IF EXISTS {}".format(column_name))
+        materialized_columns._materialized_columns = ({}, 0)
@@ -1,10 +1,20 @@
 import json
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 
 import pytz
 from dateutil.parser import isoparse
+from django.conf import settings
 from django.utils import timezone
 
+from ee.clickhouse.sql.person import (
+    PERSON_DICTIONARY,
+    PERSON_DISTINCT_ID_DICT_KEY,
+    PERSON_DISTINCT_ID_DICTIONARY,
+    PERSON_DISTINCT_ID_JOIN_SQL,
+    PERSON_ID_DICT_GET_SQL,
+    PERSON_ID_DICT_HAS_SQL,
+    PERSON_PROPERTIES_DICT_GET_SQL,
+)
 from posthog.models.property import Property
 
 
@@ -78,3 +88,38 @@ def cast_timestamp_or_now(timestamp: Optional[Union[timezone.datetime, str]]) ->
         timestamp = timestamp.astimezone(pytz.utc)
 
     return timestamp.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def person_id_lookup(distinct_id: str = "events.distinct_id", join_type: str = "INNER") -> Tuple[str, str, str]:
+    """
+    SQL for the person id of the events being queried: a join clause to add after the events table, the person id
+    expression and a condition to add to the where clause. The query needs a team_id param.
+
+    With CLICKHOUSE_PERSON_DICTIONARIES, the person id is looked up in the person_distinct_id dictionary instead of
+    joining the team's distinct ids, and the condition leaves out events without a person like an inner join would.
+    """
+    if not settings.CLICKHOUSE_PERSON_DICTIONARIES:
+        return PERSON_DISTINCT_ID_JOIN_SQL.format(join_type=join_type, distinct_id=distinct_id), "pdi.person_id", ""
+
+    key = PERSON_DISTINCT_ID_DICT_KEY.format(distinct_id=distinct_id)
+    person_id = PERSON_ID_DICT_GET_SQL.format(dictionary=PERSON_DISTINCT_ID_DICTIONARY, key=key)
+    has_person = PERSON_ID_DICT_HAS_SQL.format(dictionary=PERSON_DISTINCT_ID_DICTIONARY, key=key)
+    if join_type == "LEFT":
+        return "", person_id, ""
+    # NULL for events without a person, so that counting distinct person ids doesn't count them either
+    return "", "if({}, {}, NULL)".format(has_person, person_id), "AND {}".format(has_person)
+
+
+def person_properties_lookup(distinct_id: str = "events.distinct_id") -> Optional[Tuple[str, str]]:
+    """
+    Latest properties of the person of the events being queried and a condition that the event has a person, from
+    the person dictionaries. None without CLICKHOUSE_PERSON_DICTIONARIES.
+    """
+    if not settings.CLICKHOUSE_PERSON_DICTIONARIES:
+        return None
+    key = PERSON_DISTINCT_ID_DICT_KEY.format(distinct_id=distinct_id)
+    person_id = PERSON_ID_DICT_GET_SQL.format(dictionary=PERSON_DISTINCT_ID_DICTIONARY, key=key)
+    return (
+        PERSON_PROPERTIES_DICT_GET_SQL.format(dictionary=PERSON_DICTIONARY, person_id=person_id),
+        "AND {}".format(PERSON_ID_DICT_HAS_SQL.format(dictionary=PERSON_DISTINCT_ID_DICTIONARY, key=key)),
+    )
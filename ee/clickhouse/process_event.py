@@ -1,6 +1,6 @@
 import datetime
 import json
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from uuid import UUID
 
 import statsd
@@ -16,11 +16,16 @@ from ee.clickhouse.models.session_recording_event import create_session_recordin
 from ee.kafka_client.client import KafkaProducer
 from ee.kafka_client.topics import KAFKA_EVENTS_WAL
 from posthog.ee import is_ee_enabled
-from posthog.models.element import Element
 from posthog.models.person import Person
-from posthog.models.team import Team
 from posthog.models.utils import UUIDT
-from posthog.tasks.process_event import handle_identify_or_alias, store_names_and_properties
+from posthog.tasks.process_event import (
+    _get_elements,
+    flush_team_schema,
+    get_team_for_capture,
+    handle_identify_or_alias,
+    store_names_and_properties,
+    update_names_and_properties,
+)
 
 if settings.STATSD_HOST is not None:
     statsd.Connection.set_defaults(host=settings.STATSD_HOST, port=settings.STATSD_PORT)
@@ -37,32 +42,9 @@ def _capture_ee(
     properties: Dict,
     timestamp: datetime.datetime,
 ) -> None:
-    elements = properties.get("$elements")
-    elements_list = []
-    if elements:
-        del properties["$elements"]
-        elements_list = [
-            Element(
-                text=el["$el_text"][0:400] if el.get("$el_text") else None,
-                tag_name=el["tag_name"],
-                href=el["attr__href"][0:2048] if el.get("attr__href") else None,
-                attr_class=el["attr__class"].split(" ") if el.get("attr__class") else None,
-                attr_id=el.get("attr__id"),
-                nth_child=el.get("nth_child"),
-                nth_of_type=el.get("nth_of_type"),
-                attributes={key: value for key, value in el.items() if key.startswith("attr__")},
-            )
-            for index, el in enumerate(elements)
-        ]
-
-    team = Team.objects.only(
-        "slack_incoming_webhook",
-        "event_names",
-        "event_properties",
-        "event_names_with_usage",
-        "event_properties_with_usage",
-        "anonymize_ips",
-    ).get(pk=team_id)
+    elements_list = _get_elements(properties)
+
+    team = get_team_for_capture(team_id)
 
     if not team.anonymize_ips and "$ip" not in properties:
         properties["$ip"] = ip
@@ -90,6 +72,35 @@ def _capture_ee(
     )
 
 
+def _capture_batch_ee(
+    ip: str, site_url: str, team_id: int, events: List[Tuple[UUID, str, str, Dict, datetime.datetime]]
+) -> None:
+    """Batch counterpart of _capture_ee for (uuid, event, distinct_id, properties, timestamp) tuples of one team."""
+    team = get_team_for_capture(team_id)
+
+    elements_lists = []
+    for _, event, _, properties, _ in events:
+        elements_lists.append(_get_elements(properties))
+        if not team.anonymize_ips and "$ip" not in properties:
+            properties["$ip"] = ip
+        update_names_and_properties(team, event, properties)
+    flush_team_schema(team)
+
+    Person.objects.get_or_create_for_distinct_ids((team_id, distinct_id) for _, _, distinct_id, _, _ in events)
+
+    for (event_uuid, event, distinct_id, properties, timestamp), elements_list in zip(events, elements_lists):
+        create_event(
+            event_uuid=event_uuid,
+            event=event,
+            properties=properties,
+            timestamp=timestamp,
+            team=team,
+            distinct_id=distinct_id,
+            elements=elements_list,
+            site_url=site_url,
+        )
+
+
 def handle_timestamp(data: dict, now: datetime.datetime, sent_at: Optional[datetime.datetime]) -> datetime.datetime:
     if data.get("timestamp"):
         if sent_at:
@@ -154,6 +165,45 @@ if is_ee_enabled():
         )
         timer.stop("process_event_ee")
 
+    def process_events_batch_ee(
+        ip: str,
+        site_url: str,
+        events: List[Dict],
+        team_id: int,
+        now: datetime.datetime,
+        sent_at: Optional[datetime.datetime],
+    ) -> None:
+        timer = statsd.Timer("%s_posthog_cloud" % (settings.STATSD_PREFIX,))
+        timer.start()
+        events_to_capture: List[Tuple[UUID, str, str, Dict, datetime.datetime]] = []
+        for item in events:
+            distinct_id, data = item["distinct_id"], item["data"]
+            properties = data.get("properties", {})
+            if data.get("$set"):
+                properties["$set"] = data["$set"]
+
+            event_uuid = UUIDT()
+            ts = handle_timestamp(data, now, sent_at)
+            # Identify and alias calls depend on the order of events, so they're handled one by one
+            handle_identify_or_alias(data["event"], properties, distinct_id, team_id)
+
+            if data["event"] == "$snapshot":
+                create_session_recording_event(
+                    uuid=event_uuid,
+                    team_id=team_id,
+                    distinct_id=distinct_id,
+                    session_id=properties["$session_id"],
+                    snapshot_data=properties["$snapshot_data"],
+                    timestamp=ts,
+                )
+                continue
+
+            events_to_capture.append((event_uuid, data["event"], distinct_id, properties, ts))
+
+        if events_to_capture:
+            _capture_batch_ee(ip=ip, site_url=site_url, team_id=team_id, events=events_to_capture)
+        timer.stop("process_events_batch_ee")
+
 
 else:
 
@@ -169,6 +219,17 @@ else:
         # Noop if ee is not enabled
         return
 
+    def process_events_batch_ee(
+        ip: str,
+        site_url: str,
+        events: List[Dict],
+        team_id: int,
+        now: datetime.datetime,
+        sent_at: Optional[datetime.datetime],
+    ) -> None:
+        # Noop if ee is not enabled
+        return
+
 
 def log_event(
     distinct_id: str,
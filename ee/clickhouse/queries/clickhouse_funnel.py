@@ -7,6 +7,7 @@ from django.utils import timezone
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.action import format_action_filter
 from ee.clickhouse.models.property import parse_prop_clauses
+from ee.clickhouse.models.util import person_id_lookup
 from ee.clickhouse.queries.util import parse_timestamps
 from ee.clickhouse.sql.funnels.funnel import FUNNEL_SQL
 from posthog.constants import TREND_FILTER_TYPE_ACTIONS
@@ -67,14 +68,18 @@ class ClickhouseFunnel(Funnel):
             **prop_filter_params,
         }
         steps = [self._build_steps_query(entity, index) for index, entity in enumerate(self._filter.entities)]
+        person_join, person_id, person_condition = person_id_lookup()
         query = FUNNEL_SQL.format(
             team_id=self._team.id,
             steps=", ".join(steps),
+            person_join=person_join,
+            person_id=person_id,
+            person_condition=person_condition,
             filters=prop_filters.replace("uuid IN", "events.uuid IN", 1),
             parsed_date_from=parsed_date_from,
             parsed_date_to=parsed_date_to,
         )
-        return sync_execute(query, self.params)
+        return sync_execute(query, self.params, team_id=self._team.pk)
 
     def run(self, *args, **kwargs) -> List[Dict[str, Any]]:
         # Format of this is [step order, person count (that reached that step), array of person uuids]
@@ -4,6 +4,7 @@ from django.utils import timezone
 
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.property import parse_prop_clauses
+from ee.clickhouse.models.util import person_id_lookup
 from ee.clickhouse.queries.util import parse_timestamps
 from ee.clickhouse.sql.events import EXTRACT_TAG_REGEX, EXTRACT_TEXT_REGEX
 from ee.clickhouse.sql.paths.path import PATHS_QUERY_FINAL
@@ -62,7 +63,11 @@ class ClickhousePaths(Paths):
                 excess_row_filter += " or neighbor(marked_session_start, {}, 0) = 1".format(-i)
         excess_row_filter += ")"
 
+        person_join, person_id, person_condition = person_id_lookup()
         paths_query = PATHS_QUERY_FINAL.format(
+            person_join=person_join,
+            person_id=person_id,
+            person_condition=person_condition,
             event_query="event = %(event)s"
             if event
             else "event NOT IN ('$autocapture', '$pageview', '$identify', '$pageleave', '$screen')",
@@ -86,7 +91,7 @@ class ClickhousePaths(Paths):
         }
         params = {**params, **prop_filter_params}
 
-        rows = sync_execute(paths_query, params)
+        rows = sync_execute(paths_query, params, team_id=team.pk)
 
         resp: List[Dict[str, str]] = []
         for row in rows:
@@ -4,6 +4,7 @@ from typing import Any, Dict, Tuple
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.action import format_action_filter
 from ee.clickhouse.models.property import parse_prop_clauses
+from ee.clickhouse.models.util import person_id_lookup
 from ee.clickhouse.sql.retention.retention import REFERENCE_EVENT_SQL, REFERENCE_EVENT_UNIQUE_SQL, RETENTION_SQL
 from posthog.constants import TREND_FILTER_TYPE_ACTIONS, TREND_FILTER_TYPE_EVENTS
 from posthog.models.action import Action
@@ -62,8 +63,14 @@ class ClickhouseRetention(Retention):
             )
         )
 
+        person_join, person_id, person_condition = person_id_lookup("e.distinct_id")
         reference_event_sql = (REFERENCE_EVENT_UNIQUE_SQL if is_first_time_retention else REFERENCE_EVENT_SQL).format(
-            target_query=target_query_formatted, filters=prop_filters, trunc_func=trunc_func,
+            target_query=target_query_formatted,
+            filters=prop_filters,
+            trunc_func=trunc_func,
+            person_join=person_join,
+            person_id=person_id,
+            person_condition=person_condition,
         )
         result = sync_execute(
             RETENTION_SQL.format(
@@ -73,6 +80,9 @@ class ClickhouseRetention(Retention):
                 trunc_func=trunc_func,
                 extra_union="UNION ALL {}".format(reference_event_sql) if is_first_time_retention else "",
                 reference_event_sql=reference_event_sql,
+                person_join=person_join,
+                person_id=person_id,
+                person_condition=person_condition,
             ),
             {
                 "team_id": team.pk,
@@ -87,6 +97,7 @@ class ClickhouseRetention(Retention):
                 **returning_params,
                 "period": period,
             },
+            team_id=team.pk,
         )
 
         result_dict = {}
@@ -3,6 +3,7 @@ from typing import Any, Dict, Optional
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.action import format_action_filter
 from ee.clickhouse.models.property import parse_prop_clauses
+from ee.clickhouse.models.util import person_id_lookup
 from ee.clickhouse.queries.util import parse_timestamps
 from ee.clickhouse.sql.stickiness.stickiness import STICKINESS_SQL
 from ee.clickhouse.sql.stickiness.stickiness_actions import STICKINESS_ACTIONS_SQL
@@ -24,6 +25,7 @@ class ClickhouseStickiness(Stickiness):
 
         params: Dict = {"team_id": team_id}
         params = {**params, **prop_filter_params}
+        person_join, person_id, _ = person_id_lookup(join_type="LEFT")
         if entity.type == TREND_FILTER_TYPE_ACTIONS:
             action = Action.objects.get(pk=entity.id)
             action_query, action_params = format_action_filter(action)
@@ -34,6 +36,8 @@ class ClickhouseStickiness(Stickiness):
             content_sql = STICKINESS_ACTIONS_SQL.format(
                 team_id=team_id,
                 actions_query=action_query,
+                person_join=person_join,
+                person_id=person_id,
                 parsed_date_from=parsed_date_from,
                 parsed_date_to=parsed_date_to,
                 filters=prop_filters,
@@ -42,10 +46,12 @@ class ClickhouseStickiness(Stickiness):
             content_sql = STICKINESS_SQL.format(
                 team_id=team_id,
                 event=entity.id,
+                person_join=person_join,
+                person_id=person_id,
                 parsed_date_from=parsed_date_from,
                 parsed_date_to=parsed_date_to,
                 filters=prop_filters,
             )
 
-        counts = sync_execute(content_sql, params)
+        counts = sync_execute(content_sql, params, team_id=team_id)
         return self.process_result(counts, range_days)
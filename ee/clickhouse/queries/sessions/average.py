@@ -39,7 +39,7 @@ class ClickhouseSessionsAvg:
         final_query = AVERAGE_SQL.format(sessions=per_period_query, null_sql=null_sql)
 
         params = {**params, "team_id": team.pk}
-        response = sync_execute(final_query, params)
+        response = sync_execute(final_query, params, team_id=team.pk)
         values = self.clean_values(filter, response)
         time_series_data = append_data(values, interval=filter.interval, math=None)
         # calculate average
@@ -22,7 +22,7 @@ class ClickhouseSessionsDist:
 
         params = {**params, "team_id": team.pk}
 
-        result = sync_execute(dist_query, params)
+        result = sync_execute(dist_query, params, team_id=team.pk)
 
         res = [{"label": DIST_LABELS[index], "count": result[0][index]} for index in range(len(DIST_LABELS))]
 
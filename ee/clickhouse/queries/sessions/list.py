@@ -1,13 +1,12 @@
-from typing import Dict, List, Tuple
+from typing import List, Tuple
 
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.event import ClickhouseEventSerializer
-from ee.clickhouse.models.person import get_persons_by_distinct_ids
 from ee.clickhouse.models.property import parse_prop_clauses
 from ee.clickhouse.queries.clickhouse_session_recording import add_session_recording_ids
 from ee.clickhouse.queries.util import parse_timestamps
 from ee.clickhouse.sql.sessions.list import SESSION_SQL
-from posthog.models import Filter, Person, Team
+from posthog.models import EventHydrator, Filter, Team
 
 SESSIONS_LIST_DEFAULT_LIMIT = 50
 
@@ -21,7 +20,7 @@ class ClickhouseSessionsList:
         query = SESSION_SQL.format(
             date_from=date_from, date_to=date_to, filters=filters, sessions_limit="LIMIT %(offset)s, %(limit)s",
         )
-        query_result = sync_execute(query, params)
+        query_result = sync_execute(query, params, team_id=team.pk)
         result = self._parse_list_results(query_result)
 
         self._add_person_properties(team, result)
@@ -30,24 +29,10 @@ class ClickhouseSessionsList:
         return result
 
     def _add_person_properties(self, team=Team, sessions=List[Tuple]):
-        distinct_id_hash = {}
+        persons = EventHydrator(team.pk).get_persons(session["distinct_id"] for session in sessions)
         for session in sessions:
-            distinct_id_hash[session["distinct_id"]] = True
-        distinct_ids = list(distinct_id_hash.keys())
-
-        if len(distinct_ids) == 0:
-            return
-
-        persons = get_persons_by_distinct_ids(team.pk, distinct_ids)
-
-        distinct_to_person: Dict[str, Person] = {}
-        for person in persons:
-            for distinct_id in person.distinct_ids:
-                distinct_to_person[distinct_id] = person
-
-        for session in sessions:
-            if distinct_to_person.get(session["distinct_id"], None):
-                session["properties"] = distinct_to_person[session["distinct_id"]].properties
+            if persons.get(session["distinct_id"], None):
+                session["properties"] = persons[session["distinct_id"]].properties
 
     def _parse_list_results(self, results: List[Tuple]):
         final = []
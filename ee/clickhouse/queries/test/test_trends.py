@@ -1,9 +1,11 @@
 from uuid import uuid4
 
+from django.test import override_settings
 from freezegun import freeze_time
 
 from ee.clickhouse.models.event import create_event
 from ee.clickhouse.queries.trends.clickhouse_trends import ClickhouseTrends
+from ee.clickhouse.queries.trends.normal import can_use_daily_rollup
 from ee.clickhouse.util import ClickhouseTestMixin
 from posthog.models.action import Action
 from posthog.models.action_step import ActionStep
@@ -226,3 +228,104 @@ class TestClickhouseTrends(ClickhouseTestMixin, trend_test_factory(ClickhouseTre
         self.assertEqual(event_response[1]["data"][5], 1)  # property not defined
 
         self.assertTrue(self._compare_entity_response(action_response, event_response))
+
+    def test_daily_rollup_matches_events(self):
+        sign_up_action, _ = self._create_events()
+        with freeze_time("2020-01-04T13:01:01Z"):
+            for interval in ["day", "week", "month"]:
+                event_filter = Filter(data={"interval": interval, "events": [{"id": "sign up"}]})
+                self.assertTrue(can_use_daily_rollup(event_filter.entities[0], event_filter))
+
+                event_response = ClickhouseTrends().run(event_filter, self.team)
+                action_response = ClickhouseTrends().run(
+                    Filter(data={"interval": interval, "actions": [{"id": sign_up_action.id}]}), self.team
+                )
+                self.assertTrue(self._compare_entity_response(action_response, event_response))
+
+        hourly_filter = Filter(data={"interval": "hour", "events": [{"id": "sign up"}]})
+        self.assertFalse(can_use_daily_rollup(hourly_filter.entities[0], hourly_filter))
+        filtered = Filter(data={"events": [{"id": "sign up"}], "properties": [{"key": "$os", "value": "Windows"}]})
+        self.assertFalse(can_use_daily_rollup(filtered.entities[0], filtered))
+
+    def test_person_dictionaries_match_joins(self):
+        self._create_multiple_people()
+        _create_event(team=self.team, event="watched movie", distinct_id="no person", timestamp="2020-01-02T12:00:00Z")
+        self._reload_person_dictionaries()
+        filters = [
+            Filter(data={"events": [{"id": "watched movie", "math": "dau"}]}),
+            Filter(
+                data={
+                    "events": [{"id": "watched movie"}],
+                    "properties": [{"key": "name", "value": "person1", "operator": "is_not", "type": "person"}],
+                }
+            ),
+        ]
+        with freeze_time("2020-01-04"):
+            joined = [ClickhouseTrends().run(filter, self.team) for filter in filters]
+            with override_settings(CLICKHOUSE_PERSON_DICTIONARIES=True):
+                looked_up = [ClickhouseTrends().run(filter, self.team) for filter in filters]
+
+        self.assertEqual(joined[0][0]["data"][-4:], [3, 2, 1, 0])
+        self.assertEqual(looked_up[0][0]["data"], joined[0][0]["data"])
+        self.assertEqual(looked_up[1][0]["data"], joined[1][0]["data"])
+
+    def test_single_scan_matches_separate_queries(self):
+        sign_up_action, _ = self._create_events()
+        entities = {
+            "events": [
+                {"id": "sign up", "order": 0},
+                {"id": "sign up", "math": "dau", "order": 1},
+                {"id": "sign up", "properties": [{"key": "$some_property", "value": "value"}], "order": 2},
+                {"id": "no events", "order": 3},
+            ],
+            "actions": [{"id": sign_up_action.id, "order": 4}],
+        }
+        with freeze_time("2020-01-04T13:01:01Z"):
+            data = {"date_from": "-14d", "properties": [{"key": "$browser", "operator": "is_not_set"}]}
+            filter = Filter(data=data)
+            response = ClickhouseTrends().run(Filter(data={**data, **entities}), self.team)
+            separate_responses = [
+                ClickhouseTrends()._format_normal_query(entity, filter, self.team.pk)
+                for entity in Filter(data=entities).entities
+            ]
+
+        self.assertEqual(len(response), 5)
+        self.assertEqual(response[0]["count"], 5)
+        for serialized, separate_response in zip(response, separate_responses):
+            self.assertEqual(serialized["data"], separate_response[0]["data"])
+            self.assertEqual(serialized["days"], separate_response[0]["days"])
+
+    def test_single_scan_compare(self):
+        self._create_events()
+        with freeze_time("2020-01-04T13:01:01Z"):
+            response = ClickhouseTrends().run(
+                Filter(
+                    data={
+                        "date_from": "-7d",
+                        "compare": "true",
+                        "events": [{"id": "sign up", "math": "dau"}, {"id": "no events", "math": "dau"}],
+                    }
+                ),
+                self.team,
+            )
+
+        self.assertEqual(
+            [item["label"] for item in response],
+            ["sign up - current", "sign up - previous", "no events - current", "no events - previous"],
+        )
+        self.assertEqual(response[0]["count"], 2)
+        self.assertEqual(response[1]["count"], 1)
+        self.assertEqual(response[2]["count"], 1)
+        self.assertEqual(response[3]["count"], 0)
+
+    def test_daily_rollup_dau(self):
+        self._create_multiple_people()
+        with freeze_time("2020-01-04T13:01:01Z"):
+            for interval in ["day", "week", "month"]:
+                filter = Filter(data={"interval": interval, "events": [{"id": "watched movie", "math": "dau"}]})
+                self.assertFalse(can_use_daily_rollup(filter.entities[0], filter))
+                joined = ClickhouseTrends().run(filter, self.team)
+                with override_settings(CLICKHOUSE_DAU_FROM_DAILY_ROLLUP=True):
+                    self.assertTrue(can_use_daily_rollup(filter.entities[0], filter))
+                    rolled_up = ClickhouseTrends().run(filter, self.team)
+                self.assertEqual(rolled_up[0]["data"], joined[0]["data"])
@@ -10,7 +10,7 @@ from ee.clickhouse.models.property import parse_prop_clauses
 from ee.clickhouse.queries.trends.util import parse_response, process_math
 from ee.clickhouse.queries.util import get_interval_annotation_ch, get_time_diff, parse_timestamps
 from ee.clickhouse.sql.events import NULL_BREAKDOWN_SQL, NULL_SQL
-from ee.clickhouse.sql.person import GET_LATEST_PERSON_SQL
+from ee.clickhouse.sql.person import GET_LATEST_PERSON_SQL, GET_TEAM_PERSON_DISTINCT_IDS
 from ee.clickhouse.sql.trends.breakdown import (
     BREAKDOWN_COHORT_JOIN_SQL,
     BREAKDOWN_CONDITIONS_SQL,
@@ -107,6 +107,7 @@ class ClickhouseTrendsBreakdown:
                 parsed_date_from=parsed_date_from,
                 parsed_date_to=parsed_date_to,
                 latest_person_sql=GET_LATEST_PERSON_SQL.format(query=""),
+                person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS,
             )
             top_elements_array = self._get_top_elements(elements_query, filter, team_id)
             params = {
@@ -117,6 +118,7 @@ class ClickhouseTrendsBreakdown:
             breakdown_filter_params = {
                 **breakdown_filter_params,
                 "latest_person_sql": GET_LATEST_PERSON_SQL.format(query=""),
+                "person_distinct_ids": GET_TEAM_PERSON_DISTINCT_IDS,
             }
             breakdown_query = BREAKDOWN_QUERY_SQL
         else:
@@ -149,7 +151,7 @@ class ClickhouseTrendsBreakdown:
         )
 
         try:
-            result = sync_execute(breakdown_query, params)
+            result = sync_execute(breakdown_query, params, team_id=team_id)
         except:
             result = []
 
@@ -195,7 +197,7 @@ class ClickhouseTrendsBreakdown:
         element_params = {"key": filter.breakdown, "limit": 20, "team_id": team_id}
 
         try:
-            top_elements_array_result = sync_execute(query, element_params)
+            top_elements_array_result = sync_execute(query, element_params, team_id=team_id)
             top_elements_array = top_elements_array_result[0][0]
         except:
             top_elements_array = []
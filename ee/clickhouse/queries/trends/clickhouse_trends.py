@@ -1,8 +1,14 @@
+from typing import Any, Dict, List
+
 from django.utils import timezone
 
 from ee.clickhouse.queries.trends.breakdown import ClickhouseTrendsBreakdown
 from ee.clickhouse.queries.trends.normal import ClickhouseTrendsNormal
+from posthog.constants import TREND_FILTER_TYPE_ACTIONS, TRENDS_CUMULATIVE
+from posthog.models.action import Action
 from posthog.models.filter import Filter
+from posthog.models.team import Team
+from posthog.queries.base import convert_to_comparison, determine_compared_filter
 from posthog.queries.trends import Trends
 from posthog.utils import relative_date_parse
 
@@ -13,3 +19,36 @@ class ClickhouseTrends(ClickhouseTrendsNormal, ClickhouseTrendsBreakdown, Trends
             filter._date_from = relative_date_parse("-7d")
         if not filter._date_to:
             filter._date_to = timezone.now()
+
+    def calculate_trends(self, filter: Filter, team: Team) -> List[Dict[str, Any]]:
+        if filter.breakdown:
+            return super().calculate_trends(filter, team)
+
+        self._set_default_dates(filter, team.pk)
+
+        action_ids = [entity.id for entity in filter.entities if entity.type == TREND_FILTER_TYPE_ACTIONS]
+        action_names = {
+            str(pk): name
+            for pk, name in Action.objects.filter(team_id=team.pk, pk__in=action_ids).values_list("pk", "name")
+        }
+        entities = []
+        for entity in filter.entities:
+            if entity.type == TREND_FILTER_TYPE_ACTIONS:
+                if str(entity.id) not in action_names:
+                    continue
+                entity.name = action_names[str(entity.id)]
+            entities.append(entity)
+
+        filters = [filter, determine_compared_filter(filter)] if filter.compare else [filter]
+        entity_results = self._format_normal_queries(entities, filters, team.pk)
+
+        result = []
+        for entity, window_results in zip(entities, entity_results):
+            for window_filter, label, window_result in zip(filters, ["current", "previous"], window_results):
+                serialized_data = self._format_serialized(entity, window_result)
+                if filter.display == TRENDS_CUMULATIVE:
+                    serialized_data = self._handle_cumulative(serialized_data)
+                if filter.compare:
+                    serialized_data = convert_to_comparison(serialized_data, window_filter, label)
+                result.extend(serialized_data)
+        return result
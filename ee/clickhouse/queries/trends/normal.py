@@ -1,22 +1,171 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
+from django.conf import settings
 from django.utils import timezone
 
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.models.action import format_action_filter
 from ee.clickhouse.models.property import parse_prop_clauses
+from ee.clickhouse.models.util import person_id_lookup
 from ee.clickhouse.queries.trends.util import parse_response, process_math
 from ee.clickhouse.queries.util import get_interval_annotation_ch, get_time_diff, parse_timestamps
-from ee.clickhouse.sql.events import NULL_SQL
-from ee.clickhouse.sql.trends.aggregate import AGGREGATE_SQL
-from ee.clickhouse.sql.trends.volume import VOLUME_ACTIONS_SQL, VOLUME_SQL
+from ee.clickhouse.sql.events import NULL_MULTI_SQL, NULL_SQL
+from ee.clickhouse.sql.trends.aggregate import AGGREGATE_MULTI_SQL, AGGREGATE_SQL
+from ee.clickhouse.sql.trends.volume import VOLUME_ACTIONS_SQL, VOLUME_MULTI_SQL, VOLUME_ROLLUP_SQL, VOLUME_SQL
 from posthog.constants import TREND_FILTER_TYPE_ACTIONS
 from posthog.models.action import Action
 from posthog.models.entity import Entity
 from posthog.models.filter import Filter
 
+# Intervals starting at midnight, which can be counted from the daily rollup
+ROLLUP_INTERVALS = (None, "day", "week", "month")
+
+# How to aggregate the daily rollup for each math it can answer
+ROLLUP_AGGREGATE_OPERATIONS = {
+    None: "countMerge(count)",
+    "total": "countMerge(count)",
+    "dau": "uniqMerge(distinct_ids)",
+}
+
+
+def can_use_daily_rollup(entity: Entity, filter: Filter) -> bool:
+    """Whether the entity's volume is event or unique user counts per day or longer, which events_daily_rollup has."""
+    if entity.math == "dau" and not settings.CLICKHOUSE_DAU_FROM_DAILY_ROLLUP:
+        return False
+    return (
+        entity.type != TREND_FILTER_TYPE_ACTIONS
+        and not filter.properties
+        and not entity.properties
+        and entity.math in ROLLUP_AGGREGATE_OPERATIONS
+        and filter.interval in ROLLUP_INTERVALS
+    )
+
+
+# Math that can be computed for several entities in one scan with conditional aggregates
+SINGLE_SCAN_MATH = (None, "total", "dau")
+
+
+def can_use_single_scan(entity: Entity, filter: Filter) -> bool:
+    return entity.math in SINGLE_SCAN_MATH and not can_use_daily_rollup(entity, filter)
+
 
 class ClickhouseTrendsNormal:
+    def _format_normal_queries(
+        self, entities: List[Entity], filters: List[Filter], team_id: int
+    ) -> List[List[List[Dict[str, Any]]]]:
+        """
+        Results of _format_normal_query for every entity and every filter (i.e. the compare window).
+
+        Entities counting events or unique users are computed in one scan of the events table per math type, with the
+        results split afterwards.
+        """
+        results: List[List[List[Dict[str, Any]]]] = [[[] for _ in filters] for _ in entities]
+        batches: Dict[str, List[int]] = {}
+        for index, entity in enumerate(entities):
+            if can_use_single_scan(entity, filters[0]):
+                batches.setdefault("dau" if entity.math == "dau" else "total", []).append(index)
+            else:
+                results[index] = [self._format_normal_query(entity, filter, team_id) for filter in filters]
+
+        for math, indexes in batches.items():
+            if len(indexes) * len(filters) == 1:
+                results[indexes[0]] = [self._format_normal_query(entities[indexes[0]], filters[0], team_id)]
+                continue
+            batch_results = self._format_single_scan_query(
+                [entities[index] for index in indexes], filters, team_id, join_person=math == "dau"
+            )
+            for index, entity_results in zip(indexes, batch_results):
+                results[index] = entity_results
+        return results
+
+    def _format_single_scan_query(
+        self, entities: List[Entity], filters: List[Filter], team_id: int, join_person: bool
+    ) -> List[List[List[Dict[str, Any]]]]:
+        filter = filters[0]
+        interval_annotation = get_interval_annotation_ch(filter.interval)
+        prop_filters, params = parse_prop_clauses(filter.properties, team_id)
+        params = {**params, "team_id": team_id}
+
+        person_join, person_id, _ = person_id_lookup()
+        aggregate_operations = []
+        entity_conditions = []
+        for index, entity in enumerate(entities):
+            condition, condition_params = self._entity_condition(entity, index, team_id)
+            params = {**params, **condition_params}
+            entity_conditions.append("({})".format(condition))
+            aggregate_operations.append(
+                "{}({}) AS total_{}".format(
+                    "uniqExactIf" if join_person else "countIf",
+                    "{}, {}".format(person_id, condition) if join_person else condition,
+                    index,
+                )
+            )
+
+        null_sqls = []
+        date_windows_conditions = []
+        for date_window, window_filter in enumerate(filters):
+            num_intervals, seconds_in_interval = get_time_diff(
+                window_filter.interval or "day", window_filter.date_from, window_filter.date_to
+            )
+            parsed_date_from, parsed_date_to = parse_timestamps(filter=window_filter)
+            date_windows_conditions.append(
+                "(date_window = {} {} {})".format(date_window, parsed_date_from, parsed_date_to)
+            )
+            null_sqls.append(
+                NULL_MULTI_SQL.format(
+                    date_window=date_window,
+                    interval=interval_annotation,
+                    seconds_in_interval=seconds_in_interval,
+                    num_intervals=num_intervals,
+                    date_to=window_filter.date_to.strftime("%Y-%m-%d %H:%M:%S"),
+                    totals=", ".join("toUInt16(0) AS total_{}".format(index) for index in range(len(entities))),
+                )
+            )
+
+        content_sql = VOLUME_MULTI_SQL.format(
+            interval=interval_annotation,
+            aggregate_operations=", ".join(aggregate_operations),
+            date_windows="[{}]".format(", ".join(str(date_window) for date_window in range(len(filters)))),
+            event_join=person_join if join_person else "",
+            team_id=team_id,
+            entities_query=" OR ".join(entity_conditions),
+            filters=prop_filters,
+            date_windows_query=" OR ".join(date_windows_conditions),
+        )
+        final_query = AGGREGATE_MULTI_SQL.format(
+            null_sql=" UNION ALL ".join(null_sqls),
+            content_sql=content_sql,
+            sums=", ".join("SUM(total_{0}) AS count_{0}".format(index) for index in range(len(entities))),
+        )
+
+        results: List[List[List[Dict[str, Any]]]] = [[[] for _ in filters] for _ in entities]
+        try:
+            result = sync_execute(final_query, params, team_id=team_id)
+        except:
+            return results
+
+        rows_by_window: Dict[int, List[Tuple]] = {}
+        for date_window, *row in result:
+            rows_by_window.setdefault(date_window, []).append(row)
+        for date_window, rows in rows_by_window.items():
+            day_starts, *counts = zip(*rows)
+            for index, entity_counts in enumerate(counts):
+                results[index][date_window] = [
+                    parse_response((list(day_starts), list(entity_counts)), filters[date_window])
+                ]
+        return results
+
+    def _entity_condition(self, entity: Entity, index: int, team_id: int) -> Tuple[str, Dict[str, Any]]:
+        prop_filters, params = parse_prop_clauses(entity.properties, team_id, prepend="entity_{}".format(index))
+        if entity.type == TREND_FILTER_TYPE_ACTIONS:
+            action = Action.objects.get(pk=entity.id)
+            action_query, action_params = format_action_filter(action, prepend="_entity_{}".format(index))
+            return "{} {}".format(action_query, prop_filters), {**params, **action_params}
+        return (
+            "event = %(event_{index})s {prop_filters}".format(index=index, prop_filters=prop_filters),
+            {**params, "event_{}".format(index): entity.id},
+        )
+
     def _format_normal_query(self, entity: Entity, filter: Filter, team_id: int) -> List[Dict[str, Any]]:
 
         interval_annotation = get_interval_annotation_ch(filter.interval)
@@ -50,6 +199,17 @@ class ClickhouseTrendsNormal:
                 content_sql_params = {**content_sql_params, "actions_query": action_query}
             except:
                 return []
+        elif can_use_daily_rollup(entity, filter):
+            content_sql = VOLUME_ROLLUP_SQL
+            params = {**params, "event": entity.id}
+            content_sql_params = {
+                **content_sql_params,
+                "aggregate_operation": ROLLUP_AGGREGATE_OPERATIONS[entity.math],
+                "parsed_date_from": "and day >= '{}'".format(filter.date_from.strftime("%Y-%m-%d"))
+                if filter.date_from
+                else "",
+                "parsed_date_to": "and day <= '{}'".format(filter.date_to.strftime("%Y-%m-%d")),
+            }
         else:
             content_sql = VOLUME_SQL
             params = {**params, "event": entity.id}
@@ -63,7 +223,7 @@ class ClickhouseTrendsNormal:
         final_query = AGGREGATE_SQL.format(null_sql=null_sql, content_sql=content_sql)
 
         try:
-            result = sync_execute(final_query, params)
+            result = sync_execute(final_query, params, team_id=team_id)
 
         except:
             result = []
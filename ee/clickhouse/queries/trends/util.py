@@ -1,7 +1,7 @@
 from datetime import timedelta
 from typing import Any, Dict, Optional, Tuple
 
-from ee.clickhouse.sql.events import EVENT_JOIN_PERSON_SQL
+from ee.clickhouse.models.util import person_id_lookup
 from posthog.models.entity import Entity
 from posthog.models.filter import Filter
 
@@ -12,8 +12,8 @@ def process_math(entity: Entity) -> Tuple[str, str, Dict[str, Optional[str]]]:
     join_condition = ""
     value = "toFloat64OrNull(JSONExtractRaw(properties, '{}'))".format(entity.math_property)
     if entity.math == "dau":
-        join_condition = EVENT_JOIN_PERSON_SQL
-        aggregate_operation = "count(DISTINCT person_id)"
+        join_condition, person_id, _ = person_id_lookup()
+        aggregate_operation = "count(DISTINCT {})".format(person_id)
     elif entity.math == "sum":
         aggregate_operation = "sum({})".format(value)
         params = {"join_property_key": entity.math_property}
@@ -15,6 +15,12 @@ TABLE_MERGE_ENGINE = (
     else "MergeTree()"
 )
 
+TABLE_AGGREGATING_ENGINE = (
+    "ReplicatedAggregatingMergeTree('/clickhouse/tables/{{shard}}/posthog.{table}', '{{replica}}')"
+    if CLICKHOUSE_REPLICATION
+    else "AggregatingMergeTree()"
+)
+
 KAFKA_ENGINE = "Kafka('{kafka_host}', '{topic}', '{group}', '{serialization}')"
 
 KAFKA_PROTO_ENGINE = """
@@ -44,6 +50,10 @@ def table_engine(table: str, ver: Optional[str] = None) -> str:
         return TABLE_MERGE_ENGINE.format(table=table)
 
 
+def aggregating_table_engine(table: str) -> str:
+    return TABLE_AGGREGATING_ENGINE.format(table=table)
+
+
 def kafka_engine(
     topic: str,
     kafka_host=KAFKA_HOSTS,
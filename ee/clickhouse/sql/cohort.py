@@ -1,3 +1,7 @@
+from ee.clickhouse.sql.person import GET_TEAM_PERSON_DISTINCT_IDS
+
 CALCULATE_COHORT_PEOPLE_SQL = """
-SELECT distinct_id FROM person_distinct_id where {query} AND team_id = %(team_id)s
-"""
+SELECT distinct_id FROM ({person_distinct_ids}) where {{query}}
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS
+)
@@ -1,6 +1,6 @@
 from ee.kafka_client.topics import KAFKA_EVENTS
 
-from .clickhouse import KAFKA_COLUMNS, STORAGE_POLICY, kafka_engine, table_engine
+from .clickhouse import KAFKA_COLUMNS, STORAGE_POLICY, aggregating_table_engine, kafka_engine, table_engine
 
 DROP_EVENTS_TABLE_SQL = """
 DROP TABLE events
@@ -18,6 +18,14 @@ DROP_MAT_EVENTS_PROP_TABLE_SQL = """
 DROP TABLE events_properties_view
 """
 
+DROP_EVENTS_DAILY_ROLLUP_TABLE_SQL = """
+DROP TABLE events_daily_rollup
+"""
+
+DROP_EVENTS_DAILY_ROLLUP_MV_SQL = """
+DROP TABLE events_daily_rollup_mv
+"""
+
 EVENTS_TABLE = "events"
 
 EVENTS_TABLE_BASE_SQL = """
@@ -74,6 +82,81 @@ FROM kafka_{table_name}
     table_name=EVENTS_TABLE
 )
 
+# Materialized columns get calculated on insert, and on merges or when read for existing data
+MATERIALIZE_PROPERTY_COLUMN_SQL = """
+ALTER TABLE events
+ADD COLUMN IF NOT EXISTS {column_name} VARCHAR MATERIALIZED trim(BOTH '"' FROM JSONExtractRaw(properties, %(property)s))
+COMMENT %(comment)s
+"""
+
+# Data skipping indexes, letting equality and LIKE filters skip granules that can't match.
+# These only cover parts written after the index is added, until `ALTER TABLE events MATERIALIZE INDEX <name>` is run
+EVENTS_ELEMENTS_CHAIN_INDEX_SQL = """
+ALTER TABLE events ADD INDEX IF NOT EXISTS elements_chain_ngram elements_chain TYPE ngrambf_v1(3, 8192, 3, 0) GRANULARITY 1
+"""
+
+EVENTS_EVENT_INDEX_SQL = """
+ALTER TABLE events ADD INDEX IF NOT EXISTS event_set event TYPE set(100) GRANULARITY 1
+"""
+
+MATERIALIZED_COLUMN_INDEX_SQL = """
+ALTER TABLE events ADD INDEX IF NOT EXISTS {column_name}_ngram {column_name} TYPE ngrambf_v1(3, 8192, 3, 0) GRANULARITY 1
+"""
+
+GET_MATERIALIZED_COLUMNS_SQL = """
+SELECT name, comment FROM system.columns
+WHERE database = currentDatabase() AND table = 'events' AND comment LIKE %(comment_prefix)s
+"""
+
+EVENTS_DAILY_ROLLUP_TABLE = "events_daily_rollup"
+
+# Number of events and unique distinct ids per team, event and day, kept up to date by a materialized view on events.
+# Events inserted more than once (e.g. redelivered by Kafka) are counted like the events table counts them before merges
+EVENTS_DAILY_ROLLUP_TABLE_SQL = """
+CREATE TABLE {table_name}
+(
+    team_id Int64,
+    event VARCHAR,
+    day Date,
+    count AggregateFunction(count),
+    distinct_ids AggregateFunction(uniq, VARCHAR)
+) ENGINE = {engine}
+PARTITION BY toYYYYMM(day)
+ORDER BY (team_id, event, day)
+""".format(
+    table_name=EVENTS_DAILY_ROLLUP_TABLE, engine=aggregating_table_engine(EVENTS_DAILY_ROLLUP_TABLE)
+)
+
+EVENTS_DAILY_ROLLUP_SELECT_SQL = """
+SELECT team_id, event, toDate(timestamp) AS day, countState() AS count, uniqState(distinct_id) AS distinct_ids
+FROM events
+{where}
+GROUP BY team_id, event, day
+"""
+
+EVENTS_DAILY_ROLLUP_MV_SQL = """
+CREATE MATERIALIZED VIEW {table_name}_mv
+TO {table_name}
+AS {select}
+""".format(
+    table_name=EVENTS_DAILY_ROLLUP_TABLE, select=EVENTS_DAILY_ROLLUP_SELECT_SQL.format(where="")
+)
+
+# Events inserted before the materialized view was created
+BACKFILL_EVENTS_DAILY_ROLLUP_SQL = """
+INSERT INTO {table_name} {select}
+""".format(
+    table_name=EVENTS_DAILY_ROLLUP_TABLE,
+    select=EVENTS_DAILY_ROLLUP_SELECT_SQL.format(
+        where="""WHERE _timestamp < (
+            SELECT metadata_modification_time FROM system.tables
+            WHERE database = currentDatabase() AND name = '{}_mv'
+        )""".format(
+            EVENTS_DAILY_ROLLUP_TABLE
+        )
+    ),
+)
+
 INSERT_EVENT_SQL = """
 INSERT INTO events SELECT %(uuid)s, %(event)s, %(properties)s, %(timestamp)s, %(team_id)s, %(distinct_id)s, %(elements_chain)s, %(created_at)s, now(), 0
 """
@@ -167,6 +250,10 @@ SELECT_PROP_VALUES_SQL_WITH_FILTER = """
 SELECT DISTINCT trim(BOTH '\"' FROM JSONExtractRaw(properties, %(key)s)) FROM events where team_id = %(team_id)s AND trim(BOTH '\"' FROM JSONExtractRaw(properties, %(key)s)) LIKE %(value)s LIMIT 10
 """
 
+# The table is sorted by (team_id, toDate(timestamp), distinct_id, uuid), so only the team_id, toDate(timestamp) prefix
+# of this ordering is read in order: ClickHouse goes through the newest days first and stops once it has enough rows,
+# sorting the rows of each day it reads. uuid breaks ties between events with the same timestamp, so that pages can be
+# resumed with EVENT_CURSOR_CONDITION
 SELECT_EVENT_WITH_ARRAY_PROPS_SQL = """
 SELECT
     uuid,
@@ -181,7 +268,7 @@ FROM
     events
 where team_id = %(team_id)s
 {conditions}
-ORDER BY toDate(timestamp) DESC, timestamp DESC {limit}
+ORDER BY team_id DESC, toDate(timestamp) DESC, timestamp DESC, uuid DESC {limit}
 """
 
 SELECT_EVENT_WITH_PROP_SQL = """
@@ -199,7 +286,13 @@ WHERE
 team_id = %(team_id)s
 {conditions}
 {filters}
-ORDER BY toDate(timestamp) DESC, timestamp DESC {limit}
+ORDER BY team_id DESC, toDate(timestamp) DESC, timestamp DESC, uuid DESC {limit}
+"""
+
+# Events after (timestamp, uuid) in the order above. The date condition lets the primary key skip newer days
+EVENT_CURSOR_CONDITION = """
+AND toDate(timestamp) <= %(cursor_date)s
+AND timestamp <= %(cursor_timestamp)s AND (timestamp < %(cursor_timestamp)s OR uuid < toUUID(%(cursor_uuid)s))
 """
 
 SELECT_ONE_EVENT_SQL = """
@@ -223,12 +316,12 @@ NULL_SQL = """
 SELECT toUInt16(0) AS total, {interval}(toDateTime('{date_to}') - number * {seconds_in_interval}) as day_start from numbers({num_intervals})
 """
 
-NULL_BREAKDOWN_SQL = """
-SELECT toUInt16(0) AS total, {interval}(toDateTime('{date_to}') - number * {seconds_in_interval}) as day_start, breakdown_value from numbers({num_intervals})
+NULL_MULTI_SQL = """
+SELECT toUInt8({date_window}) AS date_window, {interval}(toDateTime('{date_to}') - number * {seconds_in_interval}) as day_start, {totals} from numbers({num_intervals})
 """
 
-EVENT_JOIN_PERSON_SQL = """
-INNER JOIN (SELECT person_id, distinct_id FROM person_distinct_id WHERE team_id = %(team_id)s) as pid ON events.distinct_id = pid.distinct_id
+NULL_BREAKDOWN_SQL = """
+SELECT toUInt16(0) AS total, {interval}(toDateTime('{date_to}') - number * {seconds_in_interval}) as day_start, breakdown_value from numbers({num_intervals})
 """
 
 GET_EVENTS_WITH_PROPERTIES = """
@@ -1,4 +1,10 @@
 from ee.kafka_client.topics import KAFKA_PERSON, KAFKA_PERSON_UNIQUE_ID
+from posthog.settings import (
+    CLICKHOUSE_DATABASE,
+    CLICKHOUSE_PERSON_DICTIONARY_LIFETIME,
+    CLICKHOUSE_PERSON_DICTIONARY_PORT,
+    CLICKHOUSE_PERSON_DICTIONARY_USER,
+)
 
 from .clickhouse import KAFKA_COLUMNS, STORAGE_POLICY, kafka_engine, table_engine
 
@@ -10,6 +16,9 @@ DROP_PERSON_DISTINCT_ID_TABLE_SQL = """
 DROP TABLE person_distinct_id
 """
 
+# Persons and distinct ids are never updated in place. Every change inserts a new row with a higher version, deletions
+# insert a row with is_deleted = 1, and queries read the row with the highest version
+
 PERSONS_TABLE = "person"
 
 PERSONS_TABLE_BASE_SQL = """
@@ -19,19 +28,23 @@ CREATE TABLE {table_name}
     created_at DateTime64,
     team_id Int64,
     properties VARCHAR,
-    is_identified Boolean
+    is_identified Boolean,
+    is_deleted UInt8 DEFAULT 0,
+    version UInt64
     {extra_fields}
 ) ENGINE = {engine} 
 """
 
-PERSONS_TABLE_SQL = (
+PERSONS_TABLE_ENGINE_SQL = (
     PERSONS_TABLE_BASE_SQL
     + """Order By (team_id, id)
 {storage_policy}
 """
-).format(
+)
+
+PERSONS_TABLE_SQL = PERSONS_TABLE_ENGINE_SQL.format(
     table_name=PERSONS_TABLE,
-    engine=table_engine(PERSONS_TABLE, "_timestamp"),
+    engine=table_engine(PERSONS_TABLE, "version"),
     extra_fields=KAFKA_COLUMNS,
     storage_policy=STORAGE_POLICY,
 )
@@ -49,6 +62,8 @@ created_at,
 team_id,
 properties,
 is_identified,
+is_deleted,
+version,
 _timestamp,
 _offset
 FROM kafka_{table_name} 
@@ -57,10 +72,19 @@ FROM kafka_{table_name}
 )
 
 GET_LATEST_PERSON_SQL = """
-SELECT * FROM person JOIN (
-    SELECT id, max(created_at) as created_at FROM person WHERE team_id = %(team_id)s GROUP BY id
-) as person_max ON person.id = person_max.id AND person.created_at = person_max.created_at
-WHERE team_id = %(team_id)s
+SELECT id, created_at, team_id, properties, is_identified FROM (
+    SELECT
+        id,
+        argMax(created_at, version) as created_at,
+        team_id,
+        argMax(properties, version) as properties,
+        argMax(is_identified, version) as is_identified,
+        argMax(is_deleted, version) as is_deleted
+    FROM person
+    WHERE team_id = %(team_id)s
+    GROUP BY team_id, id
+)
+WHERE is_deleted = 0
 {query}
 """
 
@@ -75,7 +99,7 @@ GET_LATEST_PERSON_ID_SQL = """
 GET_PERSON_SQL = """
 SELECT * FROM ({latest_person_sql}) person WHERE team_id = %(team_id)s
 """.format(
-    latest_person_sql=GET_LATEST_PERSON_SQL
+    latest_person_sql=GET_LATEST_PERSON_SQL.format(query="")
 )
 
 PERSONS_DISTINCT_ID_TABLE = "person_distinct_id"
@@ -86,19 +110,23 @@ CREATE TABLE {table_name}
     id Int64,
     distinct_id VARCHAR,
     person_id UUID,
-    team_id Int64
+    team_id Int64,
+    is_deleted UInt8 DEFAULT 0,
+    version UInt64
     {extra_fields}
 ) ENGINE = {engine} 
 """
 
-PERSONS_DISTINCT_ID_TABLE_SQL = (
+PERSONS_DISTINCT_ID_TABLE_ENGINE_SQL = (
     PERSONS_DISTINCT_ID_TABLE_BASE_SQL
     + """Order By (team_id, distinct_id, person_id, id)
 {storage_policy}
 """
-).format(
+)
+
+PERSONS_DISTINCT_ID_TABLE_SQL = PERSONS_DISTINCT_ID_TABLE_ENGINE_SQL.format(
     table_name=PERSONS_DISTINCT_ID_TABLE,
-    engine=table_engine(PERSONS_DISTINCT_ID_TABLE, "_timestamp"),
+    engine=table_engine(PERSONS_DISTINCT_ID_TABLE, "version"),
     extra_fields=KAFKA_COLUMNS,
     storage_policy=STORAGE_POLICY,
 )
@@ -115,6 +143,8 @@ id,
 distinct_id,
 person_id,
 team_id,
+is_deleted,
+version,
 _timestamp,
 _offset
 FROM kafka_{table_name} 
@@ -122,41 +152,142 @@ FROM kafka_{table_name}
     table_name=PERSONS_DISTINCT_ID_TABLE
 )
 
-GET_DISTINCT_IDS_SQL = """
-SELECT * FROM person_distinct_id WHERE team_id = %(team_id)s
+# The person each distinct id of the team belongs to now. A distinct id moved to another person has rows for both,
+# the latest version wins
+GET_TEAM_PERSON_DISTINCT_IDS = """
+SELECT argMax(id, version) as id, distinct_id, argMax(person_id, version) as person_id, team_id
+FROM person_distinct_id
+WHERE team_id = %(team_id)s
+GROUP BY team_id, distinct_id
+HAVING argMax(is_deleted, version) = 0
 """
 
-GET_DISTINCT_IDS_SQL_BY_ID = """
-SELECT * FROM person_distinct_id WHERE team_id = %(team_id)s AND person_id = %(person_id)s
+# Dictionaries mapping distinct ids to person ids and person ids to the latest person properties, so that queries can
+# look persons up with dictGet instead of joining all of a team's persons into a hash table
+
+PERSON_DISTINCT_ID_DICTIONARY = "{}.person_distinct_id_dict".format(CLICKHOUSE_DATABASE)
+PERSON_DICTIONARY = "{}.person_dict".format(CLICKHOUSE_DATABASE)
+
+PERSON_DICTIONARY_SOURCE = """
+SOURCE(CLICKHOUSE(HOST 'localhost' PORT {port} USER '{user}' DB '{database}' TABLE '{table}'))
+LAYOUT(COMPLEX_KEY_HASHED())
+LIFETIME(MIN 0 MAX {lifetime})
 """
 
+PERSON_DISTINCT_ID_LATEST_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS person_distinct_id_latest AS
+SELECT team_id, distinct_id, argMax(person_id, version) AS person_id
+FROM person_distinct_id
+GROUP BY team_id, distinct_id
+HAVING argMax(is_deleted, version) = 0
+"""
+
+PERSON_DISTINCT_ID_DICTIONARY_SQL = (
+    """
+CREATE DICTIONARY IF NOT EXISTS {dictionary}
+(
+    team_id Int64,
+    distinct_id String,
+    person_id UUID
+)
+PRIMARY KEY team_id, distinct_id
+"""
+    + PERSON_DICTIONARY_SOURCE
+).format(
+    dictionary=PERSON_DISTINCT_ID_DICTIONARY,
+    port=CLICKHOUSE_PERSON_DICTIONARY_PORT,
+    user=CLICKHOUSE_PERSON_DICTIONARY_USER,
+    database=CLICKHOUSE_DATABASE,
+    table="person_distinct_id_latest",
+    lifetime=CLICKHOUSE_PERSON_DICTIONARY_LIFETIME,
+)
+
+PERSON_LATEST_VIEW_SQL = """
+CREATE VIEW IF NOT EXISTS person_latest AS
+SELECT id, team_id, argMax(properties, version) AS properties
+FROM person
+GROUP BY team_id, id
+HAVING argMax(is_deleted, version) = 0
+"""
+
+PERSON_DICTIONARY_SQL = (
+    """
+CREATE DICTIONARY IF NOT EXISTS {dictionary}
+(
+    id UUID,
+    team_id Int64,
+    properties String
+)
+PRIMARY KEY id
+"""
+    + PERSON_DICTIONARY_SOURCE
+).format(
+    dictionary=PERSON_DICTIONARY,
+    port=CLICKHOUSE_PERSON_DICTIONARY_PORT,
+    user=CLICKHOUSE_PERSON_DICTIONARY_USER,
+    database=CLICKHOUSE_DATABASE,
+    table="person_latest",
+    lifetime=CLICKHOUSE_PERSON_DICTIONARY_LIFETIME,
+)
+
+DROP_PERSON_DICTIONARIES_SQL = [
+    "DROP DICTIONARY IF EXISTS {}".format(PERSON_DISTINCT_ID_DICTIONARY),
+    "DROP DICTIONARY IF EXISTS {}".format(PERSON_DICTIONARY),
+    "DROP TABLE IF EXISTS person_distinct_id_latest",
+    "DROP TABLE IF EXISTS person_latest",
+]
+
+RELOAD_PERSON_DICTIONARIES_SQL = [
+    "SYSTEM RELOAD DICTIONARY {}".format(PERSON_DISTINCT_ID_DICTIONARY),
+    "SYSTEM RELOAD DICTIONARY {}".format(PERSON_DICTIONARY),
+]
+
+# The person of events, joined from person_distinct_id or looked up in the dictionary
+PERSON_DISTINCT_ID_JOIN_SQL = """
+{{join_type}} JOIN ({person_distinct_ids}) AS pdi ON pdi.distinct_id = {{distinct_id}}
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS
+)
+
+PERSON_DISTINCT_ID_DICT_KEY = "(toInt64(%(team_id)s), {distinct_id})"
+
+PERSON_ID_DICT_GET_SQL = "dictGet('{dictionary}', 'person_id', {key})"
+
+PERSON_ID_DICT_HAS_SQL = "dictHas('{dictionary}', {key})"
+
+PERSON_PROPERTIES_DICT_GET_SQL = "dictGet('{dictionary}', 'properties', tuple({person_id}))"
+
+GET_DISTINCT_IDS_SQL = GET_TEAM_PERSON_DISTINCT_IDS
+
+GET_DISTINCT_IDS_SQL_BY_ID = """
+SELECT * FROM ({person_distinct_ids}) WHERE person_id = %(person_id)s
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS
+)
+
 GET_PERSON_IDS_BY_FILTER = """
 SELECT DISTINCT p.id
 FROM ({latest_person_sql}) AS p
-INNER JOIN (
-    SELECT person_id, distinct_id
-    FROM person_distinct_id
-    WHERE team_id = %(team_id)s
-) AS pid ON p.id = pid.person_id
+INNER JOIN ({person_distinct_ids}) AS pid ON p.id = pid.person_id
 WHERE team_id = %(team_id)s
   {distinct_query}
 """.format(
-    latest_person_sql=GET_LATEST_PERSON_SQL, distinct_query="{distinct_query}"
+    latest_person_sql=GET_LATEST_PERSON_SQL,
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS,
+    distinct_query="{distinct_query}",
 )
 
 GET_PERSON_BY_DISTINCT_ID = """
 SELECT p.id
 FROM ({latest_person_sql}) AS p
-INNER JOIN (
-    SELECT person_id, distinct_id
-    FROM person_distinct_id
-    WHERE team_id = %(team_id)s
-) AS pid ON p.id = pid.person_id
+INNER JOIN ({person_distinct_ids}) AS pid ON p.id = pid.person_id
 WHERE team_id = %(team_id)s
   AND pid.distinct_id = %(distinct_id)s
   {distinct_query}
 """.format(
-    latest_person_sql=GET_LATEST_PERSON_SQL, distinct_query="{distinct_query}"
+    latest_person_sql=GET_LATEST_PERSON_SQL,
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS,
+    distinct_query="{distinct_query}",
 )
 
 GET_PERSONS_BY_DISTINCT_IDS = """
@@ -168,63 +299,47 @@ SELECT
     p.is_identified,
     groupArray(pid.distinct_id) as distinct_ids
 FROM 
-    person as p 
+    ({latest_person_sql}) as p 
 INNER JOIN 
-    person_distinct_id as pid on p.id = pid.person_id 
+    ({person_distinct_ids}) as pid on p.id = pid.person_id 
 WHERE 
-    team_id = %(team_id)s 
-    AND distinct_id IN (%(distinct_ids)s)
+    pid.distinct_id IN (%(distinct_ids)s)
 GROUP BY
     p.id,
     p.created_at,
     p.team_id,
     p.properties,
     p.is_identified
-"""
+""".format(
+    latest_person_sql=GET_LATEST_PERSON_SQL.format(query=""), person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS,
+)
 
 PERSON_DISTINCT_ID_EXISTS_SQL = """
-SELECT count(*) FROM person_distinct_id
+SELECT count(*) FROM ({person_distinct_ids}) AS person_distinct_id
 inner join (
-    SELECT arrayJoin({}) as distinct_id
+    SELECT arrayJoin({{}}) as distinct_id
     ) as id_params ON id_params.distinct_id = person_distinct_id.distinct_id
-where person_distinct_id.team_id = %(team_id)s
-"""
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS
+)
 
 INSERT_PERSON_SQL = """
-INSERT INTO person SELECT %(id)s, %(created_at)s, %(team_id)s, %(properties)s, %(is_identified)s, now(), 0
+INSERT INTO person SELECT %(id)s, %(created_at)s, %(team_id)s, %(properties)s, %(is_identified)s, %(is_deleted)s, %(version)s, now(), 0
 """
 
 INSERT_PERSON_DISTINCT_ID = """
-INSERT INTO person_distinct_id SELECT %(id)s, %(distinct_id)s, %(person_id)s, %(team_id)s, now(), 0 VALUES
-"""
-
-UPDATE_PERSON_PROPERTIES = """
-ALTER TABLE person UPDATE properties = %(properties)s where id = %(id)s
-"""
-
-UPDATE_PERSON_ATTACHED_DISTINCT_ID = """
-ALTER TABLE person_distinct_id UPDATE person_id = %(person_id)s where distinct_id = %(distinct_id)s
-"""
-
-DELETE_PERSON_BY_ID = """
-ALTER TABLE person DELETE where id = %(id)s
+INSERT INTO person_distinct_id SELECT %(id)s, %(distinct_id)s, %(person_id)s, %(team_id)s, %(is_deleted)s, %(version)s, now(), 0 VALUES
 """
 
 DELETE_PERSON_EVENTS_BY_ID = """
 ALTER TABLE events DELETE
 where distinct_id IN (
-    SELECT distinct_id FROM person_distinct_id WHERE person_id=%(id)s AND team_id = %(team_id)s
+    SELECT distinct_id FROM ({person_distinct_ids}) WHERE person_id = %(id)s
 )
 AND team_id = %(team_id)s
-"""
-
-DELETE_PERSON_DISTINCT_ID_BY_PERSON_ID = """
-ALTER TABLE person_distinct_id DELETE where person_id = %(id)s
-"""
-
-UPDATE_PERSON_IS_IDENTIFIED = """
-ALTER TABLE person UPDATE is_identified = %(is_identified)s where id = %(id)s
-"""
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS
+)
 
 PERSON_TREND_SQL = """
 SELECT DISTINCT distinct_id FROM events WHERE team_id = %(team_id)s {entity_filter} {filters} {parsed_date_from} {parsed_date_to} {person_filter}
@@ -234,27 +349,78 @@ PEOPLE_THROUGH_DISTINCT_SQL = """
 SELECT id, created_at, team_id, properties, is_identified, groupArray(distinct_id) FROM (
     {latest_person_sql}
 ) as person INNER JOIN (
-    SELECT DISTINCT person_id, distinct_id FROM person_distinct_id WHERE distinct_id IN ({content_sql}) AND team_id = %(team_id)s
+    SELECT DISTINCT person_id, distinct_id FROM ({person_distinct_ids}) WHERE distinct_id IN ({content_sql})
 ) as pdi ON person.id = pdi.person_id
 WHERE team_id = %(team_id)s
 GROUP BY id, created_at, team_id, properties, is_identified
 LIMIT 200 OFFSET %(offset)s
-"""
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS,
+    latest_person_sql="{latest_person_sql}",
+    content_sql="{content_sql}",
+)
 
 PEOPLE_SQL = """
 SELECT id, created_at, team_id, properties, is_identified, groupArray(distinct_id) FROM (
     {latest_person_sql}
 ) as person INNER JOIN (
-    SELECT DISTINCT person_id, distinct_id FROM person_distinct_id WHERE person_id IN ({content_sql}) AND team_id = %(team_id)s
+    SELECT DISTINCT person_id, distinct_id FROM ({person_distinct_ids}) WHERE person_id IN ({content_sql})
 ) as pdi ON person.id = pdi.person_id GROUP BY id, created_at, team_id, properties, is_identified
 LIMIT 200 OFFSET %(offset)s 
-"""
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS,
+    latest_person_sql="{latest_person_sql}",
+    content_sql="{content_sql}",
+)
 
 GET_DISTINCT_IDS_BY_PROPERTY_SQL = """
-SELECT distinct_id FROM person_distinct_id WHERE person_id IN
+SELECT distinct_id FROM ({person_distinct_ids}) WHERE person_id IN
 (
-    SELECT id
-    FROM person
-    WHERE team_id = %(team_id)s {filters}
-) AND team_id = %(team_id)s
+    SELECT id FROM ({latest_person_sql})
+)
+""".format(
+    person_distinct_ids=GET_TEAM_PERSON_DISTINCT_IDS, latest_person_sql=GET_LATEST_PERSON_SQL.format(query="{filters}")
+)
+
+# Moving existing persons and distinct ids to tables versioned by the version column. Rows get the version of the time
+# they were written, so later changes override them
+PERSONS_VERSIONED_TMP_TABLE_SQL = PERSONS_TABLE_ENGINE_SQL.format(
+    table_name=PERSONS_TABLE + "_versioned",
+    engine=table_engine(PERSONS_TABLE + "_versioned", "version"),
+    extra_fields=KAFKA_COLUMNS,
+    storage_policy=STORAGE_POLICY,
+)
+
+PERSONS_DISTINCT_ID_VERSIONED_TMP_TABLE_SQL = PERSONS_DISTINCT_ID_TABLE_ENGINE_SQL.format(
+    table_name=PERSONS_DISTINCT_ID_TABLE + "_versioned",
+    engine=table_engine(PERSONS_DISTINCT_ID_TABLE + "_versioned", "version"),
+    extra_fields=KAFKA_COLUMNS,
+    storage_policy=STORAGE_POLICY,
+)
+
+BACKFILL_PERSONS_VERSIONED_SQL = """
+INSERT INTO person_versioned
+SELECT id, created_at, team_id, properties, is_identified, 0, toUInt64(toUnixTimestamp(_timestamp)) * 1000000, _timestamp, _offset
+FROM person
 """
+
+BACKFILL_PERSONS_DISTINCT_ID_VERSIONED_SQL = """
+INSERT INTO person_distinct_id_versioned
+SELECT id, distinct_id, person_id, team_id, 0, toUInt64(toUnixTimestamp(_timestamp)) * 1000000, _timestamp, _offset
+FROM person_distinct_id
+"""
+
+SWAP_PERSONS_VERSIONED_TABLES_SQL = """
+RENAME TABLE
+    person TO person_before_versioning,
+    person_versioned TO person,
+    person_distinct_id TO person_distinct_id_before_versioning,
+    person_distinct_id_versioned TO person_distinct_id
+"""
+
+DROP_PERSONS_KAFKA_TABLES_SQL = [
+    "DROP TABLE IF EXISTS person_mv",
+    "DROP TABLE IF EXISTS kafka_person",
+    "DROP TABLE IF EXISTS person_distinct_id_mv",
+    "DROP TABLE IF EXISTS kafka_person_distinct_id",
+]
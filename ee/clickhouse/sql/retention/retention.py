@@ -8,10 +8,10 @@ SELECT
 FROM (
     SELECT 
     timestamp AS event_date,
-    pdi.person_id as person_id
-    FROM events e join (SELECT person_id, distinct_id FROM person_distinct_id WHERE team_id = %(team_id)s) pdi on e.distinct_id = pdi.distinct_id
+    {person_id} as person_id
+    FROM events e {person_join}
     where toDateTime(e.timestamp) >= toDateTime(%(start_date)s) AND toDateTime(e.timestamp) <= toDateTime(%(end_date)s)
-    AND e.team_id = %(team_id)s {returning_query} {filters}
+    AND e.team_id = %(team_id)s {person_condition} {returning_query} {filters}
     {extra_union}
 ) event
 JOIN (
@@ -26,18 +26,18 @@ ORDER BY period_to_event_days, period_between_events_days
 REFERENCE_EVENT_SQL = """
 SELECT DISTINCT 
 {trunc_func}(e.timestamp) as event_date,
-pdi.person_id as person_id
-from events e JOIN (SELECT person_id, distinct_id FROM person_distinct_id WHERE team_id = %(team_id)s) pdi on e.distinct_id = pdi.distinct_id
+{person_id} as person_id
+from events e {person_join}
 where toDateTime(e.timestamp) >= toDateTime(%(start_date)s) AND toDateTime(e.timestamp) <= toDateTime(%(end_date)s)
-AND e.team_id = %(team_id)s {target_query} {filters}
+AND e.team_id = %(team_id)s {person_condition} {target_query} {filters}
 """
 
 REFERENCE_EVENT_UNIQUE_SQL = """
 SELECT DISTINCT 
 min({trunc_func}(e.timestamp)) as event_date,
-pdi.person_id as person_id
-from events e JOIN (SELECT person_id, distinct_id FROM person_distinct_id WHERE team_id = %(team_id)s) pdi on e.distinct_id = pdi.distinct_id
-WHERE e.team_id = %(team_id)s {target_query} {filters} 
+{person_id} as person_id
+from events e {person_join}
+WHERE e.team_id = %(team_id)s {person_condition} {target_query} {filters} 
 GROUP BY person_id HAVING
 event_date >= toDateTime(%(start_date)s) AND event_date <= toDateTime(%(end_date)s)
 """
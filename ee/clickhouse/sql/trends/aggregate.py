@@ -3,3 +3,7 @@ SELECT groupArray(day_start), groupArray(count) FROM (
     SELECT SUM(total) AS count, day_start from ({null_sql} UNION ALL {content_sql}) group by day_start order by day_start
 )
 """
+
+AGGREGATE_MULTI_SQL = """
+SELECT date_window, day_start, {sums} from ({null_sql} UNION ALL {content_sql}) group by date_window, day_start order by date_window, day_start
+"""
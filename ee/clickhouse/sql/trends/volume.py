@@ -5,3 +5,11 @@ SELECT {aggregate_operation} as total, toDateTime({interval}({timestamp}), 'UTC'
 VOLUME_ACTIONS_SQL = """
 SELECT {aggregate_operation} as total, toDateTime({interval}({timestamp}), 'UTC') as day_start from events {event_join} where team_id = {team_id} and {actions_query} {filters} {parsed_date_from} {parsed_date_to} GROUP BY {interval}({timestamp})
 """
+
+VOLUME_ROLLUP_SQL = """
+SELECT {aggregate_operation} as total, toDateTime({interval}(toDateTime(day, 'UTC')), 'UTC') as day_start from events_daily_rollup where team_id = {team_id} and event = %(event)s {parsed_date_from} {parsed_date_to} GROUP BY {interval}(toDateTime(day, 'UTC'))
+"""
+
+VOLUME_MULTI_SQL = """
+SELECT date_window, toDateTime({interval}(timestamp), 'UTC') as day_start, {aggregate_operations} from events ARRAY JOIN {date_windows} AS date_window {event_join} where team_id = {team_id} and ({entities_query}) {filters} and ({date_windows_query}) GROUP BY date_window, {interval}(timestamp)
+"""
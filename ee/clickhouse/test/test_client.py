@@ -1,10 +1,20 @@
 import datetime
+from unittest.mock import patch
 
 import fakeredis
 from django.test import TestCase
 from freezegun import freeze_time
 
-from ee.clickhouse.client import CACHE_TTL, _deserialize, _key_hash, cache_sync_execute
+from ee.clickhouse.client import (
+    CACHE_STALE_TTL,
+    CACHE_TTL,
+    TooManyConcurrentQueries,
+    _deserialize,
+    _key_hash,
+    _serialize,
+    cache_sync_execute,
+    sync_execute,
+)
 
 
 class ClickhouseClientTestCase(TestCase):
@@ -17,7 +27,7 @@ class ClickhouseClientTestCase(TestCase):
         args = None
         res = cache_sync_execute(query, args=args, redis_client=self.redis_client)
         cache = self.redis_client.get(_key_hash(query, args=args))
-        cache_res = _deserialize(cache)
+        cache_res, _ = _deserialize(cache)
         self.assertEqual(res, cache_res)
         ts_end = datetime.datetime.now()
         dur = (ts_end - ts_start).microseconds
@@ -40,6 +50,28 @@ class ClickhouseClientTestCase(TestCase):
         with freeze_time(start.isoformat()):
             exists = self.redis_client.exists(_key_hash(query, args=args))
             self.assertTrue(exists)
-        with freeze_time(start + datetime.timedelta(seconds=CACHE_TTL + 10)):
+        with freeze_time(start + datetime.timedelta(seconds=CACHE_TTL + CACHE_STALE_TTL + 10)):
             exists = self.redis_client.exists(_key_hash(query, args=args))
             self.assertFalse(exists)
+
+    def test_stale_result_served_while_refreshing(self):
+        query = "select 1"
+        cache_sync_execute(query, redis_client=self.redis_client, ttl=CACHE_TTL)
+        self.redis_client.set(_key_hash(query, None), _serialize([(2,)], 0))
+
+        # someone else is refreshing the result
+        self.redis_client.set(_key_hash(query, None) + b"_lock", 1)
+        self.assertEqual(cache_sync_execute(query, redis_client=self.redis_client), [(2,)])
+
+        self.redis_client.delete(_key_hash(query, None) + b"_lock")
+        self.assertEqual(cache_sync_execute(query, redis_client=self.redis_client), [(1,)])
+
+    @patch("ee.clickhouse.client.CLICKHOUSE_MAX_CONCURRENT_QUERIES_PER_TEAM", 0)
+    @patch("ee.clickhouse.client.CLICKHOUSE_MAX_EXECUTION_TIME", 0)
+    def test_concurrent_queries_per_team_limit(self):
+        with self.assertRaises(TooManyConcurrentQueries):
+            sync_execute("select 1", team_id=1)
+
+        # only queries explicitly run on behalf of a team are limited, whatever their args
+        self.assertEqual(sync_execute("select %(team_id)s", {"team_id": 1}), [(1,)])
+        self.assertEqual(sync_execute("select 1"), [(1,)])
@@ -5,10 +5,14 @@ from django.db import DEFAULT_DB_ALIAS
 
 from ee.clickhouse.client import sync_execute
 from ee.clickhouse.sql.events import (
+    DROP_EVENTS_DAILY_ROLLUP_MV_SQL,
+    DROP_EVENTS_DAILY_ROLLUP_TABLE_SQL,
     DROP_EVENTS_TABLE_SQL,
     DROP_EVENTS_WITH_ARRAY_PROPS_TABLE_SQL,
     DROP_MAT_EVENTS_PROP_TABLE_SQL,
     DROP_MAT_EVENTS_WITH_ARRAY_PROPS_TABLE_SQL,
+    EVENTS_DAILY_ROLLUP_MV_SQL,
+    EVENTS_DAILY_ROLLUP_TABLE_SQL,
     EVENTS_TABLE_SQL,
     EVENTS_WITH_PROPS_TABLE_SQL,
     MAT_EVENT_PROP_TABLE_SQL,
@@ -17,8 +21,13 @@ from ee.clickhouse.sql.events import (
 from ee.clickhouse.sql.person import (
     DROP_PERSON_DISTINCT_ID_TABLE_SQL,
     DROP_PERSON_TABLE_SQL,
+    PERSON_DICTIONARY_SQL,
+    PERSON_DISTINCT_ID_DICTIONARY_SQL,
+    PERSON_DISTINCT_ID_LATEST_VIEW_SQL,
+    PERSON_LATEST_VIEW_SQL,
     PERSONS_DISTINCT_ID_TABLE_SQL,
     PERSONS_TABLE_SQL,
+    RELOAD_PERSON_DICTIONARIES_SQL,
 )
 from ee.clickhouse.sql.session_recording_events import (
     DROP_SESSION_RECORDING_EVENTS_TABLE_SQL,
@@ -47,6 +56,14 @@ class ClickhouseTestMixin:
     def _create_person_tables(self):
         sync_execute(PERSONS_TABLE_SQL)
         sync_execute(PERSONS_DISTINCT_ID_TABLE_SQL)
+        sync_execute(PERSON_DISTINCT_ID_LATEST_VIEW_SQL)
+        sync_execute(PERSON_LATEST_VIEW_SQL)
+        sync_execute(PERSON_DISTINCT_ID_DICTIONARY_SQL)
+        sync_execute(PERSON_DICTIONARY_SQL)
+
+    def _reload_person_dictionaries(self):
+        for query in RELOAD_PERSON_DICTIONARIES_SQL:
+            sync_execute(query)
 
     def _destroy_session_recording_tables(self):
         sync_execute(DROP_SESSION_RECORDING_EVENTS_TABLE_SQL)
@@ -59,12 +76,16 @@ class ClickhouseTestMixin:
         sync_execute(DROP_EVENTS_WITH_ARRAY_PROPS_TABLE_SQL)
         sync_execute(DROP_MAT_EVENTS_WITH_ARRAY_PROPS_TABLE_SQL)
         sync_execute(DROP_MAT_EVENTS_PROP_TABLE_SQL)
+        sync_execute(DROP_EVENTS_DAILY_ROLLUP_MV_SQL)
+        sync_execute(DROP_EVENTS_DAILY_ROLLUP_TABLE_SQL)
 
     def _create_event_tables(self):
         sync_execute(EVENTS_TABLE_SQL)
         sync_execute(EVENTS_WITH_PROPS_TABLE_SQL)
         sync_execute(MAT_EVENTS_WITH_PROPS_TABLE_SQL)
         sync_execute(MAT_EVENT_PROP_TABLE_SQL)
+        sync_execute(EVENTS_DAILY_ROLLUP_TABLE_SQL)
+        sync_execute(EVENTS_DAILY_ROLLUP_MV_SQL)
 
     @contextmanager
     def _assertNumQueries(self, func):
@@ -14,6 +14,7 @@ from ee.clickhouse.models.action import format_action_filter
 from ee.clickhouse.models.cohort import format_filter_query
 from ee.clickhouse.models.person import ClickhousePersonSerializer
 from ee.clickhouse.models.property import parse_prop_clauses
+from ee.clickhouse.models.util import person_id_lookup
 from ee.clickhouse.queries.util import parse_timestamps
 from ee.clickhouse.sql.person import GET_LATEST_PERSON_SQL, PEOPLE_SQL, PEOPLE_THROUGH_DISTINCT_SQL, PERSON_TREND_SQL
 from ee.clickhouse.sql.stickiness.stickiness_people import STICKINESS_PEOPLE_SQL
@@ -137,8 +138,11 @@ class ClickhouseActionsViewSet(ActionViewSet):
             "offset": filter.offset,
         }
 
+        person_join, person_id, _ = person_id_lookup(join_type="LEFT")
         content_sql = STICKINESS_PEOPLE_SQL.format(
             entity_filter=entity_sql,
+            person_join=person_join,
+            person_id=person_id,
             parsed_date_from=(parsed_date_from or ""),
             parsed_date_to=(parsed_date_to or ""),
             filters="{filters}".format(filters=prop_filters) if filter.properties else "",
@@ -1,84 +1,158 @@
-from typing import Any, Dict, List, Optional
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
 
+from dateutil.parser import isoparse
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from ee.clickhouse.client import sync_execute
+from ee.clickhouse.client import sync_execute, sync_execute_iter
 from ee.clickhouse.models.action import format_action_filter
-from ee.clickhouse.models.event import ClickhouseEventSerializer, determine_event_conditions
-from ee.clickhouse.models.person import get_persons_by_distinct_ids
+from ee.clickhouse.models.event import (
+    ClickhouseEventSerializer,
+    decode_event_cursor,
+    determine_event_conditions,
+    encode_event_cursor,
+    event_cursor_params,
+)
 from ee.clickhouse.models.property import get_property_values_for_key, parse_prop_clauses
 from ee.clickhouse.queries.clickhouse_session_recording import SessionRecording
 from ee.clickhouse.queries.util import parse_timestamps
-from ee.clickhouse.sql.events import SELECT_EVENT_WITH_ARRAY_PROPS_SQL, SELECT_EVENT_WITH_PROP_SQL, SELECT_ONE_EVENT_SQL
-from posthog.api.event import EventViewSet
-from posthog.models import Filter, Person, Team
+from ee.clickhouse.sql.events import (
+    EVENT_CURSOR_CONDITION,
+    SELECT_EVENT_WITH_ARRAY_PROPS_SQL,
+    SELECT_EVENT_WITH_PROP_SQL,
+    SELECT_ONE_EVENT_SQL,
+)
+from posthog.api.event import EVENT_EXPORT_COLUMNS, EXPORT_BATCH_SIZE, EventViewSet
+from posthog.models import EventHydrator, Filter, Person, Team
 from posthog.models.action import Action
-from posthog.utils import convert_property_value
+from posthog.settings import CLICKHOUSE_EVENTS_MAX_PAGE_SIZE, CLICKHOUSE_EVENTS_PAGE_SIZE
+from posthog.utils import batches, convert_property_value, streaming_csv_response
 
 
 class ClickhouseEventsViewSet(EventViewSet):
-    def _get_people(self, query_result: List[Dict], team: Team) -> Dict[str, Any]:
-        distinct_ids = [event[5] for event in query_result]
-        persons = get_persons_by_distinct_ids(team.pk, distinct_ids)
+    def _get_people(self, query_result: List[Dict], team: Team) -> Dict[str, Person]:
+        return EventHydrator.for_request(self.request, team.pk).get_persons(event[5] for event in query_result)
 
-        distinct_to_person: Dict[str, Person] = {}
-        for person in persons:
-            for distinct_id in person.distinct_ids:
-                distinct_to_person[distinct_id] = person
-        return distinct_to_person
-
-    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
-        team = self.team
+    def _query_filters(self, request: Request, team: Team) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """Event conditions, property and action filters and their params, or None if nothing can match."""
         filter = Filter(request=request)
-        if request.GET.get("after"):
-            filter._date_from = request.GET["after"]
-        if request.GET.get("before"):
-            filter._date_to = request.GET["before"]
-        limit = "LIMIT 101"
         conditions, condition_params = determine_event_conditions(request.GET.dict())
         prop_filters, prop_filter_params = parse_prop_clauses(filter.properties, team.pk)
         if request.GET.get("action_id"):
             action = Action.objects.get(pk=request.GET["action_id"])
             if action.steps.count() == 0:
-                return Response({"next": False, "results": []})
+                return None
             action_query, params = format_action_filter(action)
             prop_filters += " AND {}".format(action_query)
             prop_filter_params = {**prop_filter_params, **params}
+        return conditions, prop_filters, {"team_id": team.pk, **condition_params, **prop_filter_params}
+
+    def _page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.GET.get("limit", CLICKHOUSE_EVENTS_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer."})
+        return min(max(page_size, 1), CLICKHOUSE_EVENTS_MAX_PAGE_SIZE)
 
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        """
+        Events, newest first.
+
+        Pages are resumed from an opaque ?cursor= token, taken from the "next" url. Unlike paging with ?before=, this
+        doesn't skip or repeat events with the same timestamp.
+        """
+        team = self.team
+        page_size = self._page_size(request)
+        query_filters = self._query_filters(request, team)
+        if query_filters is None:
+            return Response({"next": False, "results": []})
+        conditions, prop_filters, params = query_filters
+        if request.GET.get("cursor"):
+            conditions += EVENT_CURSOR_CONDITION
+            params = {**params, **event_cursor_params(*self._decode_cursor(request.GET["cursor"]))}
+
+        limit = "LIMIT {}".format(page_size + 1)
         if prop_filters != "":
             query_result = sync_execute(
-                SELECT_EVENT_WITH_PROP_SQL.format(conditions=conditions, limit=limit, filters=prop_filters),
-                {"team_id": team.pk, **condition_params, **prop_filter_params},
+                SELECT_EVENT_WITH_PROP_SQL.format(conditions=conditions, limit=limit, filters=prop_filters), params,
             )
         else:
             query_result = sync_execute(
-                SELECT_EVENT_WITH_ARRAY_PROPS_SQL.format(conditions=conditions, limit=limit),
-                {"team_id": team.pk, **condition_params},
+                SELECT_EVENT_WITH_ARRAY_PROPS_SQL.format(conditions=conditions, limit=limit), params
             )
 
         result = ClickhouseEventSerializer(
-            query_result[0:100], many=True, context={"people": self._get_people(query_result, team),},
+            query_result[0:page_size], many=True, context={"people": self._get_people(query_result, team),},
         ).data
 
-        if len(query_result) > 100:
-            path = request.get_full_path()
-            reverse = request.GET.get("orderBy", "-timestamp") != "-timestamp"
-            next_url: Optional[str] = request.build_absolute_uri(
-                "{}{}{}={}".format(
-                    path,
-                    "&" if "?" in path else "?",
-                    "after" if reverse else "before",
-                    query_result[99][3].strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-                )
-            )
+        if len(query_result) > page_size:
+            last_event = query_result[page_size - 1]
+            query = request.GET.copy()
+            query["cursor"] = encode_event_cursor(last_event[3], last_event[0])
+            next_url: Optional[str] = request.build_absolute_uri("{}?{}".format(request.path, query.urlencode()))
         else:
             next_url = None
 
         return Response({"next": next_url, "results": result})
 
+    @staticmethod
+    def _decode_cursor(cursor: str, export: bool = False) -> Tuple[datetime, UUID]:
+        try:
+            return decode_event_cursor(cursor)
+        except ValueError:
+            if not export:
+                raise ValidationError({"cursor": "Invalid cursor."})
+        # Exports can also be resumed from the timestamp and id of the last row received
+        try:
+            timestamp, uuid = cursor.rsplit(",", 1)
+            return isoparse(timestamp).astimezone(timezone.utc).replace(tzinfo=None), UUID(uuid)
+        except ValueError:
+            raise ValidationError({"cursor": "Invalid cursor."})
+
+    @action(methods=["GET"], detail=False)
+    def export(self, request: Request, **kwargs) -> StreamingHttpResponse:
+        """
+        Stream every event matching the list filters as CSV, newest first, with properties as JSON.
+
+        An interrupted export can be resumed with a ?cursor= token like the list's, or ?cursor=<timestamp>,<id> of the
+        last row received.
+        """
+        team = self.team
+        query_filters = self._query_filters(request, team)
+        if query_filters is None:
+            return streaming_csv_response(EVENT_EXPORT_COLUMNS, [], "events.csv")
+        conditions, prop_filters, params = query_filters
+        if request.GET.get("cursor"):
+            conditions += EVENT_CURSOR_CONDITION
+            params = {**params, **event_cursor_params(*self._decode_cursor(request.GET["cursor"], export=True))}
+        rows = sync_execute_iter(
+            SELECT_EVENT_WITH_PROP_SQL.format(conditions=conditions, filters=prop_filters, limit=""), params
+        )
+        return streaming_csv_response(EVENT_EXPORT_COLUMNS, self._export_rows(rows, team), "events.csv")
+
+    def _export_rows(self, rows: Iterator[Tuple], team: Team) -> Iterator[List[Any]]:
+        for events in batches(rows, EXPORT_BATCH_SIZE):
+            # A hydrator per batch, so that memory doesn't grow with the size of the export
+            serialized_events = ClickhouseEventSerializer(
+                events, many=True, context={"people": EventHydrator(team.pk).get_persons(event[5] for event in events)},
+            ).data
+            for event in serialized_events:
+                yield [
+                    event["id"],
+                    event["distinct_id"],
+                    json.dumps(event["properties"]),
+                    event["event"],
+                    event["timestamp"],
+                    event["person"],
+                ]
+
     def retrieve(self, request: Request, pk: Optional[int] = None, *args: Any, **kwargs: Any) -> Response:
 
         # TODO: implement getting elements
@@ -106,7 +180,10 @@ class ClickhouseEventsViewSet(EventViewSet):
     @action(methods=["GET"], detail=False)
     def session_recording(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         session_recording = SessionRecording().run(
-            team=self.team, filter=Filter(request=request), session_recording_id=request.GET.get("session_recording_id")
+            team=self.team,
+            filter=Filter(request=request),
+            session_recording_id=request.GET.get("session_recording_id"),
+            hydrator=EventHydrator.for_request(request, self.team_id),
         )
 
         return Response({"result": session_recording})
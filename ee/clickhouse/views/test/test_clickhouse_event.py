@@ -1,5 +1,10 @@
+import csv
+import io
 from uuid import uuid4
 
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+
 from ee.clickhouse.models.event import create_event
 from ee.clickhouse.util import ClickhouseTestMixin
 from posthog.api.test.test_event import test_event_api_factory
@@ -28,3 +33,61 @@ class ClickhouseTestEventApi(
 ):
     def test_live_action_events(self):
         pass
+
+    def test_pagination(self):
+        _create_person(team=self.team, distinct_ids=["1"])
+        for idx in range(0, 150):
+            _create_event(
+                team=self.team,
+                event="some event",
+                distinct_id="1",
+                timestamp=timezone.datetime(2019, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+                + relativedelta(days=idx, seconds=idx),
+            )
+        response = self.client.get("/api/event/?distinct_id=1").json()
+        self.assertEqual(len(response["results"]), 100)
+        self.assertIn("http://testserver/api/event/?distinct_id=1&cursor=", response["next"])
+
+        page2 = self.client.get(response["next"]).json()
+        self.assertEqual(len(page2["results"]), 50)
+        self.assertIsNone(page2["next"])
+
+    def test_pagination_same_timestamp(self):
+        _create_person(team=self.team, distinct_ids=["1"])
+        for idx in range(0, 25):
+            _create_event(
+                team=self.team,
+                event="event {}".format(idx),
+                distinct_id="1",
+                timestamp=timezone.datetime(2019, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+                - relativedelta(seconds=idx // 10),
+            )
+
+        events = []
+        next_url = "/api/event/?limit=10"
+        while next_url:
+            response = self.client.get(next_url).json()
+            self.assertLessEqual(len(response["results"]), 10)
+            events.extend(event["event"] for event in response["results"])
+            next_url = response["next"]
+        self.assertEqual(len(events), 25)
+        self.assertEqual(set(events), {"event {}".format(idx) for idx in range(0, 25)})
+
+    def test_pagination_invalid_cursor(self):
+        response = self.client.get("/api/event/?cursor=nonsense")
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_from_list_cursor(self):
+        _create_person(team=self.team, distinct_ids=["1"])
+        for idx in range(0, 3):
+            _create_event(
+                team=self.team,
+                event="event {}".format(idx),
+                distinct_id="1",
+                timestamp=timezone.datetime(2020, 1, 1, tzinfo=timezone.utc) + relativedelta(days=idx),
+            )
+        next_url = self.client.get("/api/event/?limit=1").json()["next"]
+
+        response = self.client.get(next_url.replace("/api/event/", "/api/event/export/"))
+        _, *rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row[3] for row in rows], ["event 1", "event 0"])
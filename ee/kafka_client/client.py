@@ -1,17 +1,32 @@
-import io
+import atexit
 import json
 from typing import Any, Callable, Dict, Optional
 
 import kafka_helper
+import statsd
+from celery.signals import worker_process_shutdown
 from google.protobuf.internal.encoder import _VarintBytes  # type: ignore
 from google.protobuf.json_format import MessageToJson
 from kafka import KafkaProducer as KP
 
 from ee.clickhouse.client import async_execute, sync_execute
 from ee.settings import KAFKA_ENABLED
-from posthog.settings import IS_HEROKU, KAFKA_HOSTS, TEST
+from posthog.settings import (
+    IS_HEROKU,
+    KAFKA_HOSTS,
+    KAFKA_PRODUCER_BATCH_SIZE,
+    KAFKA_PRODUCER_COMPRESSION_TYPE,
+    KAFKA_PRODUCER_LINGER_MS,
+    STATSD_HOST,
+    STATSD_PORT,
+    STATSD_PREFIX,
+    TEST,
+)
 from posthog.utils import SingletonDecorator
 
+if STATSD_HOST is not None:
+    statsd.Connection.set_defaults(host=STATSD_HOST, port=STATSD_PORT)
+
 
 class TestKafkaProducer:
     def __init__(self):
@@ -26,23 +41,46 @@ class TestKafkaProducer:
 
 class _KafkaProducer:
     def __init__(self):
+        # Messages are sent asynchronously in compressed batches, delivery is reported through callbacks
+        batching = {
+            "linger_ms": KAFKA_PRODUCER_LINGER_MS,
+            "batch_size": KAFKA_PRODUCER_BATCH_SIZE,
+            "compression_type": KAFKA_PRODUCER_COMPRESSION_TYPE,
+        }
         if TEST:
             self.producer = TestKafkaProducer()
         elif not IS_HEROKU:
-            self.producer = KP(bootstrap_servers=KAFKA_HOSTS)
+            self.producer = KP(bootstrap_servers=KAFKA_HOSTS, **batching)
         else:
-            self.producer = kafka_helper.get_kafka_producer(value_serializer=lambda d: d)
+            self.producer = kafka_helper.get_kafka_producer(value_serializer=lambda d: d, **batching)
+        self.counter = statsd.Counter("%s_posthog_kafka" % (STATSD_PREFIX,))
+
+        # Make sure messages still waiting in the batch get sent before the process exits
+        atexit.register(self.close)
+        worker_process_shutdown.connect(self.on_worker_shutdown, weak=False)
 
     @staticmethod
     def json_serializer(d):
         b = json.dumps(d).encode("utf-8")
         return b
 
+    def on_send_success(self, topic: str) -> Callable[[Any], None]:
+        return lambda record_metadata: self.counter.increment("%s_produce_success" % (topic,))
+
+    def on_send_failure(self, topic: str) -> Callable[[Exception], None]:
+        return lambda exception: self.counter.increment("%s_produce_failure" % (topic,))
+
     def produce(self, topic: str, data: Any, value_serializer: Optional[Callable[[Any], Any]] = None):
         if not value_serializer:
             value_serializer = self.json_serializer
         b = value_serializer(data)
-        self.producer.send(topic, b)
+        future = self.producer.send(topic, b)
+        if future is not None:
+            future.add_callback(self.on_send_success(topic))
+            future.add_errback(self.on_send_failure(topic))
+
+    def on_worker_shutdown(self, **kwargs):
+        self.close()
 
     def close(self):
         self.producer.flush()
@@ -61,11 +99,8 @@ class ClickhouseProducer:
 
     @staticmethod
     def proto_length_serializer(data: Any) -> bytes:
-        f = io.BytesIO()
-        f.write(_VarintBytes(data.ByteSize()))
-        f.write(data.SerializeToString())
-        f.seek(0)
-        return f.read()
+        # ByteSize() caches the computed size, so SerializeToString() doesn't have to calculate it again
+        return _VarintBytes(data.ByteSize()) + data.SerializeToString()
 
     def produce_proto(self, sql: str, topic: str, data: Any, sync: bool = True):
         if self.send_to_kafka:
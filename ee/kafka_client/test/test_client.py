@@ -0,0 +1,51 @@
+from unittest.mock import MagicMock, patch
+
+from celery.signals import worker_process_shutdown
+from django.test import TestCase
+
+from ee.kafka_client.client import _KafkaProducer
+
+
+@patch("ee.kafka_client.client.TEST", False)
+@patch("ee.kafka_client.client.IS_HEROKU", False)
+@patch("ee.kafka_client.client.KAFKA_HOSTS", "kafka:9092")
+@patch("ee.kafka_client.client.KAFKA_PRODUCER_LINGER_MS", 50)
+@patch("ee.kafka_client.client.KAFKA_PRODUCER_BATCH_SIZE", 1024)
+@patch("ee.kafka_client.client.KAFKA_PRODUCER_COMPRESSION_TYPE", "gzip")
+class KafkaProducerTestCase(TestCase):
+    def _producer(self) -> _KafkaProducer:
+        producer = _KafkaProducer()
+        self.addCleanup(worker_process_shutdown.disconnect, producer.on_worker_shutdown)
+        return producer
+
+    @patch("ee.kafka_client.client.KP")
+    def test_passes_batching_config_to_producer(self, kafka_producer):
+        self._producer()
+
+        kafka_producer.assert_called_once_with(
+            bootstrap_servers="kafka:9092", linger_ms=50, batch_size=1024, compression_type="gzip"
+        )
+
+    @patch("ee.kafka_client.client.KP")
+    def test_flushes_on_worker_shutdown(self, kafka_producer):
+        producer = self._producer()
+        producer.produce("events", {"event": "$pageview"})
+        kafka_producer.return_value.flush.assert_not_called()
+
+        worker_process_shutdown.send(sender=None)
+
+        kafka_producer.return_value.flush.assert_called_once_with()
+
+    @patch("ee.kafka_client.client.KP")
+    def test_counts_deliveries(self, kafka_producer):
+        producer = self._producer()
+        producer.counter = MagicMock()
+        future = kafka_producer.return_value.send.return_value
+
+        producer.produce("events", {"event": "$pageview"})
+        future.add_callback.call_args[0][0](None)
+        future.add_errback.call_args[0][0](Exception())
+
+        kafka_producer.return_value.send.assert_called_once_with("events", b'{"event": "$pageview"}')
+        producer.counter.increment.assert_any_call("events_produce_success")
+        producer.counter.increment.assert_any_call("events_produce_failure")
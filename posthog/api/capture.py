@@ -16,7 +16,7 @@ from posthog.models import Team
 from posthog.utils import cors_response, get_ip_address, load_data_from_request
 
 if settings.EE_AVAILABLE:
-    from ee.clickhouse.process_event import log_event, process_event_ee
+    from ee.clickhouse.process_event import log_event, process_event_ee, process_events_batch_ee
 
 
 def _datetime_from_seconds_or_millis(timestamp: str) -> datetime:
@@ -141,9 +141,10 @@ def get_event(request):
     else:
         events = [data]
 
+    distinct_ids = []
     for event in events:
         try:
-            distinct_id = _get_distinct_id(event)
+            distinct_ids.append(_get_distinct_id(event))
         except KeyError:
             return cors_response(
                 request,
@@ -165,43 +166,53 @@ def get_event(request):
                 ),
             )
 
-        if is_ee_enabled():
+    ip = get_ip_address(request)
+    site_url = request.build_absolute_uri("/")[:-1]
+
+    batch = [{"distinct_id": distinct_id, "data": event} for distinct_id, event in zip(distinct_ids, events)]
+
+    if is_ee_enabled():
+        if len(batch) > 1:
+            process_events_batch_ee(ip=ip, site_url=site_url, events=batch, team_id=team.id, now=now, sent_at=sent_at)
+        else:
             process_event_ee(
-                distinct_id=distinct_id,
-                ip=get_ip_address(request),
-                site_url=request.build_absolute_uri("/")[:-1],
-                data=event,
+                distinct_id=distinct_ids[0],
+                ip=ip,
+                site_url=site_url,
+                data=events[0],
                 team_id=team.id,
                 now=now,
                 sent_at=sent_at,
             )
-        else:
-            task_name = "posthog.tasks.process_event.process_event"
-            celery_queue = settings.CELERY_DEFAULT_QUEUE
-            if team.plugins_opt_in:
-                task_name += "_with_plugins"
-                celery_queue = settings.PLUGINS_CELERY_QUEUE
+    elif len(batch) > 1 and not team.plugins_opt_in:
+        # Ship multi-event payloads as a single task. The plugin server consumes events one by one, so
+        # teams that opted in to plugins still get a task per event.
+        celery_app.send_task(
+            name="posthog.tasks.process_event.process_events_batch",
+            queue=settings.CELERY_DEFAULT_QUEUE,
+            args=[ip, site_url, batch, team.id, now.isoformat(), sent_at],
+        )
+    else:
+        task_name = "posthog.tasks.process_event.process_event"
+        celery_queue = settings.CELERY_DEFAULT_QUEUE
+        if team.plugins_opt_in:
+            task_name += "_with_plugins"
+            celery_queue = settings.PLUGINS_CELERY_QUEUE
 
+        for distinct_id, event in zip(distinct_ids, events):
             celery_app.send_task(
                 name=task_name,
                 queue=celery_queue,
-                args=[
-                    distinct_id,
-                    get_ip_address(request),
-                    request.build_absolute_uri("/")[:-1],
-                    event,
-                    team.id,
-                    now.isoformat(),
-                    sent_at,
-                ],
+                args=[distinct_id, ip, site_url, event, team.id, now.isoformat(), sent_at,],
             )
 
-        if is_ee_enabled() and settings.LOG_TO_WAL:
+    if is_ee_enabled() and settings.LOG_TO_WAL:
+        for distinct_id, event in zip(distinct_ids, events):
             # log the event to kafka write ahead log for processing
             log_event(
                 distinct_id=distinct_id,
-                ip=get_ip_address(request),
-                site_url=request.build_absolute_uri("/")[:-1],
+                ip=ip,
+                site_url=site_url,
                 data=event,
                 team_id=team.id,
                 now=now,
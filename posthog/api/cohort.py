@@ -1,6 +1,7 @@
 from typing import Any, Dict, Optional
 
 from django.db.models import Count, QuerySet
+from django.utils import timezone
 from rest_framework import request, response, serializers, viewsets
 from rest_framework.permissions import IsAuthenticated
 
@@ -33,6 +34,7 @@ class CohortSerializer(serializers.ModelSerializer):
         request = self.context["request"]
         validated_data["created_by"] = request.user
         validated_data["is_calculating"] = True
+        validated_data["calculation_started_at"] = timezone.now()
         cohort = Cohort.objects.create(team_id=self.context["team_id"], **validated_data)
         calculate_cohort.delay(cohort_id=cohort.pk)
         return cohort
@@ -42,6 +44,7 @@ class CohortSerializer(serializers.ModelSerializer):
         cohort.groups = validated_data.get("groups", cohort.groups)
         cohort.deleted = validated_data.get("deleted", cohort.deleted)
         cohort.is_calculating = True
+        cohort.calculation_started_at = timezone.now()
         cohort.save()
         calculate_cohort.delay(cohort_id=cohort.pk)
         return cohort
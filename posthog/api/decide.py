@@ -1,16 +1,21 @@
 import json
 import secrets
+import time
 from typing import Any, Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 from django.conf import settings
-from django.http import HttpRequest, JsonResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
 from posthog.auth import PersonalAPIKeyAuthentication
-from posthog.models import FeatureFlag, Team
+from posthog.models import Team
+from posthog.models.feature_flag_matcher import get_feature_flag_matcher
 from posthog.utils import base64_to_json, cors_response, load_data_from_request
 
+# How often /decide/flag_definitions checks whether flags changed while waiting
+FLAG_DEFINITIONS_POLL_INTERVAL = 1  # seconds
+
 
 def _get_token(data, request):
     if request.POST.get("api_key"):
@@ -76,13 +81,8 @@ def get_team_from_token(request: HttpRequest, data_from_request: Dict[str, Any])
 
 
 def feature_flags(request: HttpRequest, team: Team, data: Dict[str, Any]) -> List[str]:
-    flags_enabled = []
-    feature_flags = FeatureFlag.objects.filter(team=team, active=True, deleted=False)
-    for feature_flag in feature_flags:
-        # distinct_id will always be a string, but data can have non-string values ("Any")
-        if feature_flag.distinct_id_matches(data["distinct_id"]):
-            flags_enabled.append(feature_flag.key)
-    return flags_enabled
+    # distinct_id will always be a string, but data can have non-string values ("Any")
+    return get_feature_flag_matcher(team.pk).get_active_flags(str(data["distinct_id"]))
 
 
 def parse_domain(url: Any) -> Optional[str]:
@@ -131,3 +131,109 @@ def get_decide(request: HttpRequest):
             if team.session_recording_opt_in and (on_permitted_domain(team, request) or len(team.app_urls) == 0):
                 response["sessionRecording"] = {"endpoint": "/s"}
     return cors_response(request, JsonResponse(response))
+
+
+def _validation_error(request: HttpRequest, message: str) -> HttpResponse:
+    return cors_response(request, JsonResponse({"code": "validation", "message": message}, status=400))
+
+
+@csrf_exempt
+def get_decide_batch(request: HttpRequest):
+    """
+    Feature flags of many distinct ids at once, for server-side libraries.
+
+    Takes a list of `distinct_ids` and optionally `person_properties`, mapping distinct ids to person properties to use
+    instead of the stored ones. Returns the active flags of each distinct id in `featureFlags`.
+
+    This evaluates flags against the stored properties of any persons, so it needs a personal API key rather than the
+    project token, which is public.
+    """
+    if request.method != "POST":
+        return _validation_error(request, "Send the distinct ids in the body of a POST request.")
+    try:
+        data_from_request = load_data_from_request(request)
+    except (json.decoder.JSONDecodeError, TypeError):
+        return _validation_error(request, "Malformed request data. Make sure you're sending valid JSON.")
+    if not data_from_request or not isinstance(data_from_request["data"], dict):
+        return _validation_error(request, "No data found. Make sure to send a JSON object in the body of the request.")
+
+    data = data_from_request["data"]
+    personal_api_key = PersonalAPIKeyAuthentication.find_key(request, data_from_request["body"], data)
+    team = Team.objects.get_team_from_token(personal_api_key, True) if personal_api_key else None
+    if team is None:
+        return _validation_error(
+            request, "Personal API key invalid. You can create a personal API key in PostHog account settings.",
+        )
+
+    distinct_ids = data.get("distinct_ids")
+    if not isinstance(distinct_ids, list):
+        return _validation_error(request, "You need to set a list of distinct IDs in `distinct_ids`.")
+    if len(distinct_ids) > settings.DECIDE_BATCH_MAX_DISTINCT_IDS:
+        return _validation_error(
+            request, "At most {} distinct IDs can be sent at once.".format(settings.DECIDE_BATCH_MAX_DISTINCT_IDS)
+        )
+    person_properties = data.get("person_properties") or {}
+    if not isinstance(person_properties, dict) or not all(
+        isinstance(properties, dict) for properties in person_properties.values()
+    ):
+        return _validation_error(request, "`person_properties` needs to map distinct IDs to person properties.")
+
+    feature_flags = get_feature_flag_matcher(team.pk).get_active_flags_for_distinct_ids(
+        distinct_ids, {str(distinct_id): properties for distinct_id, properties in person_properties.items()}
+    )
+    return cors_response(request, JsonResponse({"featureFlags": feature_flags}))
+
+
+@csrf_exempt
+def get_flag_definitions(request: HttpRequest):
+    """
+    Definitions of a team's active feature flags, for SDKs evaluating flags themselves.
+
+    Flags without property filters only need the rollout hash of FeatureFlag._hash, so SDKs can evaluate them locally
+    and only call /decide for the others. With a personal API key, the property filters of the others are included.
+    With the project token, which is public, only the key and rollout percentage of flags without filters are.
+
+    Responses have an ETag: when If-None-Match is the current one, we wait up to `wait` seconds (at most
+    FEATURE_FLAG_DEFINITIONS_MAX_WAIT_SECONDS) for flags to change, and respond 304 if they didn't.
+    """
+    if request.method != "GET":
+        return _validation_error(request, "Flag definitions can only be fetched with a GET request.")
+
+    token = request.GET.get("token") or request.GET.get("api_key")
+    personal_api_key = None
+    if token:
+        team = Team.objects.get_team_from_token(token)
+    else:
+        personal_api_key = PersonalAPIKeyAuthentication.find_key(request, {})
+        team = Team.objects.get_team_from_token(personal_api_key, True) if personal_api_key else None
+    if team is None:
+        return _validation_error(
+            request,
+            "Project or personal API key invalid. You can find your project API key in PostHog project settings.",
+        )
+
+    try:
+        wait = min(float(request.GET.get("wait", 0)), settings.FEATURE_FLAG_DEFINITIONS_MAX_WAIT_SECONDS)
+    except ValueError:
+        return _validation_error(request, "`wait` needs to be a number of seconds.")
+    if_none_match = request.headers.get("If-None-Match", "").replace("W/", "").strip('"')
+
+    def get_definitions() -> Tuple[List[Dict[str, Any]], str]:
+        matcher = get_feature_flag_matcher(team.pk)
+        if personal_api_key:
+            return matcher.definitions, matcher.etag
+        return matcher.public_definitions, matcher.public_etag
+
+    definitions, etag = get_definitions()
+    deadline = time.monotonic() + wait
+    while etag == if_none_match and time.monotonic() < deadline:
+        # Changes made in other processes drop the cached matcher, so this picks them up without querying Postgres
+        time.sleep(max(min(FLAG_DEFINITIONS_POLL_INTERVAL, deadline - time.monotonic()), 0))
+        definitions, etag = get_definitions()
+
+    if etag == if_none_match:
+        response: HttpResponse = HttpResponse(status=304)
+    else:
+        response = JsonResponse({"flags": definitions})
+    response["ETag"] = '"{}"'.format(etag)
+    return cors_response(request, response)
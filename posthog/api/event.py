@@ -1,8 +1,19 @@
 import json
 from datetime import timedelta
-from typing import Any, Dict, List, Optional, Set, Union, cast
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Union,
+    cast,
+)
 
-from django.db.models import Prefetch, QuerySet
+from dateutil.parser import isoparse
+from django.db.models import Q, QuerySet
+from django.http import StreamingHttpResponse
 from django.utils.timezone import now
 from rest_framework import exceptions, request, response, serializers, viewsets
 from rest_framework.decorators import action
@@ -17,6 +28,7 @@ from posthog.models import (
     Element,
     ElementGroup,
     Event,
+    EventHydrator,
     Filter,
     Person,
     PersonDistinctId,
@@ -25,7 +37,11 @@ from posthog.models import (
 from posthog.models.event import EventManager
 from posthog.permissions import ProjectMembershipNecessaryPermissions
 from posthog.queries.session_recording import SessionRecording
-from posthog.utils import convert_property_value
+from posthog.utils import batches, convert_property_value, streaming_csv_response
+
+# Rows read from the database at once when exporting
+EXPORT_BATCH_SIZE = 1000
+EVENT_EXPORT_COLUMNS = ["id", "distinct_id", "properties", "event", "timestamp", "person"]
 
 
 class ElementSerializer(serializers.ModelSerializer):
@@ -77,12 +93,8 @@ class EventSerializer(serializers.HyperlinkedModelSerializer):
     def get_elements(self, event: Event):
         if not event.elements_hash:
             return []
-        if hasattr(event, "elements_group_cache"):
-            if event.elements_group_cache:  # type: ignore
-                return ElementSerializer(
-                    event.elements_group_cache.element_set.all().order_by("order"),  # type: ignore
-                    many=True,
-                ).data
+        if hasattr(event, "elements_cache"):
+            return ElementSerializer(event.elements_cache, many=True).data  # type: ignore
         elements = (
             ElementGroup.objects.get(hash=event.elements_hash, team_id=event.team_id)
             .element_set.all()
@@ -108,7 +120,7 @@ class EventViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = cast(EventManager, super().get_queryset()).add_person_id(self.team_id)
 
-        if self.action == "list" or self.action == "sessions" or self.action == "actions":
+        if self.action in ("list", "sessions", "actions", "export"):
             queryset = self._filter_request(self.request, queryset)
 
         order_by = self.request.GET.get("orderBy")
@@ -150,30 +162,17 @@ class EventViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
             },
         }
 
-    def _prefetch_events(self, events: List[Event]) -> List[Event]:
-        team_id = self.team_id
-        distinct_ids = []
-        hash_ids = []
+    def _prefetch_events(
+        self, events: List[Event], elements: bool = True, hydrator: Optional[EventHydrator] = None
+    ) -> List[Event]:
+        hydrator = hydrator or EventHydrator.for_request(self.request, self.team_id)
+        persons = hydrator.get_persons(event.distinct_id for event in events)
+        elements_by_hash = hydrator.get_elements(event.elements_hash for event in events) if elements else {}
         for event in events:
-            distinct_ids.append(event.distinct_id)
-            if event.elements_hash:
-                hash_ids.append(event.elements_hash)
-        people = Person.objects.filter(
-            team_id=team_id, persondistinctid__distinct_id__in=distinct_ids
-        ).prefetch_related(Prefetch("persondistinctid_set", to_attr="distinct_ids_cache"))
-        if len(hash_ids) > 0:
-            groups = ElementGroup.objects.filter(team_id=team_id, hash__in=hash_ids).prefetch_related("element_set")
-        else:
-            groups = ElementGroup.objects.none()
-        for event in events:
-            try:
-                event.person_properties = [person.properties for person in people if event.distinct_id in person.distinct_ids][0]  # type: ignore
-            except IndexError:
-                event.person_properties = None  # type: ignore
-            try:
-                event.elements_group_cache = [group for group in groups if group.hash == event.elements_hash][0]  # type: ignore
-            except IndexError:
-                event.elements_group_cache = None  # type: ignore
+            person = persons.get(event.distinct_id)
+            event.person_properties = person.properties if person else None  # type: ignore
+            if elements:
+                event.elements_cache = elements_by_hash.get(event.elements_hash, [])  # type: ignore
         return events
 
     def list(self, request: request.Request, *args: Any, **kwargs: Any) -> response.Response:
@@ -213,6 +212,39 @@ class EventViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
             }
         )
 
+    @action(methods=["GET"], detail=False)
+    def export(self, request: request.Request, **kwargs) -> StreamingHttpResponse:
+        """
+        Stream every event matching the list filters as CSV, newest first, with properties as JSON.
+
+        An interrupted export can be resumed with ?cursor=<timestamp>,<id> of the last row received.
+        """
+        queryset = self.get_queryset().order_by("-timestamp", "-id")
+        if request.GET.get("cursor"):
+            try:
+                timestamp, id = request.GET["cursor"].rsplit(",", 1)
+                cursor_timestamp, cursor_id = isoparse(timestamp), int(id)
+            except ValueError:
+                raise exceptions.ValidationError({"cursor": "Invalid cursor."})
+            queryset = queryset.filter(
+                Q(timestamp__lt=cursor_timestamp) | Q(timestamp=cursor_timestamp, id__lt=cursor_id)
+            )
+        return streaming_csv_response(EVENT_EXPORT_COLUMNS, self._export_rows(queryset), "events.csv")
+
+    def _export_rows(self, queryset: QuerySet) -> Iterator[List[Any]]:
+        serializer = EventSerializer()
+        for events in batches(queryset.iterator(chunk_size=EXPORT_BATCH_SIZE), EXPORT_BATCH_SIZE):
+            # A hydrator per batch, so that memory doesn't grow with the size of the export
+            for event in self._prefetch_events(events, elements=False, hydrator=EventHydrator(self.team_id)):
+                yield [
+                    event.pk,
+                    event.distinct_id,
+                    json.dumps(event.properties),
+                    event.event,
+                    event.timestamp.isoformat(),
+                    serializer.get_person(event),
+                ]
+
     @action(methods=["GET"], detail=False)
     def values(self, request: request.Request, **kwargs) -> response.Response:
         result = self.get_values(request)
@@ -282,7 +314,10 @@ class EventViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
     @action(methods=["GET"], detail=False)
     def session_recording(self, request: request.Request, *args: Any, **kwargs: Any) -> response.Response:
         session_recording = SessionRecording().run(
-            team=self.team, filter=Filter(request=request), session_recording_id=request.GET.get("session_recording_id")
+            team=self.team,
+            filter=Filter(request=request),
+            session_recording_id=request.GET.get("session_recording_id"),
+            hydrator=EventHydrator.for_request(request, self.team_id),
         )
 
         return response.Response({"result": session_recording})
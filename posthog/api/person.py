@@ -1,11 +1,12 @@
 import json
 import warnings
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
 
 from django.core.cache import cache
-from django.db.models import Count, Func, Prefetch, Q, QuerySet
+from django.db.models import Count, Func, Prefetch, Q, QuerySet, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django_filters import rest_framework as filters
-from rest_framework import request, response, serializers, viewsets
+from rest_framework import exceptions, request, response, serializers, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
@@ -15,7 +16,11 @@ from rest_framework_csv import renderers as csvrenderers
 from posthog.api.routing import StructuredViewSetMixin
 from posthog.models import Event, Filter, Person
 from posthog.permissions import ProjectMembershipNecessaryPermissions
-from posthog.utils import convert_property_value
+from posthog.utils import batches, convert_property_value, streaming_csv_response
+
+# Rows read from the database at once when exporting
+EXPORT_BATCH_SIZE = 1000
+PERSON_EXPORT_COLUMNS = ["id", "name", "distinct_ids", "properties", "created_at", "uuid"]
 
 
 class PersonCursorPagination(CursorPagination):
@@ -117,6 +122,36 @@ class PersonViewSet(StructuredViewSetMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return self._filter_request(self.request, super().get_queryset())
 
+    @action(methods=["GET"], detail=False)
+    def export(self, request: request.Request, **kwargs) -> StreamingHttpResponse:
+        """
+        Stream every person matching the list filters as CSV, newest first, with distinct ids and properties as JSON.
+
+        An interrupted export can be resumed with ?cursor=<id> of the last row received.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by("-id")
+        if request.GET.get("cursor"):
+            try:
+                queryset = queryset.filter(id__lt=int(request.GET["cursor"]))
+            except ValueError:
+                raise exceptions.ValidationError({"cursor": "Invalid cursor."})
+        return streaming_csv_response(PERSON_EXPORT_COLUMNS, self._export_rows(queryset), "persons.csv")
+
+    def _export_rows(self, queryset: QuerySet) -> Iterator[List[Any]]:
+        serializer = PersonSerializer()
+        # prefetch_related is ignored when iterating, so distinct ids are fetched for each batch instead
+        for persons in batches(queryset.iterator(chunk_size=EXPORT_BATCH_SIZE), EXPORT_BATCH_SIZE):
+            prefetch_related_objects(persons, Prefetch("persondistinctid_set", to_attr="distinct_ids_cache"))
+            for person in persons:
+                yield [
+                    person.pk,
+                    serializer.get_name(person),
+                    json.dumps(person.distinct_ids),
+                    json.dumps(person.properties),
+                    person.created_at.isoformat(),
+                    person.uuid,
+                ]
+
     @action(methods=["GET"], detail=False)
     def by_distinct_id(self, request, **kwargs):
         """
@@ -117,6 +117,28 @@ class TestCapture(BaseTest):
             },
         )
 
+    @patch("posthog.models.team.TEAM_CACHE", {})
+    @patch("posthog.api.capture.celery_app.send_task")
+    def test_team_cached_by_token(self, patch_process_event_with_plugins):
+        data = {"event": "$pageview", "properties": {"distinct_id": 2, "token": self.team.api_token}}
+        with self.assertNumQueries(1):
+            self.client.get("/e/?data=%s" % quote(self._dict_to_json(data)))
+        with self.assertNumQueries(0):
+            self.client.get("/e/?data=%s" % quote(self._dict_to_json(data)))
+
+        # Saving the team drops it from the cache, including under its previous token
+        old_token = self.team.api_token
+        self.team.api_token = "new_token"
+        self.team.save()
+        response = self.client.get("/e/?data=%s" % quote(self._dict_to_json(data)))
+        self.assertEqual(response.status_code, 400)
+        self.assertNotEqual(old_token, self.team.api_token)
+
+        data["properties"]["token"] = "new_token"
+        with self.assertNumQueries(1):
+            self.client.get("/e/?data=%s" % quote(self._dict_to_json(data)))
+        self.assertEqual(self._to_arguments(patch_process_event_with_plugins)["team_id"], self.team.pk)
+
     @patch("posthog.models.team.TEAM_CACHE", {})
     @patch("posthog.api.capture.celery_app.send_task")
     def test_multiple_events(self, patch_process_event_with_plugins):
@@ -132,7 +154,36 @@ class TestCapture(BaseTest):
                 "api_key": self.team.api_token,
             },
         )
+        # Multiple events are shipped to the worker as a single batch task
+        self.assertEqual(patch_process_event_with_plugins.call_count, 1)
+        call = patch_process_event_with_plugins.call_args[1]
+        self.assertEqual(call["name"], "posthog.tasks.process_event.process_events_batch")
+        ip, site_url, events, team_id, now, sent_at = call["args"]
+        self.assertEqual([event["distinct_id"] for event in events], ["eeee", "aaaa"])
+        self.assertEqual([event["data"]["event"] for event in events], ["beep", "boop"])
+        self.assertEqual(team_id, self.team.pk)
+
+    @patch("posthog.models.team.TEAM_CACHE", {})
+    @patch("posthog.api.capture.celery_app.send_task")
+    def test_multiple_events_with_plugins(self, patch_process_event_with_plugins):
+        self.team.plugins_opt_in = True
+        self.team.save()
+        self.client.post(
+            "/batch/",
+            data={
+                "api_key": self.team.api_token,
+                "batch": [
+                    {"type": "capture", "event": "beep", "distinct_id": "eeee"},
+                    {"type": "capture", "event": "boop", "distinct_id": "aaaa"},
+                ],
+            },
+            content_type="application/json",
+        )
         self.assertEqual(patch_process_event_with_plugins.call_count, 2)
+        self.assertEqual(
+            patch_process_event_with_plugins.call_args[1]["name"],
+            "posthog.tasks.process_event.process_event_with_plugins",
+        )
 
     @patch("posthog.models.team.TEAM_CACHE", {})
     @patch("posthog.api.capture.celery_app.send_task")
@@ -115,14 +115,36 @@ class TestDecide(BaseTest):
             key="filer-by-property-2",
             created_by=self.user,
         )
-        with self.assertNumQueries(4):
+        # Team, feature flags and the person, which all property filters are evaluated against
+        with self.assertNumQueries(3):
             response = self._post_decide()
         self.assertEqual(response["featureFlags"][0], "beta-feature")
 
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(1):  # team and feature flags are cached now
             response = self._post_decide({"token": self.team.api_token, "distinct_id": "another_id"})
         self.assertEqual(len(response["featureFlags"]), 0)
 
+    def test_feature_flags_updated(self):
+        Person.objects.create(team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com"})
+        feature_flag = FeatureFlag.objects.create(
+            team=self.team,
+            filters={"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]},
+            name="Filter by property",
+            key="filter-by-property",
+            created_by=self.user,
+        )
+        self.assertEqual(self._post_decide()["featureFlags"], ["filter-by-property"])
+
+        feature_flag.filters = {"properties": [{"key": "email", "value": "example@example.com", "type": "person"}]}
+        feature_flag.save()
+        self.assertEqual(self._post_decide()["featureFlags"], [])
+
+        feature_flag.delete()
+        FeatureFlag.objects.create(
+            team=self.team, rollout_percentage=100, name="Everyone", key="everyone", created_by=self.user,
+        )
+        self.assertEqual(self._post_decide()["featureFlags"], ["everyone"])
+
     def test_feature_flags_with_personal_api_key(self):
         key = PersonalAPIKey(label="X", user=self.user, team=self.team)
         key.save()
@@ -132,3 +154,117 @@ class TestDecide(BaseTest):
         )
         response = self._post_decide({"distinct_id": "example_id", "personal_api_key": key.value})
         self.assertEqual(len(response["featureFlags"]), 1)
+
+    def test_feature_flags_batch(self):
+        key = PersonalAPIKey.objects.create(label="X", user=self.user, team=self.team)
+        self.client.logout()
+        Person.objects.create(team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com"})
+        Person.objects.create(team=self.team, distinct_ids=["another_id"], properties={"email": "example@example.com"})
+        FeatureFlag.objects.create(
+            team=self.team, rollout_percentage=50, name="Beta feature", key="beta-feature", created_by=self.user,
+        )
+        FeatureFlag.objects.create(
+            team=self.team,
+            filters={"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]},
+            name="Filter by property",
+            key="filter-by-property",
+            created_by=self.user,
+        )
+        self._post_decide()  # cache the team and the flags
+
+        # All persons in one query, however many distinct ids there are, plus the two for the personal API key
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                "/decide/batch/",
+                {
+                    "personal_api_key": key.value,
+                    "distinct_ids": ["example_id", "another_id", "no_person"],
+                    "person_properties": {"another_id": {"email": "tim@posthog.com"}},
+                },
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["featureFlags"],
+            {
+                "example_id": ["beta-feature", "filter-by-property"],
+                "another_id": ["filter-by-property"],
+                "no_person": ["beta-feature"],
+            },
+        )
+
+    def test_feature_flags_batch_validation(self):
+        key = PersonalAPIKey.objects.create(label="X", user=self.user, team=self.team)
+
+        def post(data):
+            return self.client.post("/decide/batch/", data, content_type="application/json")
+
+        self.assertEqual(post({"personal_api_key": key.value, "distinct_ids": "example_id"}).status_code, 400)
+        self.assertEqual(post({"personal_api_key": "invalid", "distinct_ids": ["example_id"]}).status_code, 400)
+        # The project token is public, so it can't be used to look at persons in bulk
+        self.assertEqual(post({"api_key": self.team.api_token, "distinct_ids": ["example_id"]}).status_code, 400)
+        with self.settings(DECIDE_BATCH_MAX_DISTINCT_IDS=1):
+            self.assertEqual(post({"personal_api_key": key.value, "distinct_ids": ["a", "b"]}).status_code, 400)
+        self.assertEqual(self.client.get("/decide/batch/").status_code, 400)
+
+    def test_flag_definitions(self):
+        FeatureFlag.objects.create(
+            team=self.team, rollout_percentage=50, name="Beta feature", key="beta-feature", created_by=self.user,
+        )
+        feature_flag = FeatureFlag.objects.create(
+            team=self.team,
+            filters={"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]},
+            name="Filter by property",
+            key="filter-by-property",
+            created_by=self.user,
+        )
+        FeatureFlag.objects.create(
+            team=self.team, rollout_percentage=100, name="Off", key="off", active=False, created_by=self.user,
+        )
+
+        response = self.client.get("/decide/flag_definitions/", {"token": self.team.api_token})
+        self.assertEqual(response.status_code, 200)
+        # The project token is public, so filters aren't shared with it
+        self.assertEqual(response.json()["flags"], [{"key": "beta-feature", "rollout_percentage": 50}])
+        etag = response["ETag"]
+
+        response = self.client.get(
+            "/decide/flag_definitions/", {"token": self.team.api_token, "wait": 0}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        feature_flag.filters = {}
+        feature_flag.rollout_percentage = 20
+        feature_flag.save()
+        response = self.client.get("/decide/flag_definitions/", {"token": self.team.api_token}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["flags"][1], {"key": "filter-by-property", "rollout_percentage": 20})
+
+    def test_flag_definitions_with_personal_api_key(self):
+        key = PersonalAPIKey.objects.create(label="X", user=self.user, team=self.team)
+        FeatureFlag.objects.create(
+            team=self.team, rollout_percentage=100, name="Test", key="test", created_by=self.user,
+        )
+        FeatureFlag.objects.create(
+            team=self.team,
+            filters={"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]},
+            name="Filter by property",
+            key="filter-by-property",
+            created_by=self.user,
+        )
+        response = self.client.get("/decide/flag_definitions/", HTTP_AUTHORIZATION="Bearer {}".format(key.value))
+        self.assertEqual(
+            response.json()["flags"],
+            [
+                {"key": "test", "rollout_percentage": 100, "filters": {}},
+                {
+                    "key": "filter-by-property",
+                    "rollout_percentage": None,
+                    "filters": {"properties": [{"key": "email", "value": "tim@posthog.com", "type": "person"}]},
+                },
+            ],
+        )
+
+        self.assertEqual(self.client.get("/decide/flag_definitions/", {"token": "invalid"}).status_code, 400)
@@ -1,3 +1,5 @@
+import csv
+import io
 import json
 
 from dateutil.relativedelta import relativedelta
@@ -239,6 +241,38 @@ def test_event_api_factory(event_factory, person_factory, action_factory):
             self.assertEqual(response.json()["event"], "sign up")
             self.assertEqual(response.json()["properties"], {"key": "test_val"})
 
+        def test_export(self):
+            person_factory(team=self.team, distinct_ids=["1"], properties={"email": "tim@posthog.com"})
+            for idx in range(3):
+                event_factory(
+                    team=self.team,
+                    event="event {}".format(idx),
+                    distinct_id="1",
+                    properties={"idx": idx},
+                    timestamp=timezone.datetime(2020, 1, 1, tzinfo=timezone.utc) + relativedelta(days=idx),
+                )
+            event_factory(team=self.team, event="other", distinct_id="2", timestamp="2020-01-05T00:00:00Z")
+
+            response = self.client.get("/api/event/export/?distinct_id=1")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "text/csv")
+            header, *rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+            self.assertEqual(header, ["id", "distinct_id", "properties", "event", "timestamp", "person"])
+            self.assertEqual([row[3] for row in rows], ["event 2", "event 1", "event 0"])
+            self.assertEqual(json.loads(rows[0][2]), {"idx": 2})
+            self.assertEqual(rows[0][5], "tim@posthog.com")
+
+            response = self.client.get(
+                "/api/event/export/", {"distinct_id": "1", "cursor": "{},{}".format(rows[0][4], rows[0][0])}
+            )
+            _, *resumed_rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+            self.assertEqual(resumed_rows, rows[1:])
+
+        def test_export_invalid_cursor(self):
+            for cursor in ["nonsense", "2020-01-01T00:00:00+00:00,nonsense", "nonsense,1"]:
+                response = self.client.get("/api/event/export/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+
     return TestEvents
 
 
@@ -1,3 +1,5 @@
+import csv
+import io
 import json
 
 from django.utils import timezone
@@ -262,6 +264,26 @@ def test_person_factory(event_factory, person_factory, get_events, get_people):
             self.assertEqual(response.json(), response_uuid.json())
             self.assertEqual(len(response.json()["results"]), 2)
 
+        def test_export(self):
+            first = person_factory(team=self.team, distinct_ids=["1", "2"], properties={"email": "tim@posthog.com"})
+            second = person_factory(team=self.team, distinct_ids=["3"], properties={})
+
+            response = self.client.get("/api/person/export/")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            header, *rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+            self.assertEqual(header, ["id", "name", "distinct_ids", "properties", "created_at", "uuid"])
+            self.assertEqual([row[0] for row in rows], [str(second.pk), str(first.pk)])
+            self.assertEqual(rows[1][1], "tim@posthog.com")
+            self.assertEqual(json.loads(rows[1][2]), ["1", "2"])
+
+            response = self.client.get("/api/person/export/?cursor={}".format(second.pk))
+            _, *resumed_rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+            self.assertEqual(resumed_rows, rows[1:])
+
+        def test_export_invalid_cursor(self):
+            response = self.client.get("/api/person/export/?cursor=nonsense")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     return TestPerson
 
 
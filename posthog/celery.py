@@ -68,6 +68,9 @@ def setup_periodic_tasks(sender, **kwargs):
         # ee enabled scheduled tasks
         sender.add_periodic_task(120, clickhouse_lag.s(), name="clickhouse table lag")
         sender.add_periodic_task(120, clickhouse_row_count.s(), name="clickhouse events table row count")
+        sender.add_periodic_task(
+            crontab(hour=5, minute=0), materialize_properties.s(), name="materialize most filtered properties"
+        )
 
     sender.add_periodic_task(60, calculate_cohort.s(), name="recalculate cohorts")
 
@@ -103,6 +106,14 @@ def clickhouse_lag():
         pass
 
 
+@app.task(ignore_result=True)
+def materialize_properties():
+    if is_ee_enabled() and settings.EE_AVAILABLE:
+        from ee.clickhouse.materialized_columns import materialize_most_filtered_properties
+
+        materialize_most_filtered_properties()
+
+
 @app.task(ignore_result=True)
 def clickhouse_row_count():
     if is_ee_enabled() and settings.EE_AVAILABLE:
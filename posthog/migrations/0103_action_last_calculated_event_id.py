@@ -0,0 +1,22 @@
+# Generated by Django 3.0.11 on 2020-12-01 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0102_dashboarditem_filters_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="action", name="last_calculated_event_id", field=models.IntegerField(blank=True, null=True),
+        ),
+        # Actions calculated before are up to date, so don't rescan all events for them on the next run
+        migrations.RunSQL(
+            """UPDATE "posthog_action" SET "last_calculated_event_id" = (SELECT MAX("id") FROM "posthog_event")
+                WHERE "last_calculated_at" IS NOT NULL""",
+            migrations.RunSQL.noop,
+        ),
+    ]
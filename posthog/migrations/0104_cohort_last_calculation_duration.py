@@ -0,0 +1,16 @@
+# Generated by Django 3.0.11 on 2020-12-03 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0103_action_last_calculated_event_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cohort", name="last_calculation_duration", field=models.FloatField(blank=True, null=True),
+        ),
+    ]
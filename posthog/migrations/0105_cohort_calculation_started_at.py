@@ -0,0 +1,16 @@
+# Generated by Django 3.0.11 on 2020-12-04 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posthog", "0104_cohort_last_calculation_duration"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cohort", name="calculation_started_at", field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
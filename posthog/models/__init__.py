@@ -1,4 +1,5 @@
 from .action import Action
+from .action_matcher import ActionMatcher
 from .action_step import ActionStep
 from .annotation import Annotation
 from .cohort import Cohort, CohortPeople
@@ -9,8 +10,10 @@ from .element_group import ElementGroup
 from .entity import Entity
 from .event import Event
 from .feature_flag import FeatureFlag
+from .feature_flag_matcher import FeatureFlagMatcher
 from .filter import Filter
 from .funnel import Funnel
+from .hydration import EventHydrator
 from .messaging import MessagingRecord
 from .organization import Organization, OrganizationInvite, OrganizationMembership
 from .person import Person, PersonDistinctId
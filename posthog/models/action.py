@@ -6,6 +6,9 @@ from django.utils import timezone
 from rest_hooks.signals import raw_hook_event
 from sentry_sdk import capture_exception
 
+# Number of event ids covered by each transaction of Action.calculate_events_in_chunks
+ACTION_CALCULATION_CHUNK_SIZE = 100_000
+
 
 class Action(models.Model):
     class Meta:
@@ -78,6 +81,84 @@ class Action(models.Model):
         self.last_calculated_at = calculated_at
         self.save()
 
+    def calculate_events_in_chunks(
+        self, recalculate_all: bool = False, chunk_size: int = ACTION_CALCULATION_CHUNK_SIZE
+    ):
+        """
+        Map events to this action in event id ranges, committing after each range.
+
+        Progress is stored in last_calculated_event_id, so an interrupted calculation resumes where it stopped and
+        later calls only look at new events. With recalculate_all, mappings are rebuilt starting from the first event.
+        Only one worker processes a given action at a time, so different actions can be calculated in parallel. Others
+        leave the action to it, unless they have to reset the checkpoint for recalculate_all, in which case they wait
+        for the lock.
+        """
+        from .event import Event
+
+        calculated_at = timezone.now()
+        max_event_id = Event.objects.aggregate(models.Max("id"))["id__max"] or 0
+
+        steps_exist = self.steps.exists()
+        cursor = connection.cursor()
+        try:
+            while True:
+                with transaction.atomic():
+                    checkpoint = (
+                        # The worker holding the lock would carry on from the old checkpoint, dropping the rebuild
+                        Action.objects.select_for_update(skip_locked=not recalculate_all)
+                        .filter(pk=self.pk)
+                        .values_list("last_calculated_event_id", flat=True)
+                    )
+                    if len(checkpoint) == 0:
+                        # Another worker is calculating this action, from the checkpoint we'd have started from.
+                        # It may be one that doesn't track is_calculating, so clear it once its current range is done
+                        Action.objects.filter(pk=self.pk).update(is_calculating=False)
+                        return
+                    last_calculated_event_id = checkpoint[0]
+                    if recalculate_all:
+                        # Reset while holding the lock, so a worker that's still going can't overwrite it
+                        Action.objects.filter(pk=self.pk).update(last_calculated_event_id=None)
+                        last_calculated_event_id = None
+                        recalculate_all = False
+                    start_id = last_calculated_event_id or 0
+                    if start_id >= max_event_id:
+                        if last_calculated_event_id is None:
+                            Action.objects.filter(pk=self.pk).update(last_calculated_event_id=max_event_id)
+                        break
+                    end_id = max_event_id if not steps_exist else min(start_id + chunk_size, max_event_id)
+
+                    cursor.execute(
+                        """DELETE FROM "posthog_action_events"
+                            WHERE "action_id" = %s AND "event_id" > %s AND "event_id" <= %s""",
+                        [self.pk, start_id, end_id],
+                    )
+                    if steps_exist:
+                        event_query, params = (
+                            Event.objects.filter(id__gt=start_id, id__lte=end_id)
+                            .query_db_by_action(self, order_by=None)
+                            .only("pk")
+                            .query.sql_with_params()
+                        )
+                        cursor.execute(
+                            """INSERT INTO "posthog_action_events" ("action_id", "event_id")
+                                {}
+                            ON CONFLICT DO NOTHING""".format(
+                                event_query.replace("SELECT ", "SELECT {}, ".format(self.pk), 1)
+                            ),
+                            params,
+                        )
+                    # is_calculating is only set under the lock, as updating the row would wait for it otherwise
+                    Action.objects.filter(pk=self.pk).update(last_calculated_event_id=end_id, is_calculating=True)
+        except:
+            capture_exception()
+            Action.objects.filter(pk=self.pk).update(is_calculating=False)
+            return
+
+        Action.objects.filter(pk=self.pk).update(is_calculating=False, last_calculated_at=calculated_at)
+        self.is_calculating = False
+        self.last_calculated_at = calculated_at
+        self.last_calculated_event_id = max_event_id
+
     def on_perform(self, event):
         from posthog.api.event import EventViewSet
 
@@ -101,6 +182,7 @@ class Action(models.Model):
     is_calculating: models.BooleanField = models.BooleanField(default=False)
     updated_at: models.DateTimeField = models.DateTimeField(auto_now=True)
     last_calculated_at: models.DateTimeField = models.DateTimeField(default=timezone.now, blank=True)
+    last_calculated_event_id: models.IntegerField = models.IntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -0,0 +1,400 @@
+import json
+import re
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+)
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Prefetch
+from django.dispatch import receiver
+from django.forms.models import model_to_dict
+
+from .action import Action
+from .action_step import ActionStep
+from .cohort import CohortPeople
+from .element import Element
+from .event import Event, Selector, SelectorPart
+from .filter import Filter
+from .person import Person
+from .property import Property
+
+# Per-process cache of compiled action matchers: team_id -> (matcher, expiry timestamp).
+# Entries are kept in LRU order (most recently used last) and bounded by ACTION_MATCHER_CACHE_MAX_SIZE.
+# Action and action step changes drop the team's matcher locally and broadcast the change over Redis pub/sub.
+# The pub/sub listener runs in its own thread, so all access goes through ACTION_MATCHER_CACHE_LOCK.
+ACTION_MATCHER_CACHE: Dict[int, Tuple["ActionMatcher", float]] = {}
+ACTION_MATCHER_CACHE_LOCK = threading.Lock()
+ACTION_MATCHER_CACHE_MAX_SIZE = 1000
+ACTION_MATCHER_TTL_SECONDS = 300
+
+SUPPORTED_OPERATORS = {
+    None,
+    "exact",
+    "is_not",
+    "is_set",
+    "is_not_set",
+    "icontains",
+    "not_icontains",
+    "regex",
+    "not_regex",
+    "gt",
+    "lt",
+}
+
+# Type order used by Postgres when comparing jsonb values of different types
+JSONB_TYPE_ORDER = {type(None): 0, str: 1, int: 2, float: 2, bool: 3, list: 4, dict: 5}
+
+
+class EventContext:
+    """The event being matched, plus lazily loaded data that only some actions need."""
+
+    def __init__(self, event: Event, elements: Optional[List[Element]] = None):
+        self.event = event
+        self._elements = elements
+        self._person: Optional[Tuple[Optional[int], Optional[Dict]]] = None
+        self._cohorts: Dict[int, bool] = {}
+
+    @property
+    def elements(self) -> List[Element]:
+        if self._elements is None:
+            if not self.event.elements_hash:
+                self._elements = []
+            else:
+                self._elements = list(
+                    Element.objects.filter(
+                        group__team_id=self.event.team_id, group__hash=self.event.elements_hash
+                    ).order_by("order")
+                )
+        return self._elements
+
+    def _get_person(self) -> Tuple[Optional[int], Optional[Dict]]:
+        if self._person is None:
+            person = (
+                Person.objects.filter(
+                    team_id=self.event.team_id,
+                    persondistinctid__team_id=self.event.team_id,
+                    persondistinctid__distinct_id=self.event.distinct_id,
+                )
+                .values_list("id", "properties")
+                .first()
+            )
+            self._person = person if person else (None, None)
+        return self._person
+
+    @property
+    def person_properties(self) -> Optional[Dict]:
+        return self._get_person()[1]
+
+    def in_cohort(self, cohort_id: int) -> bool:
+        if cohort_id not in self._cohorts:
+            person_id = self._get_person()[0]
+            self._cohorts[cohort_id] = (
+                person_id is not None and CohortPeople.objects.filter(cohort_id=cohort_id, person_id=person_id).exists()
+            )
+        return self._cohorts[cohort_id]
+
+
+Predicate = Callable[[EventContext], bool]
+
+
+class ActionMatcher:
+    """Matches events against a team's actions in memory, mirroring EventManager.query_db_by_action.
+
+    Action steps are compiled into predicates once. Only steps filtering on things we can't evaluate in memory
+    (e.g. unknown property operators) fall back to querying the database for that action.
+    """
+
+    def __init__(self, actions: Iterable[Action]):
+        self.action_ids: Set[int] = set()
+        # Event name -> actions with a step for that event, as the database query only looks at those
+        self.actions_by_event: Dict[Optional[str], List[Tuple[Action, List[Predicate]]]] = {}
+        for action in actions:
+            self.action_ids.add(action.pk)
+            steps = list(action.steps.all())
+            predicates = [_compile_step(action, step) for step in steps]
+            for event_name in {step.event for step in steps}:
+                self.actions_by_event.setdefault(event_name, []).append((action, predicates))
+
+    def match(self, event: Event, elements: Optional[List[Element]] = None) -> List[Action]:
+        context = EventContext(event, elements)
+        matched = [
+            action
+            for action, predicates in self.actions_by_event.get(event.event, [])
+            if any(predicate(context) for predicate in predicates)
+        ]
+        return sorted(matched, key=lambda action: action.pk)
+
+
+def get_action_matcher(team_id: int) -> ActionMatcher:
+    with ACTION_MATCHER_CACHE_LOCK:
+        entry = ACTION_MATCHER_CACHE.pop(team_id, None)
+        if entry is not None and entry[1] >= time.monotonic():
+            ACTION_MATCHER_CACHE[team_id] = entry  # re-insert to mark as most recently used
+            return entry[0]
+    matcher = ActionMatcher(
+        Action.objects.filter(team_id=team_id, deleted=False).prefetch_related(
+            Prefetch("steps", queryset=ActionStep.objects.order_by("id"))
+        )
+    )
+    with ACTION_MATCHER_CACHE_LOCK:
+        ACTION_MATCHER_CACHE.pop(team_id, None)
+        while len(ACTION_MATCHER_CACHE) >= ACTION_MATCHER_CACHE_MAX_SIZE:
+            del ACTION_MATCHER_CACHE[next(iter(ACTION_MATCHER_CACHE))]
+        ACTION_MATCHER_CACHE[team_id] = (matcher, time.monotonic() + ACTION_MATCHER_TTL_SECONDS)
+    _start_action_matcher_listener()
+    return matcher
+
+
+def invalidate_action_matcher(team_id: Optional[int], action_id: Optional[int], broadcast: bool = True) -> None:
+    with ACTION_MATCHER_CACHE_LOCK:
+        if team_id is not None:
+            ACTION_MATCHER_CACHE.pop(team_id, None)
+        for cached_team_id, (matcher, _) in list(ACTION_MATCHER_CACHE.items()):
+            if action_id in matcher.action_ids:
+                ACTION_MATCHER_CACHE.pop(cached_team_id, None)
+    if broadcast:
+        from posthog.redis import get_client
+
+        try:
+            get_client().publish(
+                settings.ACTION_MATCHER_INVALIDATION_PUBSUB_CHANNEL,
+                json.dumps({"team_id": team_id, "action_id": action_id}),
+            )
+        except Exception:
+            # Other processes will pick up the change once ACTION_MATCHER_TTL_SECONDS have passed
+            pass
+
+
+def _start_action_matcher_listener() -> None:
+    from posthog.redis import subscribe_in_background
+
+    def on_message(message: bytes) -> None:
+        payload = json.loads(message)
+        invalidate_action_matcher(payload.get("team_id"), payload.get("action_id"), broadcast=False)
+
+    subscribe_in_background(settings.ACTION_MATCHER_INVALIDATION_PUBSUB_CHANNEL, on_message, clear_action_matchers)
+
+
+def clear_action_matchers() -> None:
+    with ACTION_MATCHER_CACHE_LOCK:
+        ACTION_MATCHER_CACHE.clear()
+
+
+@receiver(models.signals.post_save, sender=Action)
+@receiver(models.signals.post_delete, sender=Action)
+def action_changed(sender, instance: Action, **kwargs):
+    team_id, action_id = instance.team_id, instance.pk
+    invalidate_action_matcher(team_id, action_id, broadcast=False)
+    # Matchers compiled before the commit still see the old action, so drop them again everywhere afterwards
+    transaction.on_commit(lambda: invalidate_action_matcher(team_id, action_id))
+
+
+@receiver(models.signals.post_save, sender=ActionStep)
+@receiver(models.signals.post_delete, sender=ActionStep)
+def action_step_changed(sender, instance: ActionStep, **kwargs):
+    action_id = instance.action_id
+    invalidate_action_matcher(None, action_id, broadcast=False)
+    transaction.on_commit(lambda: invalidate_action_matcher(None, action_id))
+
+
+def _compile_step(action: Action, step: ActionStep) -> Predicate:
+    properties = Filter(data={"properties": step.properties}).properties
+    if any(not _can_match_in_memory(prop) for prop in properties):
+        return _database_predicate(action)
+
+    checks: List[Predicate] = []
+    if step.event:
+        checks.append(lambda context: context.event.event == step.event)
+    if step.url:
+        checks.append(_compile_url(step))
+
+    element_filters = model_to_dict(step)
+    if _has_element_filters(element_filters):
+        checks.append(lambda context: _match_elements(element_filters, context.elements))
+
+    # Element properties are matched together, so the same element has to satisfy all of them
+    element_properties = {prop.key: prop.value for prop in properties if prop.type == "element"}
+    if _has_element_filters(element_properties):
+        checks.append(lambda context: _match_elements(element_properties, context.elements))
+
+    for prop in properties:
+        if prop.type != "element":
+            checks.append(_compile_property(prop))
+
+    return lambda context: all(check(context) for check in checks)
+
+
+def _database_predicate(action: Action) -> Predicate:
+    def predicate(context: EventContext) -> bool:
+        return Event.objects.filter(pk=context.event.pk).query_db_by_action(action).exists()
+
+    return predicate
+
+
+def _can_match_in_memory(prop: Property) -> bool:
+    if prop.type in ("event", "person"):
+        # Django treats double underscores in keys as nested JSON lookups
+        return "__" not in prop.key and prop.operator in SUPPORTED_OPERATORS
+    return prop.type in ("element", "cohort")
+
+
+def _compile_url(step: ActionStep) -> Predicate:
+    if step.url_matching == ActionStep.EXACT:
+        url_matches: Callable[[str], bool] = lambda url: url == step.url
+    elif step.url_matching == ActionStep.REGEX:
+        pattern = _compile_regex(step.url)
+        url_matches = lambda url: bool(pattern and pattern.search(url))
+    else:
+        pattern = _like_to_regex(step.url)
+        url_matches = lambda url: bool(pattern.search(url))
+
+    def predicate(context: EventContext) -> bool:
+        url = _json_text(context.event.properties.get("$current_url"))
+        return url is not None and url_matches(url)
+
+    return predicate
+
+
+def _compile_property(prop: Property) -> Predicate:
+    if prop.type == "event":
+        return lambda context: match_property(prop, context.event.properties)
+    if prop.type == "person":
+        return lambda context: context.person_properties is not None and match_property(prop, context.person_properties)
+    if prop.key == "id":  # cohort
+        cohort_id = int(prop.value)
+        return lambda context: context.in_cohort(cohort_id)
+    return lambda context: True
+
+
+def match_property(prop: Property, properties: Dict[str, Any]) -> bool:
+    """Evaluate a property filter against a properties dict, the way Property.property_to_Q does in Postgres."""
+    value = prop._parse_value(prop.value)
+    has_key = prop.key in properties
+    actual = properties.get(prop.key)
+
+    if prop.operator == "is_set":
+        return has_key
+    if prop.operator == "is_not_set":
+        return not has_key
+    if prop.operator == "is_not":
+        return not (has_key and _json_equals(actual, value))
+    if isinstance(prop.operator, str) and prop.operator.startswith("not_"):
+        return not has_key or actual is None or not _match_operator(prop.operator[4:], actual, value)
+    return has_key and _match_operator(prop.operator or "exact", actual, value)
+
+
+def _match_operator(operator: str, actual: Any, value: Any) -> bool:
+    if operator == "exact":
+        return _json_equals(actual, value)
+    if operator in ("gt", "lt"):
+        comparison = _jsonb_compare(actual, value)
+        return comparison > 0 if operator == "gt" else comparison < 0
+    text = _json_text(actual)
+    if text is None:
+        return False
+    if operator == "icontains":
+        return (_json_text(value) or "").lower() in text.lower()
+    if operator == "regex":
+        pattern = _compile_regex(str(value))
+        return bool(pattern and pattern.search(text))
+    return False
+
+
+def _json_equals(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) == type(b) and a == b
+    return a == b
+
+
+def _json_text(value: Any) -> Optional[str]:
+    """Value as returned by Postgres' ->> operator."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _jsonb_compare(a: Any, b: Any) -> int:
+    type_a, type_b = JSONB_TYPE_ORDER.get(type(a), 5), JSONB_TYPE_ORDER.get(type(b), 5)
+    if type_a != type_b:
+        return type_a - type_b
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return 0
+
+
+def _compile_regex(pattern: str) -> Optional[Pattern]:
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+
+def _like_to_regex(value: str) -> Pattern:
+    """Equivalent of `LIKE '%value%'`, where % and _ in the value are wildcards too."""
+    pattern = "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in value)
+    return re.compile(pattern, re.DOTALL)
+
+
+def _has_element_filters(filters: Dict) -> bool:
+    if any(filters.get(key) for key in ["tag_name", "text", "href"]):
+        return True
+    return bool(filters.get("selector")) and len(Selector(filters["selector"]).parts) > 0
+
+
+def _match_elements(filters: Dict, elements: List[Element]) -> bool:
+    """In-memory equivalent of EventManager.filter_by_element."""
+    if not elements:
+        return False
+    conditions = {key: filters[key] for key in ["tag_name", "text", "href"] if filters.get(key)}
+    if conditions and not any(
+        all(getattr(element, key) == value for key, value in conditions.items()) for element in elements
+    ):
+        return False
+    if filters.get("selector"):
+        return _match_selector(Selector(filters["selector"]), elements)
+    return True
+
+
+def _match_selector(selector: Selector, elements: List[Element]) -> bool:
+    previous_order: Optional[int] = None
+    for index, part in enumerate(selector.parts):
+        orders = sorted(element.order for element in elements if _match_selector_part(part, element))
+        if len(orders) <= part.unique_order:
+            return False
+        order = orders[part.unique_order]
+        if index > 0:
+            assert previous_order is not None
+            if part.direct_descendant and order != previous_order + 1:
+                return False
+            if not part.direct_descendant and order <= previous_order:
+                return False
+        previous_order = order
+    return True
+
+
+def _match_selector_part(part: SelectorPart, element: Element) -> bool:
+    for key, value in part.data.items():
+        if "attr__" in key:
+            if (element.attributes or {}).get("attr__{}".format(key.split("attr__")[1])) != value:
+                return False
+        elif key == "attr_class__contains":
+            if not element.attr_class or not all(class_name in element.attr_class for class_name in value):
+                return False
+        elif key == "nth_child":
+            if str(element.nth_child) != str(value):
+                return False
+        elif getattr(element, key) != value:
+            return False
+    return True
@@ -1,7 +1,11 @@
 import json
+import logging
+import time
 from typing import Any, Dict, Optional
 
+import statsd
 from dateutil.relativedelta import relativedelta
+from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.core.exceptions import EmptyResultSet
 from django.db import connection, models, transaction
@@ -16,14 +20,33 @@ from .event import Event
 from .filter import Filter
 from .person import Person
 
+logger = logging.getLogger(__name__)
+
 DELETE_QUERY = """
 DELETE FROM "posthog_cohortpeople" WHERE "cohort_id" = {cohort_id};
 """
 
-UPDATE_QUERY = """
+# Recalculating a cohort only writes the difference between its current and new members: the new members go into a
+# temporary table, then people no longer in it are deleted and people not in the cohort yet are inserted
+NEW_PEOPLE_TABLE_QUERY = """
+CREATE TEMPORARY TABLE "cohort_new_people" ON COMMIT DROP AS {persons_query}
+"""
+
+REMOVE_PEOPLE_QUERY = """
+DELETE FROM "posthog_cohortpeople"
+WHERE "cohort_id" = {cohort_id}
+AND NOT EXISTS (SELECT 1 FROM "cohort_new_people" WHERE "cohort_new_people"."id" = "posthog_cohortpeople"."person_id")
+"""
+
+ADD_PEOPLE_QUERY = """
 INSERT INTO "posthog_cohortpeople" ("person_id", "cohort_id")
-{values_query}
-ON CONFLICT DO NOTHING
+SELECT "id", {cohort_id} FROM "cohort_new_people"
+EXCEPT
+SELECT "person_id", "cohort_id" FROM "posthog_cohortpeople" WHERE "cohort_id" = {cohort_id}
+"""
+
+DROP_NEW_PEOPLE_TABLE_QUERY = """
+DROP TABLE "cohort_new_people"
 """
 
 
@@ -55,7 +78,11 @@ class Cohort(models.Model):
     created_by: models.ForeignKey = models.ForeignKey("User", on_delete=models.SET_NULL, blank=True, null=True)
     created_at: models.DateTimeField = models.DateTimeField(default=timezone.now, blank=True, null=True)
     is_calculating: models.BooleanField = models.BooleanField(default=False)
+    # When the current calculation was scheduled or started, to tell calculations that died from ones still running
+    calculation_started_at: models.DateTimeField = models.DateTimeField(blank=True, null=True)
     last_calculation: models.DateTimeField = models.DateTimeField(blank=True, null=True)
+    # How long the last calculation took, in seconds
+    last_calculation_duration: models.FloatField = models.FloatField(blank=True, null=True)
 
     objects = CohortManager()
 
@@ -63,29 +90,46 @@ class Cohort(models.Model):
         try:
             if not use_clickhouse:
                 self.is_calculating = True
-                self.save()
+            self.calculation_started_at = timezone.now()
+            self.save()
 
+            start_time = time.time()
             persons_query = self._clickhouse_persons_query() if use_clickhouse else self._postgres_persons_query()
-            try:
-                sql, params = persons_query.distinct("pk").only("pk").query.sql_with_params()
-            except EmptyResultSet:
-                query = DELETE_QUERY.format(cohort_id=self.pk)
-                params = {}
-            else:
-                query = "{}{}".format(DELETE_QUERY, UPDATE_QUERY).format(
-                    cohort_id=self.pk,
-                    values_query=sql.replace('FROM "posthog_person"', ', {} FROM "posthog_person"'.format(self.pk), 1,),
-                )
-
             cursor = connection.cursor()
             with transaction.atomic():
-                cursor.execute(query, params)
+                # Calculations of the same cohort would otherwise both insert the people missing from it
+                Cohort.objects.select_for_update().get(pk=self.pk)
+                try:
+                    sql, params = persons_query.distinct("pk").only("pk").query.sql_with_params()
+                except EmptyResultSet:
+                    cursor.execute(DELETE_QUERY.format(cohort_id=self.pk))
+                    added, removed = 0, cursor.rowcount
+                else:
+                    cursor.execute(NEW_PEOPLE_TABLE_QUERY.format(persons_query=sql), params)
+                    cursor.execute(REMOVE_PEOPLE_QUERY.format(cohort_id=self.pk))
+                    removed = cursor.rowcount
+                    cursor.execute(ADD_PEOPLE_QUERY.format(cohort_id=self.pk))
+                    added = cursor.rowcount
+                    # Dropped on commit anyway, unless we're in a longer transaction calculating more cohorts
+                    cursor.execute(DROP_NEW_PEOPLE_TABLE_QUERY)
 
                 self.is_calculating = False
                 self.last_calculation = timezone.now()
+                self.last_calculation_duration = time.time() - start_time
                 self.save()
+
+            statsd.Timer("%s_posthog_cohort" % (settings.STATSD_PREFIX,)).send(
+                "calculate_people", self.last_calculation_duration
+            )
+            logger.info(
+                "Calculating cohort {} took {:.2f} seconds, {} people added and {} removed".format(
+                    self.pk, self.last_calculation_duration, added, removed
+                )
+            )
         except:
             capture_exception()
+            # Otherwise cohorts filtering on this one wait for it until STALE_CALCULATION_MINUTES have passed
+            Cohort.objects.filter(pk=self.pk).update(is_calculating=False)
 
     def __str__(self):
         return self.name
@@ -30,17 +30,11 @@ class FeatureFlag(models.Model):
     active: models.BooleanField = models.BooleanField(default=True)
 
     def distinct_id_matches(self, distinct_id: str) -> bool:
-        if len(self.filters.get("properties", [])) > 0:
-            if not self._match_distinct_id(distinct_id):
-                return False
-            elif not self.rollout_percentage:
-                return True
-
-        if self.rollout_percentage:
-            hash = self._hash(self.key, distinct_id)
-            if hash <= (self.rollout_percentage / 100):
-                return True
-        return False
+        """Whether the flag is on for the distinct id. Use get_feature_flag_matcher to evaluate all flags of a team."""
+        from .feature_flag_matcher import CompiledFeatureFlag, FlagContext
+
+        compiled = CompiledFeatureFlag(self)
+        return compiled.matches(FlagContext(self.team_id, str(distinct_id), compiled.cohort_ids))
 
     def _match_distinct_id(self, distinct_id: str) -> bool:
         return (
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import models, transaction
+from django.dispatch import receiver
+
+from .action_matcher import SUPPORTED_OPERATORS, match_property
+from .cohort import CohortPeople
+from .feature_flag import FeatureFlag
+from .filter import Filter
+from .person import Person, PersonDistinctId
+from .property import Property
+
+# Per-process cache of compiled feature flags: team_id -> (matcher, expiry timestamp).
+# Feature flag changes drop the team's matcher locally and broadcast the change over Redis pub/sub.
+FEATURE_FLAG_MATCHER_CACHE: Dict[int, Tuple["FeatureFlagMatcher", float]] = {}
+FEATURE_FLAG_MATCHER_TTL_SECONDS = 300
+
+
+class FlagContext:
+    """
+    The distinct id flags are evaluated for, plus its person and cohorts, each loaded at most once.
+
+    Person properties in person_properties override the stored ones. The person and the cohorts it belongs to can be
+    passed in when they've already been loaded in bulk.
+    """
+
+    def __init__(
+        self,
+        team_id: int,
+        distinct_id: str,
+        cohort_ids: Set[int],
+        person_properties: Optional[Dict] = None,
+        person: Optional[Tuple[Optional[int], Optional[Dict]]] = None,
+        cohorts: Optional[Set[int]] = None,
+    ):
+        self.team_id = team_id
+        self.distinct_id = distinct_id
+        self._cohort_ids = cohort_ids
+        self._person_properties = person_properties
+        self._person = person
+        self._cohorts = cohorts
+
+    def _get_person(self) -> Tuple[Optional[int], Optional[Dict]]:
+        if self._person is None:
+            person = (
+                Person.objects.filter(
+                    team_id=self.team_id,
+                    persondistinctid__team_id=self.team_id,
+                    persondistinctid__distinct_id=self.distinct_id,
+                )
+                .values_list("id", "properties")
+                .first()
+            )
+            self._person = person if person else (None, None)
+        return self._person
+
+    @property
+    def person_properties(self) -> Optional[Dict]:
+        properties = self._get_person()[1]
+        if self._person_properties:
+            return {**(properties or {}), **self._person_properties}
+        return properties
+
+    def in_cohort(self, cohort_id: int) -> bool:
+        if self._cohorts is None:
+            # Membership of all cohorts any flag filters on, in one query
+            person_id = self._get_person()[0]
+            self._cohorts = (
+                set(
+                    CohortPeople.objects.filter(person_id=person_id, cohort_id__in=self._cohort_ids).values_list(
+                        "cohort_id", flat=True
+                    )
+                )
+                if person_id is not None
+                else set()
+            )
+        return cohort_id in self._cohorts
+
+
+class CompiledFeatureFlag:
+    """A feature flag with its property filters parsed once, mirroring FeatureFlag.distinct_id_matches."""
+
+    def __init__(self, feature_flag: FeatureFlag):
+        self.feature_flag = feature_flag
+        self.key: str = feature_flag.key
+        self.rollout_percentage: Optional[int] = feature_flag.rollout_percentage
+        self.properties: List[Property] = Filter(data=feature_flag.filters).properties
+        # Filters we can't evaluate in memory (e.g. unknown operators) are left to Postgres
+        self.in_memory = all(_can_match_in_memory(prop) for prop in self.properties)
+        self.cohort_ids: Set[int] = {
+            _cohort_id(prop) for prop in self.properties if prop.type == "cohort" and self.in_memory
+        }
+
+    def matches(self, context: FlagContext) -> bool:
+        if len(self.properties) > 0:
+            if not self._match_properties(context):
+                return False
+            elif not self.rollout_percentage:
+                return True
+
+        if self.rollout_percentage:
+            return self.feature_flag._hash(self.key, context.distinct_id) <= (self.rollout_percentage / 100)
+        return False
+
+    def _match_properties(self, context: FlagContext) -> bool:
+        if not self.in_memory:
+            return self.feature_flag._match_distinct_id(context.distinct_id)
+        for prop in self.properties:
+            if prop.type == "cohort":
+                if not context.in_cohort(_cohort_id(prop)):
+                    return False
+            # Everything else filters on person properties, as in Property.property_to_Q
+            elif context.person_properties is None or not match_property(prop, context.person_properties):
+                return False
+        return True
+
+
+class FeatureFlagMatcher:
+    """Evaluates all of a team's active feature flags for a distinct id in memory."""
+
+    def __init__(self, team_id: int, feature_flags: Iterable[FeatureFlag]):
+        self.team_id = team_id
+        self.flags = [CompiledFeatureFlag(feature_flag) for feature_flag in feature_flags]
+        self.cohort_ids: Set[int] = set().union(*(flag.cohort_ids for flag in self.flags))
+        # What SDKs need to evaluate flags themselves, and a hash of it that changes whenever any flag does
+        self.definitions: List[Dict[str, Any]] = [
+            {
+                "key": flag.key,
+                "rollout_percentage": flag.rollout_percentage,
+                "filters": flag.feature_flag.filters or {},
+            }
+            for flag in self.flags
+        ]
+        self.etag = _etag(self.definitions)
+        # Filters can name people and cohorts, so SDKs only holding the public project token get flags without any
+        self.public_definitions: List[Dict[str, Any]] = [
+            {"key": flag.key, "rollout_percentage": flag.rollout_percentage}
+            for flag in self.flags
+            if len(flag.properties) == 0
+        ]
+        self.public_etag = _etag(self.public_definitions)
+
+    def get_active_flags(self, distinct_id: str, person_properties: Optional[Dict] = None) -> List[str]:
+        context = FlagContext(self.team_id, str(distinct_id), self.cohort_ids, person_properties)
+        return [flag.key for flag in self.flags if flag.matches(context)]
+
+    def get_active_flags_for_distinct_ids(
+        self, distinct_ids: Iterable[str], person_properties: Optional[Dict[str, Dict]] = None
+    ) -> Dict[str, List[str]]:
+        """
+        Active flags of each distinct id, loading all of their persons and cohorts with one query each.
+
+        person_properties maps distinct ids to person properties overriding the stored ones.
+        """
+        distinct_ids = [str(distinct_id) for distinct_id in distinct_ids]
+        person_properties = person_properties or {}
+
+        persons: Dict[str, Tuple[Optional[int], Optional[Dict]]] = {}
+        cohorts: Dict[int, Set[int]] = {}
+        if any(len(flag.properties) > 0 for flag in self.flags):
+            for distinct_id, person_id, properties in PersonDistinctId.objects.filter(
+                team_id=self.team_id, distinct_id__in=distinct_ids
+            ).values_list("distinct_id", "person_id", "person__properties"):
+                persons[distinct_id] = (person_id, properties)
+                cohorts[person_id] = set()
+            if self.cohort_ids and cohorts:
+                for person_id, cohort_id in CohortPeople.objects.filter(
+                    person_id__in=list(cohorts), cohort_id__in=self.cohort_ids
+                ).values_list("person_id", "cohort_id"):
+                    cohorts[person_id].add(cohort_id)
+
+        active_flags: Dict[str, List[str]] = {}
+        for distinct_id in distinct_ids:
+            person = persons.get(distinct_id, (None, None))
+            context = FlagContext(
+                self.team_id,
+                distinct_id,
+                self.cohort_ids,
+                person_properties.get(distinct_id),
+                person=person,
+                cohorts=cohorts.get(person[0], set()) if person[0] is not None else set(),
+            )
+            active_flags[distinct_id] = [flag.key for flag in self.flags if flag.matches(context)]
+        return active_flags
+
+
+def get_feature_flag_matcher(team_id: int) -> FeatureFlagMatcher:
+    entry = FEATURE_FLAG_MATCHER_CACHE.get(team_id)
+    if entry is not None and entry[1] >= time.monotonic():
+        return entry[0]
+    matcher = FeatureFlagMatcher(
+        team_id, FeatureFlag.objects.filter(team_id=team_id, active=True, deleted=False).order_by("id")
+    )
+    FEATURE_FLAG_MATCHER_CACHE[team_id] = (matcher, time.monotonic() + FEATURE_FLAG_MATCHER_TTL_SECONDS)
+    _start_feature_flag_matcher_listener()
+    return matcher
+
+
+def invalidate_feature_flag_matcher(team_id: int, broadcast: bool = True) -> None:
+    FEATURE_FLAG_MATCHER_CACHE.pop(team_id, None)
+    if broadcast:
+        from posthog.redis import get_client
+
+        try:
+            get_client().publish(
+                settings.FEATURE_FLAG_MATCHER_INVALIDATION_PUBSUB_CHANNEL, json.dumps({"team_id": team_id})
+            )
+        except Exception:
+            # Other processes will pick up the change once FEATURE_FLAG_MATCHER_TTL_SECONDS have passed
+            pass
+
+
+def _start_feature_flag_matcher_listener() -> None:
+    from posthog.redis import subscribe_in_background
+
+    def on_message(message: bytes) -> None:
+        invalidate_feature_flag_matcher(json.loads(message)["team_id"], broadcast=False)
+
+    subscribe_in_background(
+        settings.FEATURE_FLAG_MATCHER_INVALIDATION_PUBSUB_CHANNEL, on_message, FEATURE_FLAG_MATCHER_CACHE.clear
+    )
+
+
+@receiver(models.signals.post_save, sender=FeatureFlag)
+@receiver(models.signals.post_delete, sender=FeatureFlag)
+def feature_flag_changed(sender, instance: FeatureFlag, **kwargs):
+    team_id = instance.team_id
+    invalidate_feature_flag_matcher(team_id, broadcast=False)
+    # Other processes could compile the old flags again until the transaction commits
+    transaction.on_commit(lambda: invalidate_feature_flag_matcher(team_id))
+
+
+def _etag(definitions: List[Dict[str, Any]]) -> str:
+    return hashlib.sha1(json.dumps(definitions, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _can_match_in_memory(prop: Property) -> bool:
+    if prop.type == "cohort":
+        return True
+    # Django treats double underscores in keys as nested JSON lookups
+    return "__" not in prop.key and prop.operator in SUPPORTED_OPERATORS
+
+
+def _cohort_id(prop: Property) -> int:
+    return int(prop._parse_value(prop.value))
@@ -0,0 +1,99 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db.models import F, Prefetch, prefetch_related_objects
+
+from .element import Element
+from .person import Person, PersonDistinctId
+
+
+def get_elements_by_hash(team_id: int, hashes: Iterable[Optional[str]]) -> Dict[str, List[Element]]:
+    """Elements of each elements group, in order, with a single query."""
+    elements: Dict[str, List[Element]] = {}
+    hashes = {elements_hash for elements_hash in hashes if elements_hash}
+    if hashes:
+        for element in (
+            Element.objects.filter(group__team_id=team_id, group__hash__in=hashes)
+            .annotate(group_hash=F("group__hash"))
+            .order_by("order")
+        ):
+            elements.setdefault(element.group_hash, []).append(element)  # type: ignore
+    return elements
+
+
+class EventHydrator:
+    """
+    Persons and elements of a team's events, looked up in bulk.
+
+    Everything looked up is kept for the lifetime of the hydrator, so each distinct id and elements hash is only queried
+    once. Use for_request to share one hydrator between everything serialized in a request.
+    """
+
+    REQUEST_ATTRIBUTE = "_event_hydrators"
+
+    def __init__(self, team_id: int) -> None:
+        self.team_id = team_id
+        self._persons: Dict[str, Optional[Person]] = {}
+        self._elements: Dict[str, List[Element]] = {}
+
+    @classmethod
+    def for_request(cls, request: Any, team_id: int) -> "EventHydrator":
+        hydrators = getattr(request, cls.REQUEST_ATTRIBUTE, None)
+        if hydrators is None:
+            hydrators = {}
+            setattr(request, cls.REQUEST_ATTRIBUTE, hydrators)
+        if team_id not in hydrators:
+            hydrators[team_id] = cls(team_id)
+        return hydrators[team_id]
+
+    def get_persons(self, distinct_ids: Iterable[str], with_distinct_ids: bool = False) -> Dict[str, Person]:
+        """
+        Person of each distinct id that has one.
+
+        With with_distinct_ids, all distinct ids of the persons are loaded as well, for person.distinct_ids.
+        """
+        distinct_ids = set(distinct_ids)
+        missing = distinct_ids - self._persons.keys()
+        if missing:
+            persons_by_id: Dict[int, Person] = {}
+            for distinct_id, person in self._persons.items():
+                if person is not None:
+                    persons_by_id[person.pk] = person
+            for person_distinct_id in PersonDistinctId.objects.filter(
+                team_id=self.team_id, distinct_id__in=missing
+            ).select_related("person"):
+                # The same person object for all of its distinct ids
+                person = persons_by_id.setdefault(person_distinct_id.person_id, person_distinct_id.person)
+                self._persons[person_distinct_id.distinct_id] = person
+            for distinct_id in missing:
+                self._persons.setdefault(distinct_id, None)
+
+        persons = {
+            distinct_id: self._persons[distinct_id]
+            for distinct_id in distinct_ids
+            if self._persons[distinct_id] is not None
+        }
+        if with_distinct_ids:
+            prefetch_related_objects(
+                [person for person in set(persons.values()) if not hasattr(person, "distinct_ids_cache")],
+                Prefetch(
+                    "persondistinctid_set",
+                    queryset=PersonDistinctId.objects.order_by("id"),
+                    to_attr="distinct_ids_cache",
+                ),
+            )
+        return persons  # type: ignore
+
+    def get_person(self, distinct_id: str, with_distinct_ids: bool = False) -> Optional[Person]:
+        return self.get_persons([distinct_id], with_distinct_ids=with_distinct_ids).get(distinct_id)
+
+    def get_elements(self, hashes: Iterable[Optional[str]]) -> Dict[str, List[Element]]:
+        """Elements of each elements hash, in order. Hashes without elements are left out."""
+        hashes = {elements_hash for elements_hash in hashes if elements_hash}
+        missing = hashes - self._elements.keys()
+        if missing:
+            found = get_elements_by_hash(self.team_id, missing)
+            for elements_hash in missing:
+                self._elements[elements_hash] = found.get(elements_hash, [])
+        return {
+            elements_hash: self._elements[elements_hash] for elements_hash in hashes if self._elements[elements_hash]
+        }
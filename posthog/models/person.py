@@ -1,8 +1,11 @@
-from typing import Any, List
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Set, Tuple
 
 from django.apps import apps
 from django.contrib.postgres.fields import JSONField
-from django.db import models, transaction
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
 
 from posthog.models.utils import UUIDT
 
@@ -21,6 +24,59 @@ class PersonManager(models.Manager):
     def distinct_ids_exist(team_id: int, distinct_ids: List[str]) -> bool:
         return PersonDistinctId.objects.filter(team_id=team_id, distinct_id__in=distinct_ids).exists()
 
+    def get_or_create_for_distinct_ids(
+        self, team_distinct_ids: Iterable[Tuple[int, str]]
+    ) -> Dict[Tuple[int, str], "Person"]:
+        """Resolve (team_id, distinct_id) pairs to persons in bulk, creating a person for every unknown distinct_id.
+
+        Existing mappings are fetched in one query and missing ones are inserted with two bulk inserts.
+        If another process registers the same distinct_id concurrently, its person wins and ours is removed.
+        As bulk inserts skip model signals, post_save is sent manually for the rows actually created.
+        """
+        pairs = {(team_id, str(distinct_id)) for team_id, distinct_id in team_distinct_ids}
+        if not pairs:
+            return {}
+        distinct_ids = self._get_distinct_ids(pairs)
+        missing = [pair for pair in pairs if pair not in distinct_ids]
+        if missing:
+            with transaction.atomic():
+                new_people = self.bulk_create([Person(team_id=team_id) for team_id, _ in missing])
+                PersonDistinctId.objects.bulk_create(
+                    [
+                        PersonDistinctId(team_id=team_id, distinct_id=distinct_id, person=person)
+                        for (team_id, distinct_id), person in zip(missing, new_people)
+                    ],
+                    ignore_conflicts=True,
+                )
+            created_distinct_ids = self._get_distinct_ids(missing)
+            created_people = {person.pk: person for person in new_people}
+            lost_race = set(created_people.keys()) - {pdi.person_id for pdi in created_distinct_ids.values()}
+            if lost_race:
+                # These persons were never announced and nothing refers to them, so delete them without sending any
+                # signals or collecting related rows
+                with connection.cursor() as cursor:
+                    cursor.execute("DELETE FROM posthog_person WHERE id = ANY(%s)", [list(lost_race)])
+            for person_id in created_people.keys() - lost_race:
+                post_save.send(sender=Person, instance=created_people[person_id], created=True, raw=False)
+            for pdi in created_distinct_ids.values():
+                if pdi.person_id in created_people:
+                    post_save.send(sender=PersonDistinctId, instance=pdi, created=True, raw=False)
+            distinct_ids.update(created_distinct_ids)
+        return {pair: pdi.person for pair, pdi in distinct_ids.items()}
+
+    @staticmethod
+    def _get_distinct_ids(pairs: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], "PersonDistinctId"]:
+        distinct_ids_by_team: Dict[int, Set[str]] = defaultdict(set)
+        for team_id, distinct_id in pairs:
+            distinct_ids_by_team[team_id].add(distinct_id)
+        condition = Q()
+        for team_id, distinct_ids in distinct_ids_by_team.items():
+            condition |= Q(team_id=team_id, distinct_id__in=distinct_ids)
+        return {
+            (pdi.team_id, pdi.distinct_id): pdi
+            for pdi in PersonDistinctId.objects.filter(condition).select_related("person")
+        }
+
 
 class Person(models.Model):
     @property
@@ -1,8 +1,13 @@
-from typing import Any, Dict, List, Optional
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import posthoganalytics
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField, JSONField
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import receiver
 from django.utils import timezone
 
 from posthog.constants import TREND_FILTER_TYPE_EVENTS, TRENDS_LINEAR
@@ -15,7 +20,70 @@ from .dashboard_item import DashboardItem
 from .personal_api_key import PersonalAPIKey
 from .utils import UUIDT, generate_random_token, sane_repr
 
-TEAM_CACHE: Dict[str, "Team"] = {}
+# In-process cache of api_token -> (team, expiry timestamp), used by the capture and decide endpoints.
+# Entries are kept in LRU order (most recently used last) and bounded by TEAM_CACHE_MAX_SIZE.
+# Team saves/deletes drop the entry locally and broadcast the change over Redis pub/sub to all other processes.
+# The pub/sub listener runs in its own thread, so all access goes through TEAM_CACHE_LOCK.
+TEAM_CACHE: Dict[str, Tuple["Team", float]] = {}
+TEAM_CACHE_LOCK = threading.Lock()
+TEAM_CACHE_MAX_SIZE = 1000
+TEAM_CACHE_TTL_SECONDS = 60
+
+
+def get_cached_team(token: str) -> Optional["Team"]:
+    with TEAM_CACHE_LOCK:
+        entry = TEAM_CACHE.pop(token, None)
+        if entry is None:
+            return None
+        team, expires_at = entry
+        if expires_at < time.monotonic():
+            return None
+        TEAM_CACHE[token] = entry  # re-insert to mark as most recently used
+    return team
+
+
+def set_cached_team(token: str, team: "Team") -> None:
+    with TEAM_CACHE_LOCK:
+        TEAM_CACHE.pop(token, None)
+        while len(TEAM_CACHE) >= TEAM_CACHE_MAX_SIZE:
+            del TEAM_CACHE[next(iter(TEAM_CACHE))]
+        TEAM_CACHE[token] = (team, time.monotonic() + TEAM_CACHE_TTL_SECONDS)
+    _start_team_cache_listener()
+
+
+def invalidate_cached_team(team_id: Optional[int], api_token: Optional[str], broadcast: bool = True) -> None:
+    """Drop the team from the cache both by its current token and by id, as the token may have just been reset."""
+    with TEAM_CACHE_LOCK:
+        TEAM_CACHE.pop(api_token or "", None)
+        for token, (team, _) in list(TEAM_CACHE.items()):
+            if team.pk == team_id:
+                TEAM_CACHE.pop(token, None)
+    if broadcast:
+        from posthog.redis import get_client
+
+        try:
+            get_client().publish(
+                settings.TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL, json.dumps({"id": team_id, "api_token": api_token})
+            )
+        except Exception:
+            # Other processes will pick up the change once TEAM_CACHE_TTL_SECONDS have passed
+            pass
+
+
+def clear_cached_teams() -> None:
+    with TEAM_CACHE_LOCK:
+        TEAM_CACHE.clear()
+
+
+def _start_team_cache_listener() -> None:
+    from posthog.redis import subscribe_in_background
+
+    def on_message(message: bytes) -> None:
+        payload = json.loads(message)
+        invalidate_cached_team(payload.get("id"), payload.get("api_token"), broadcast=False)
+
+    # Anything we missed while disconnected could be stale, so start over
+    subscribe_in_background(settings.TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL, on_message, clear_cached_teams)
 
 
 class TeamManager(models.Manager):
@@ -73,10 +141,14 @@ class TeamManager(models.Manager):
 
     def get_team_from_token(self, token: str, is_personal_api_key: bool = False) -> Optional["Team"]:
         if not is_personal_api_key:
+            team = get_cached_team(token)
+            if team is not None:
+                return team
             try:
                 team = Team.objects.get(api_token=token)
             except Team.DoesNotExist:
                 return None
+            set_cached_team(token, team)
         else:
             try:
                 personal_api_key = (
@@ -140,3 +212,13 @@ class Team(models.Model):
         return str(self.pk)
 
     __repr__ = sane_repr("uuid", "name", "api_token")
+
+
+@receiver(models.signals.post_save, sender=Team)
+@receiver(models.signals.post_delete, sender=Team)
+def team_changed(sender, instance, **kwargs):
+    team_id, api_token = instance.pk, instance.api_token
+    invalidate_cached_team(team_id, api_token, broadcast=False)
+    # Until the transaction commits, this or any other process can cache the old team again, so drop it everywhere
+    # once the change is visible
+    transaction.on_commit(lambda: invalidate_cached_team(team_id, api_token))
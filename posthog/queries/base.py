@@ -1,6 +1,9 @@
+import calendar
 import copy
-from typing import Any, Callable, Dict, List, Optional
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
+import numpy as np
 from dateutil.relativedelta import relativedelta
 from django.db.models import Q, QuerySet
 
@@ -104,6 +107,86 @@ def filter_events(team_id: int, filter: Filter, entity: Optional[Entity] = None)
     return filters
 
 
+def last_day_of_month(date: datetime.datetime) -> datetime.datetime:
+    return date.replace(day=calendar.monthrange(date.year, date.month)[1])
+
+
+def previous_sunday(date: datetime.datetime) -> datetime.datetime:
+    """The last Sunday before date, which labels the week starting on date when date is a Monday."""
+    return date + datetime.timedelta(days=(6 - date.weekday()) % 7 - 7)
+
+
+def previous_month_end(date: datetime.datetime) -> datetime.datetime:
+    return date.replace(day=1) - datetime.timedelta(days=1)
+
+
+def interval_date_range(
+    date_from: datetime.datetime, date_to: datetime.datetime, interval: str
+) -> List[datetime.datetime]:
+    """
+    Dates of each interval from date_from up to date_to. Minutes, hours and days start at date_from, weeks are
+    labelled by the Sunday they end on and months by their last day.
+    """
+    if interval == "week":
+        date = date_from + datetime.timedelta(days=(6 - date_from.weekday()) % 7)
+    elif interval == "month":
+        date = last_day_of_month(date_from)
+    else:
+        date = date_from
+    step = {
+        "minute": datetime.timedelta(minutes=1),
+        "hour": datetime.timedelta(hours=1),
+        "day": datetime.timedelta(days=1),
+        "week": datetime.timedelta(weeks=1),
+    }.get(interval)
+
+    dates = []
+    while date <= date_to:
+        dates.append(date)
+        date = date + step if step else last_day_of_month(date.replace(day=1) + relativedelta(months=1))
+    return dates
+
+
+def bucket_by_interval(
+    dates: Sequence[datetime.datetime],
+    breakdowns: Sequence[str],
+    counts: Sequence[Any],
+    time_index: List[datetime.datetime],
+    limit: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Average count per date of time_index for each breakdown value, from rows of (date, breakdown value, count).
+    Dates without rows are 0, rows outside of time_index are ignored.
+
+    If there are more than limit breakdown values, only the ones with the highest total counts are kept.
+    Breakdown values are returned in order of their first row.
+    """
+    date_positions = {date: position for position, date in enumerate(time_index)}
+    breakdown_codes: Dict[str, int] = {}
+    codes = np.fromiter(
+        (breakdown_codes.setdefault(breakdown, len(breakdown_codes)) for breakdown in breakdowns),
+        dtype=np.intp,
+        count=len(breakdowns),
+    )
+    positions = np.fromiter((date_positions.get(date, -1) for date in dates), dtype=np.intp, count=len(dates))
+    values = np.asarray(counts, dtype=np.float64)
+
+    kept_codes = np.arange(len(breakdown_codes))
+    if limit is not None and len(breakdown_codes) > limit:
+        totals = np.bincount(codes, weights=values, minlength=len(breakdown_codes))
+        kept_codes = np.sort(np.argpartition(-totals, limit - 1)[:limit])
+
+    in_range = positions >= 0
+    sums = np.zeros((len(breakdown_codes), len(time_index)))
+    occurrences = np.zeros((len(breakdown_codes), len(time_index)))
+    np.add.at(sums, (codes[in_range], positions[in_range]), values[in_range])
+    np.add.at(occurrences, (codes[in_range], positions[in_range]), 1)
+    means = np.divide(sums, occurrences, out=np.zeros_like(sums), where=occurrences > 0)
+
+    breakdown_values = list(breakdown_codes)
+    return {breakdown_values[code]: means[code] for code in kept_codes}
+
+
 class BaseQuery:
     """
         Run needs to be implemented in the individual Query class. It takes in a Filter, Team
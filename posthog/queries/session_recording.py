@@ -3,7 +3,7 @@ from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from django.db.models import F, Max, Min
 
-from posthog.models import Filter, Person, SessionRecordingEvent, Team
+from posthog.models import EventHydrator, Filter, SessionRecordingEvent, Team
 from posthog.queries.base import BaseQuery
 
 DistinctId = str
@@ -23,13 +23,13 @@ class SessionRecording:
         from posthog.api.person import PersonSerializer
 
         distinct_id, snapshots = self.query_recording_snapshots(team, kwargs["session_recording_id"])
-        person = (
-            PersonSerializer(Person.objects.get(team=team, persondistinctid__distinct_id=distinct_id)).data
-            if distinct_id
-            else None
-        )
+        hydrator = kwargs.get("hydrator") or EventHydrator(team.pk)
+        person = hydrator.get_person(distinct_id, with_distinct_ids=True) if distinct_id else None
 
-        return {"snapshots": list(sorted(snapshots, key=lambda s: s["timestamp"])), "person": person}
+        return {
+            "snapshots": list(sorted(snapshots, key=lambda s: s["timestamp"])),
+            "person": PersonSerializer(person).data if person else None,
+        }
 
 
 def query_sessions_in_range(team: Team, start_time: datetime.datetime, end_time: datetime.datetime) -> List[dict]:
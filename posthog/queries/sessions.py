@@ -1,6 +1,5 @@
 from typing import Any, Dict, List, Tuple
 
-import pandas as pd
 from dateutil.relativedelta import relativedelta
 from django.db import connection
 from django.db.models import F, Q, QuerySet
@@ -10,8 +9,16 @@ from django.utils.timezone import now
 
 from posthog.api.element import ElementSerializer
 from posthog.constants import SESSION_AVG, SESSION_DIST
-from posthog.models import ElementGroup, Event, Filter, Team
-from posthog.queries.base import BaseQuery, convert_to_comparison, determine_compared_filter
+from posthog.models import Event, EventHydrator, Filter, Team
+from posthog.queries.base import (
+    BaseQuery,
+    bucket_by_interval,
+    convert_to_comparison,
+    determine_compared_filter,
+    interval_date_range,
+    last_day_of_month,
+    previous_sunday,
+)
 from posthog.queries.session_recording import add_session_recording_ids
 from posthog.utils import append_data, dict_from_cursor_fetchall, friendly_time
 
@@ -175,48 +182,22 @@ class Sessions(BaseQuery):
             cursor.execute(session_list, params)
             sessions = dict_from_cursor_fetchall(cursor)
 
-            hash_ids = []
-            for session in sessions:
-                for event in session["events"]:
-                    if event.get("elements_hash"):
-                        hash_ids.append(event["elements_hash"])
-
-            groups = self._prefetch_elements(hash_ids, team)
-
+            elements_by_hash = EventHydrator(team.pk).get_elements(
+                event.get("elements_hash") for session in sessions for event in session["events"]
+            )
             for session in sessions:
                 for event in session["events"]:
-                    try:
-                        event.update(
-                            {
-                                "elements": ElementSerializer(
-                                    [group for group in groups if group.hash == event["elements_hash"]][0]
-                                    .element_set.all()
-                                    .order_by("order"),
-                                    many=True,
-                                ).data
-                            }
-                        )
-                    except IndexError:
-                        event.update({"elements": []})
+                    event.update(
+                        {
+                            "elements": ElementSerializer(
+                                elements_by_hash.get(event.get("elements_hash"), []), many=True
+                            ).data
+                        }
+                    )
         return add_session_recording_ids(team, sessions)
 
     def _session_avg(self, base_query: str, params: Tuple[Any, ...], filter: Filter) -> List[Dict[str, Any]]:
-        def _determineInterval(interval):
-            if interval == "minute":
-                return (
-                    "minute",
-                    "min",
-                )
-            elif interval == "hour":
-                return "hour", "H"
-            elif interval == "week":
-                return "week", "W"
-            elif interval == "month":
-                return "month", "M"
-            else:
-                return "day", "D"
-
-        interval, interval_freq = _determineInterval(filter.interval)
+        interval = filter.interval if filter.interval in ("minute", "hour", "week", "month") else "day"
 
         average_length_time = "SELECT date_trunc('{interval}', timestamp) as start_time,\
                         AVG(length) AS average_session_length_per_day,\
@@ -234,16 +215,15 @@ class Sessions(BaseQuery):
         if len(time_series_avg) == 0:
             return []
 
-        date_range = pd.date_range(filter.date_from, filter.date_to, freq=interval_freq,)
-        df = pd.DataFrame([{"date": a[0], "count": a[1], "breakdown": "Total"} for a in time_series_avg])
+        date_range = interval_date_range(filter.date_from, filter.date_to, interval)
+        dates = [a[0] for a in time_series_avg]
         if interval == "week":
-            df["date"] = df["date"].apply(lambda x: x - pd.offsets.Week(weekday=6))
+            dates = [previous_sunday(date) for date in dates]
         elif interval == "month":
-            df["date"] = df["date"].apply(lambda x: x - pd.offsets.MonthEnd(n=0))
+            dates = [last_day_of_month(date) for date in dates]
 
-        df_dates = pd.DataFrame(df.groupby("date").mean(), index=date_range)
-        df_dates = df_dates.fillna(0)
-        values = [(key, round(value[0])) if len(value) > 0 else (key, 0) for key, value in df_dates.iterrows()]
+        averages = bucket_by_interval(dates, ["Total"] * len(dates), [a[1] for a in time_series_avg], date_range)
+        values = [(key, round(value)) for key, value in zip(date_range, averages["Total"].tolist())]
 
         time_series_data = append_data(values, interval=filter.interval, math=None)
         # calculate average
@@ -280,9 +260,3 @@ class Sessions(BaseQuery):
         calculated = cursor.fetchall()
         result = [{"label": DIST_LABELS[index], "count": calculated[0][index]} for index in range(len(DIST_LABELS))]
         return result
-
-    def _prefetch_elements(self, hash_ids: List[str], team: Team) -> QuerySet:
-        groups = ElementGroup.objects.none()
-        if len(hash_ids) > 0:
-            groups = ElementGroup.objects.filter(team=team, hash__in=hash_ids).prefetch_related("element_set")
-        return groups
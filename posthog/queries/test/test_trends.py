@@ -1,9 +1,11 @@
 import json
+from datetime import datetime
 
+import pytz
 from freezegun import freeze_time
 
 from posthog.models import Action, ActionStep, Cohort, Event, Filter, Person, Team
-from posthog.queries.trends import Trends
+from posthog.queries.trends import Trends, group_events_to_date
 from posthog.test.base import BaseTest
 
 
@@ -794,4 +796,44 @@ def _create_cohort(**kwargs):
 
 
 class TestDjangoTrends(trend_test_factory(Trends, Event.objects.create, Person.objects.create, _create_action, _create_cohort)):  # type: ignore
-    pass
+    def test_group_events_to_date_top_breakdowns(self):
+        aggregates = [
+            {"week": datetime(2020, 1, 6, tzinfo=pytz.UTC), "$browser": "browser {}".format(i), "count": i}
+            for i in range(25)
+        ] + [{"week": datetime(2020, 1, 13, tzinfo=pytz.UTC), "$browser": None, "count": 100}]
+        response = group_events_to_date(
+            datetime(2020, 1, 1, tzinfo=pytz.UTC),
+            datetime(2020, 1, 20, tzinfo=pytz.UTC),
+            aggregates,
+            "week",
+            breakdown="$browser",
+        )
+        self.assertEqual(list(response), ["browser {}".format(i) for i in range(5, 25)])
+        self.assertEqual(
+            response["browser 24"],
+            {
+                datetime(2020, 1, 5, tzinfo=pytz.UTC): 24,
+                datetime(2020, 1, 12, tzinfo=pytz.UTC): 0,
+                datetime(2020, 1, 19, tzinfo=pytz.UTC): 0,
+            },
+        )
+
+    def test_group_events_to_date_breakdowns_without_value(self):
+        aggregates = [
+            {"day": datetime(2020, 1, 1, tzinfo=pytz.UTC), "$browser": "browser {}".format(i), "count": i + 1}
+            for i in range(20)
+        ] + [
+            {"day": datetime(2020, 1, 1, tzinfo=pytz.UTC), "$browser": None, "count": 1},
+            {"day": datetime(2020, 1, 2, tzinfo=pytz.UTC), "$browser": None, "count": 3},
+        ]
+        response = group_events_to_date(
+            datetime(2020, 1, 1, tzinfo=pytz.UTC),
+            datetime(2020, 1, 2, tzinfo=pytz.UTC),
+            aggregates,
+            "day",
+            breakdown="$browser",
+        )
+        self.assertEqual(len(response), 21)
+        self.assertEqual(
+            response["None"], {datetime(2020, 1, 1, tzinfo=pytz.UTC): 1, datetime(2020, 1, 2, tzinfo=pytz.UTC): 3}
+        )
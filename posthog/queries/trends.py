@@ -1,10 +1,8 @@
 import copy
 import datetime
 from itertools import accumulate
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import numpy as np
-import pandas as pd
 from django.db.models import (
     Avg,
     BooleanField,
@@ -39,36 +37,46 @@ from posthog.models import (
 )
 from posthog.utils import append_data
 
-from .base import BaseQuery, filter_events, handle_compare, process_entity_for_events
+from .base import (
+    BaseQuery,
+    bucket_by_interval,
+    filter_events,
+    handle_compare,
+    interval_date_range,
+    previous_month_end,
+    previous_sunday,
+    process_entity_for_events,
+)
 
-FREQ_MAP = {"minute": "60S", "hour": "H", "day": "D", "week": "W", "month": "M"}
+# Breakdown values with the most events shown when there are more
+BREAKDOWN_VALUES_LIMIT = 20
 
 
-def build_dataframe(aggregates: QuerySet, interval: str, breakdown: Optional[str] = None) -> pd.DataFrame:
+def _aggregate_rows(
+    aggregates: QuerySet, interval: str, breakdown: Optional[str] = None
+) -> Tuple[List[datetime.datetime], List[Any], List[Any]]:
+    """Date, breakdown value and count of each aggregate, with week and month dates moved to their label."""
     if breakdown == "cohorts":
+        # Sum rows with day, count, cohort_88, cohort_99, ... into a row per date and cohort the events are in
+        cohort_counts: Dict[Tuple[str, datetime.datetime], Any] = {}
         cohort_keys = [key for key in aggregates[0].keys() if key.startswith("cohort_")]
-        # Convert queryset with day, count, cohort_88, cohort_99, ... to multiple rows, for example:
-        # 2020-01-01..., 1, cohort_88
-        # 2020-01-01..., 3, cohort_99
-        dataframe = pd.melt(
-            pd.DataFrame(aggregates), id_vars=[interval, "count"], value_vars=cohort_keys, var_name="breakdown",
-        ).rename(columns={interval: "date"})
-        # Filter out false values
-        dataframe = dataframe[dataframe["value"] == True]
-        # Sum dates with same cohort
-        dataframe = dataframe.groupby(["breakdown", "date"], as_index=False).sum()
+        for aggregate in aggregates:
+            for key in cohort_keys:
+                if aggregate[key] == True:
+                    cohort_key = (key, aggregate[interval])
+                    cohort_counts[cohort_key] = cohort_counts.get(cohort_key, 0) + aggregate["count"]
+        rows = [(date, key, count) for (key, date), count in sorted(cohort_counts.items())]
     else:
-        dataframe = pd.DataFrame(
-            [
-                {"date": a[interval], "count": a["count"], "breakdown": a[breakdown] if breakdown else "Total",}
-                for a in aggregates
-            ]
-        )
+        rows = [(a[interval], a[breakdown] if breakdown else "Total", a["count"]) for a in aggregates]
+
+    if not rows:
+        return [], [], []
+    dates, breakdowns, counts = (list(column) for column in zip(*rows))
     if interval == "week":
-        dataframe["date"] = dataframe["date"].apply(lambda x: x - pd.offsets.Week(weekday=6))
+        dates = [previous_sunday(date) for date in dates]
     elif interval == "month":
-        dataframe["date"] = dataframe["date"].apply(lambda x: x - pd.offsets.MonthEnd(n=1))
-    return dataframe
+        dates = [previous_month_end(date) for date in dates]
+    return dates, breakdowns, counts
 
 
 def group_events_to_date(
@@ -77,45 +85,28 @@ def group_events_to_date(
     aggregates: QuerySet,
     interval: str,
     breakdown: Optional[str] = None,
-) -> Dict[str, Dict[datetime.datetime, int]]:
-    response = {}
-
+) -> Dict[str, Dict[datetime.datetime, float]]:
     if interval == "day":
         if date_from:
             date_from = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
         if date_to:
             date_to = date_to.replace(hour=0, minute=0, second=0, microsecond=0)
 
-    time_index = pd.date_range(date_from, date_to, freq=FREQ_MAP[interval])
-    if len(aggregates) > 0:
-        dataframe = build_dataframe(aggregates, interval, breakdown)
-
-        # extract top 20 if more than 20 breakdowns
-        if breakdown and dataframe["breakdown"].nunique() > 20:
-            counts = (
-                dataframe.groupby(["breakdown"])["count"]
-                .sum()
-                .reset_index(name="total")
-                .sort_values(by=["total"], ascending=False)[:20]
-            )
-            top_breakdown = counts["breakdown"].to_list()
-            dataframe = dataframe[dataframe.breakdown.isin(top_breakdown)]
-        dataframe = dataframe.astype({"breakdown": str})
-        for value in dataframe["breakdown"].unique():
-            filtered = (
-                dataframe.loc[dataframe["breakdown"] == value]
-                if value
-                else dataframe.loc[dataframe["breakdown"].isnull()]
-            )
-            df_dates = pd.DataFrame(filtered.groupby("date").mean(), index=time_index)
-            df_dates = df_dates.fillna(0)
-            response[value] = {key: value[0] if len(value) > 0 else 0 for key, value in df_dates.iterrows()}
-    else:
-        dataframe = pd.DataFrame([], index=time_index)
-        dataframe = dataframe.fillna(0)
-        response["total"] = {key: value[0] if len(value) > 0 else 0 for key, value in dataframe.iterrows()}
-
-    return response
+    time_index = interval_date_range(date_from, date_to, interval) if date_from and date_to else []
+    if len(aggregates) == 0:
+        return {"total": {date: 0 for date in time_index}}
+
+    dates, breakdowns, counts = _aggregate_rows(aggregates, interval, breakdown)
+    limit = None
+    if breakdown and len({value for value in breakdowns if value is not None}) > BREAKDOWN_VALUES_LIMIT:
+        # Events without a breakdown value don't count towards the limit, and are only shown when all values are
+        dates, breakdowns, counts = (
+            [column[index] for index, value in enumerate(breakdowns) if value is not None]
+            for column in (dates, breakdowns, counts)
+        )
+        limit = BREAKDOWN_VALUES_LIMIT
+    bucketed = bucket_by_interval(dates, [str(value) for value in breakdowns], counts, time_index, limit=limit)
+    return {value: dict(zip(time_index, interval_counts.tolist())) for value, interval_counts in bucketed.items()}
 
 
 def get_interval_annotation(key: str) -> Dict[str, Any]:
@@ -221,7 +212,7 @@ def breakdown_label(entity: Entity, value: Union[str, int]) -> Dict[str, Optiona
         ret_dict["label"] = "{} - {}".format(
             entity.name, value if value and value != "None" and value != "nan" else "Other",
         )
-        ret_dict["breakdown_value"] = value if value and not pd.isna(value) else None
+        ret_dict["breakdown_value"] = value if value else None
     else:
         if value == "cohort_all":
             ret_dict["label"] = "{} - all users".format(entity.name)
@@ -1,10 +1,13 @@
-from typing import Optional
+import threading
+import time
+from typing import Callable, Dict, Optional
 
 import redis
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
 _client = None  # type: Optional[redis.Redis]
+_listeners: Dict[str, threading.Thread] = {}
 
 
 def get_client() -> redis.Redis:
@@ -24,3 +27,31 @@ def get_client() -> redis.Redis:
         raise ImproperlyConfigured("Redis not configured!")
 
     return _client
+
+
+def subscribe_in_background(
+    channel: str, on_message: Callable[[bytes], None], on_disconnect: Callable[[], None]
+) -> None:
+    """Call on_message for every message published on the channel, from a daemon thread of this process.
+
+    Safe to call repeatedly - only one listener per channel is started. Should be called lazily rather than at
+    import time so that the thread is started after forking. Messages published while disconnected are lost,
+    which is why on_disconnect is called whenever the connection drops.
+    """
+    listener = _listeners.get(channel)
+    if settings.TEST or (listener is not None and listener.is_alive()):
+        return
+
+    def _listen() -> None:
+        while True:
+            try:
+                pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                for message in pubsub.listen():
+                    on_message(message["data"])
+            except Exception:
+                on_disconnect()
+                time.sleep(1)
+
+    _listeners[channel] = threading.Thread(target=_listen, name=f"subscriber-{channel}", daemon=True)
+    _listeners[channel].start()
@@ -75,6 +75,25 @@ PLUGINS_CONFIGURE_VIA_API = PLUGINS_INSTALL_VIA_API or get_bool_from_env("PLUGIN
 PLUGINS_CELERY_QUEUE = os.environ.get("PLUGINS_CELERY_QUEUE", "posthog-plugins")
 PLUGINS_RELOAD_PUBSUB_CHANNEL = os.environ.get("PLUGINS_RELOAD_PUBSUB_CHANNEL", "reload-plugins")
 
+TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL = os.environ.get(
+    "TEAM_CACHE_INVALIDATION_PUBSUB_CHANNEL", "invalidate-team-cache"
+)
+
+ACTION_MATCHER_INVALIDATION_PUBSUB_CHANNEL = os.environ.get(
+    "ACTION_MATCHER_INVALIDATION_PUBSUB_CHANNEL", "invalidate-action-matcher"
+)
+
+FEATURE_FLAG_MATCHER_INVALIDATION_PUBSUB_CHANNEL = os.environ.get(
+    "FEATURE_FLAG_MATCHER_INVALIDATION_PUBSUB_CHANNEL", "invalidate-feature-flag-matcher"
+)
+
+# Most distinct ids flags can be evaluated for in a single /decide/batch request
+DECIDE_BATCH_MAX_DISTINCT_IDS = int(os.environ.get("DECIDE_BATCH_MAX_DISTINCT_IDS", 1000))
+# Longest /decide/flag_definitions waits for flags to change before answering that nothing changed. Each waiting request
+# holds a worker, so only raise this from 0 (answering straight away, with ETags still saving the transfer) when serving
+# with async workers, e.g. gunicorn's gevent worker class
+FEATURE_FLAG_DEFINITIONS_MAX_WAIT_SECONDS = int(os.environ.get("FEATURE_FLAG_DEFINITIONS_MAX_WAIT_SECONDS", 0))
+
 # This is set as a cross-domain cookie with a random value.
 # Its existence is used by the toolbar to see that we are logged in.
 TOOLBAR_COOKIE_NAME = "phtoolbar"
@@ -128,6 +147,26 @@ CLICKHOUSE_VERIFY = get_bool_from_env("CLICKHOUSE_VERIFY", True)
 CLICKHOUSE_REPLICATION = get_bool_from_env("CLICKHOUSE_REPLICATION", False)
 CLICKHOUSE_ENABLE_STORAGE_POLICY = get_bool_from_env("CLICKHOUSE_ENABLE_STORAGE_POLICY", False)
 CLICKHOUSE_ASYNC = get_bool_from_env("CLICKHOUSE_ASYNC", False)
+# Queries running longer than this many seconds are aborted by ClickHouse
+CLICKHOUSE_MAX_EXECUTION_TIME = int(os.environ.get("CLICKHOUSE_MAX_EXECUTION_TIME", 180))
+# How many queries a single team can have running at once, across all processes. Others wait for a free slot
+CLICKHOUSE_MAX_CONCURRENT_QUERIES_PER_TEAM = int(os.environ.get("CLICKHOUSE_MAX_CONCURRENT_QUERIES_PER_TEAM", 5))
+# Rows ClickHouse sends at once when streaming query results
+CLICKHOUSE_STREAMING_BLOCK_SIZE = int(os.environ.get("CLICKHOUSE_STREAMING_BLOCK_SIZE", 10000))
+# Events per page of the events list, unless the request asks for a different ?limit= up to the max
+CLICKHOUSE_EVENTS_PAGE_SIZE = int(os.environ.get("CLICKHOUSE_EVENTS_PAGE_SIZE", 100))
+CLICKHOUSE_EVENTS_MAX_PAGE_SIZE = int(os.environ.get("CLICKHOUSE_EVENTS_MAX_PAGE_SIZE", 1000))
+# Look up the persons of events in ClickHouse dictionaries instead of joining person tables into every query. The
+# dictionaries are held in memory by ClickHouse and reloaded every CLICKHOUSE_PERSON_DICTIONARY_LIFETIME seconds
+CLICKHOUSE_PERSON_DICTIONARIES = get_bool_from_env("CLICKHOUSE_PERSON_DICTIONARIES", False)
+CLICKHOUSE_PERSON_DICTIONARY_LIFETIME = int(os.environ.get("CLICKHOUSE_PERSON_DICTIONARY_LIFETIME", 60))
+# ClickHouse loads the dictionaries from itself, over its native protocol port and as a user without a password, so
+# that no credentials end up in the dictionary definitions. Restrict that user to localhost and read-only access
+CLICKHOUSE_PERSON_DICTIONARY_PORT = int(os.environ.get("CLICKHOUSE_PERSON_DICTIONARY_PORT", 9000))
+CLICKHOUSE_PERSON_DICTIONARY_USER = os.environ.get("CLICKHOUSE_PERSON_DICTIONARY_USER", "default")
+# Count unique users of trends without filters from the daily events rollup. It counts unique distinct ids rather than
+# persons, so persons with several distinct ids (e.g. from before and after identifying) are counted more than once
+CLICKHOUSE_DAU_FROM_DAILY_ROLLUP = get_bool_from_env("CLICKHOUSE_DAU_FROM_DAILY_ROLLUP", False)
 
 _clickhouse_http_protocol = "http://"
 _clickhouse_http_port = "8123"
@@ -151,6 +190,13 @@ for host in _kafka_hosts:
     KAFKA_HOSTS_LIST.append(url.netloc)
 KAFKA_HOSTS = ",".join(KAFKA_HOSTS_LIST)
 
+# Producer batching: messages wait up to KAFKA_PRODUCER_LINGER_MS to be sent together in batches of up to
+# KAFKA_PRODUCER_BATCH_SIZE bytes, gzip compressed by default. "snappy", "lz4" and "zstd" need the python-snappy, lz4
+# and zstandard packages respectively, which aren't installed by default
+KAFKA_PRODUCER_LINGER_MS = int(os.environ.get("KAFKA_PRODUCER_LINGER_MS", 20))
+KAFKA_PRODUCER_BATCH_SIZE = int(os.environ.get("KAFKA_PRODUCER_BATCH_SIZE", 256 * 1024))
+KAFKA_PRODUCER_COMPRESSION_TYPE = os.environ.get("KAFKA_PRODUCER_COMPRESSION_TYPE", "gzip") or None
+
 POSTGRES = "postgres"
 CLICKHOUSE = "clickhouse"
 
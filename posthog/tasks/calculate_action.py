@@ -2,26 +2,97 @@ import logging
 import time
 
 from celery import shared_task
+from django.db import models, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
 
 from posthog.celery import app
 from posthog.ee import is_ee_enabled
-from posthog.models import Action
+from posthog.models import Action, ActionStep, Event
+from posthog.models.action import ACTION_CALCULATION_CHUNK_SIZE
+from posthog.models.action_matcher import ActionMatcher
+from posthog.models.hydration import get_elements_by_hash
+from posthog.utils import batches
 
 logger = logging.getLogger(__name__)
 
+# Events read from the database at once when mapping events to actions in bulk
+EVENT_BATCH_SIZE = 1000
+
 
 @shared_task(ignore_result=True)
 def calculate_action(action_id: int) -> None:
     start_time = time.time()
     action = Action.objects.get(pk=action_id)
-    action.calculate_events()
+    action.calculate_events_in_chunks(recalculate_all=True)
+    logger.info("Calculating action {} took {:.2f} seconds".format(action.pk, (time.time() - start_time)))
+
+
+@shared_task(ignore_result=True)
+def calculate_action_from_last_calculation(action_id: int) -> None:
+    start_time = time.time()
+    action = Action.objects.get(pk=action_id)
+    action.calculate_events_in_chunks()
     logger.info("Calculating action {} took {:.2f} seconds".format(action.pk, (time.time() - start_time)))
 
 
+@shared_task(ignore_result=True)
+def calculate_team_actions_from_last_calculation(team_id: int) -> None:
+    start_time = time.time()
+    calculate_team_actions_in_chunks(team_id)
+    logger.info("Calculating actions of team {} took {:.2f} seconds".format(team_id, (time.time() - start_time)))
+
+
 def calculate_actions_from_last_calculation() -> None:
-    actions = Action.objects.filter(deleted=False).only("pk")
-    for action in actions:
-        start_time = time.time()
-        action.calculate_events(start=action.last_calculated_at)
+    # Actions that were never calculated need to go through all events, the rest can share a scan of new events.
+    # One task each, so that they get calculated in parallel across workers
+    actions = Action.objects.filter(deleted=False)
+    for action_id in actions.filter(last_calculated_event_id__isnull=True).values_list("pk", flat=True):
+        calculate_action_from_last_calculation.delay(action_id)
+    for team_id in actions.filter(last_calculated_event_id__isnull=False).values_list("team_id", flat=True).distinct():
+        calculate_team_actions_from_last_calculation.delay(team_id)
+
+
+def calculate_team_actions_in_chunks(
+    team_id: int, chunk_size: int = ACTION_CALCULATION_CHUNK_SIZE, batch_size: int = EVENT_BATCH_SIZE
+) -> None:
+    """
+    Map new events to all of a team's actions, reading each event only once.
+
+    Picks up from the actions' last_calculated_event_id checkpoints and commits after each event id range, like
+    Action.calculate_events_in_chunks. Actions that have never been calculated, or are being calculated by another
+    worker, are left out.
+    """
+    max_event_id = Event.objects.aggregate(models.Max("id"))["id__max"] or 0
+    while True:
+        with transaction.atomic():
+            actions = list(
+                Action.objects.select_for_update(skip_locked=True)
+                .filter(team_id=team_id, deleted=False, last_calculated_event_id__lt=max_event_id)
+                .prefetch_related(Prefetch("steps", queryset=ActionStep.objects.order_by("id")))
+            )
+            if len(actions) == 0:
+                return
+            start_id = min(action.last_calculated_event_id for action in actions)
+            end_id = min(start_id + chunk_size, max_event_id)
+            checkpoints = {action.pk: action.last_calculated_event_id for action in actions}
+            matcher = ActionMatcher(actions)
+
+            events = (
+                Event.objects.filter(team_id=team_id, id__gt=start_id, id__lte=end_id)
+                .only("id", "team_id", "event", "distinct_id", "properties", "elements_hash")
+                .iterator(chunk_size=batch_size)
+            )
+            for batch in batches(events, batch_size):
+                elements = get_elements_by_hash(team_id, {event.elements_hash for event in batch})
+                relations = [
+                    Action.events.through(action_id=action.pk, event_id=event.pk)
+                    for event in batch
+                    for action in matcher.match(event, elements.get(event.elements_hash, []))
+                    if event.pk > checkpoints[action.pk]
+                ]
+                Action.events.through.objects.bulk_create(relations, ignore_conflicts=True)
 
-        logger.info("Calculating action {} took {:.2f} seconds".format(action.pk, (time.time() - start_time)))
+            Action.objects.filter(pk__in=checkpoints.keys(), last_calculated_event_id__lt=end_id).update(
+                last_calculated_event_id=end_id, last_calculated_at=timezone.now()
+            )
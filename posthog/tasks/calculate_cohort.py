@@ -1,32 +1,166 @@
+import json
 import logging
 import os
-import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, List, Set
 
+import statsd
 from celery import shared_task
 from dateutil.relativedelta import relativedelta
-from django.db.models import F
+from django.conf import settings
+from django.db.models import Q
 from django.utils import timezone
 
-from posthog.models import Cohort
+from posthog.models import Cohort, DashboardItem, FeatureFlag
 
 logger = logging.getLogger(__name__)
 
 MAX_AGE_MINUTES = 15
+# Cohorts no feature flag, insight or other cohort refers to are still recalculated, but less often
+UNUSED_MAX_AGE_MINUTES = int(os.environ.get("UNUSED_COHORT_MAX_AGE_MINUTES", 24 * 60))
 PARALLEL_COHORTS = int(os.environ.get("PARALLEL_COHORTS", 5))
+# Cost assumed for cohorts that haven't been calculated yet, in seconds
+DEFAULT_CALCULATION_DURATION = 10
+# Cohorts still marked as calculating this long after their calculation started must have had their worker die on them
+STALE_CALCULATION_MINUTES = int(os.environ.get("STALE_COHORT_CALCULATION_MINUTES", 60))
 
 
 def calculate_cohorts() -> None:
-    # This task will be run every minute
-    # Every minute, grab a few cohorts off the list and execute them
-    for cohort in Cohort.objects.filter(
-        is_calculating=False, last_calculation__lte=timezone.now() - relativedelta(minutes=MAX_AGE_MINUTES)
-    ).order_by(F("last_calculation").asc(nulls_first=True))[0:PARALLEL_COHORTS]:
+    """
+    Every minute, start calculating the PARALLEL_COHORTS cohorts that most need it.
+
+    Cohorts are prioritized by how much they're used, how stale they are and how long they took to calculate last time.
+    Cohorts filtering on other cohorts wait until those have been recalculated.
+    """
+    now = timezone.now()
+    due = list(
+        Cohort.objects.filter(deleted=False, is_calculating=False).filter(
+            Q(last_calculation__isnull=True) | Q(last_calculation__lte=now - relativedelta(minutes=MAX_AGE_MINUTES))
+        )
+    )
+    calculating = set()
+    for cohort in Cohort.objects.filter(deleted=False, is_calculating=True):
+        if _is_stale_calculation(cohort, now):
+            due.append(cohort)
+        else:
+            calculating.add(cohort.pk)
+    usage = get_cohort_usage({cohort.team_id for cohort in due})
+    queue = [
+        cohort
+        for cohort in due
+        if usage[cohort.pk] > 0
+        or cohort.last_calculation is None
+        or cohort.last_calculation <= now - relativedelta(minutes=UNUSED_MAX_AGE_MINUTES)
+    ]
+    queue.sort(key=lambda cohort: _priority(cohort, usage[cohort.pk], now), reverse=True)
+
+    gauge = statsd.Gauge("%s_posthog_celery" % (settings.STATSD_PREFIX,))
+    gauge.send("cohort_queue_depth", len(queue))
+    gauge.send("cohorts_calculating", len(calculating))
+
+    scheduled = schedule_cohorts(queue, calculating, PARALLEL_COHORTS)
+    # Marked right away, so that they aren't scheduled again while waiting for a worker
+    Cohort.objects.filter(pk__in=[cohort.pk for cohort in scheduled]).update(
+        is_calculating=True, calculation_started_at=now
+    )
+    for cohort in scheduled:
         calculate_cohort.delay(cohort.id)
 
 
 @shared_task(ignore_result=True, max_retries=1)
 def calculate_cohort(cohort_id: int) -> None:
-    start_time = time.time()
     cohort = Cohort.objects.get(pk=cohort_id)
     cohort.calculate_people()
-    logger.info("Calculating cohort {} took {:.2f} seconds".format(cohort.pk, (time.time() - start_time)))
+
+
+def schedule_cohorts(queue: List[Cohort], calculating: Set[int], limit: int) -> List[Cohort]:
+    """
+    Pick up to limit cohorts from the queue, highest priority first.
+
+    A cohort filtering on cohorts that are queued too is picked after them, and only in a later round, once they've
+    been recalculated. Same for cohorts filtering on cohorts being calculated right now.
+    """
+    queued = {cohort.pk: cohort for cohort in queue}
+    picked: List[Cohort] = []
+    visited: Set[int] = set()
+
+    def visit(cohort: Cohort, path: Set[int]) -> None:
+        visited.add(cohort.pk)
+        dependencies = referenced_cohort_ids(cohort.groups) - {cohort.pk}
+        # Dependencies on the path depend on this cohort in turn, which is where we break the cycle
+        queued_dependencies = [queued[pk] for pk in dependencies if pk in queued and pk not in path]
+        for dependency in queued_dependencies:
+            if dependency.pk not in visited and len(picked) < limit:
+                visit(dependency, path | {cohort.pk})
+        if len(picked) < limit and not dependencies & calculating and not queued_dependencies:
+            picked.append(cohort)
+
+    for cohort in queue:
+        if len(picked) >= limit:
+            break
+        if cohort.pk not in visited:
+            visit(cohort, set())
+    return picked
+
+
+def get_cohort_usage(team_ids: Set[int]) -> Counter:
+    """Cohort id -> how many active feature flags, insights and other cohorts of the teams filter on it."""
+    usage: Counter = Counter()
+    references: List[Any] = [
+        *FeatureFlag.objects.filter(team_id__in=team_ids, active=True, deleted=False).values_list("filters", flat=True),
+        *DashboardItem.objects.filter(team_id__in=team_ids, deleted=False)
+        .filter(Q(dashboard__isnull=False, dashboard__deleted=False) | Q(saved=True))
+        .values_list("filters", flat=True),
+        *Cohort.objects.filter(team_id__in=team_ids, deleted=False).values_list("groups", flat=True),
+    ]
+    for filters in references:
+        usage.update(referenced_cohort_ids(filters))
+    return usage
+
+
+def referenced_cohort_ids(filters: Any) -> Set[int]:
+    """Ids of the cohorts filtered or broken down by anywhere in feature flag, insight or cohort group filters."""
+    cohort_ids: Set[int] = set()
+    if isinstance(filters, list):
+        for item in filters:
+            cohort_ids |= referenced_cohort_ids(item)
+    elif isinstance(filters, dict):
+        if filters.get("type") == "cohort":
+            cohort_ids |= _parse_cohort_ids(filters.get("value"))
+        if filters.get("breakdown_type") == "cohort":
+            cohort_ids |= _parse_cohort_ids(filters.get("breakdown"))
+        for value in filters.values():
+            if isinstance(value, (list, dict)):
+                cohort_ids |= referenced_cohort_ids(value)
+    return cohort_ids
+
+
+def _parse_cohort_ids(value: Any) -> Set[int]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return set()
+    values = value if isinstance(value, list) else [value]
+    # Breakdowns can include "all" next to cohort ids
+    return {
+        int(item)
+        for item in values
+        if (isinstance(item, int) and not isinstance(item, bool)) or (isinstance(item, str) and item.isdigit())
+    }
+
+
+def _is_stale_calculation(cohort: Cohort, now: datetime) -> bool:
+    if cohort.calculation_started_at is None:
+        # Started before calculation_started_at was recorded, so it's been going for long enough
+        return True
+    return cohort.calculation_started_at <= now - relativedelta(minutes=STALE_CALCULATION_MINUTES)
+
+
+def _priority(cohort: Cohort, usage: int, now: datetime) -> float:
+    if cohort.last_calculation is None:
+        return float("inf")
+    stale_minutes = (now - cohort.last_calculation).total_seconds() / 60
+    duration = max(cohort.last_calculation_duration or DEFAULT_CALCULATION_DURATION, 1)
+    return (1 + usage) * stale_minutes / duration
@@ -1,15 +1,17 @@
 import datetime
+import json
+import time
 from numbers import Number
-from typing import Dict, Optional, Tuple, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 import posthoganalytics
 from celery import shared_task
 from dateutil import parser
 from dateutil.relativedelta import relativedelta
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from sentry_sdk import capture_exception
 
-from posthog.models import Element, Event, Person, SessionRecordingEvent, Team
+from posthog.models import Element, ElementGroup, Event, Person, SessionRecordingEvent, Team
 
 
 def _alias(previous_distinct_id: str, distinct_id: str, team_id: int, retry_if_failed: bool = True,) -> None:
@@ -64,30 +66,166 @@ def _alias(previous_distinct_id: str, distinct_id: str, team_id: int, retry_if_f
         new_person.merge_people([old_person])
 
 
+# Per-worker cache of the event names and property keys each team is known to have, so that the large JSON arrays
+# on Team don't have to be loaded and scanned for every event. Expires so that changes from other workers get picked up.
+# Entries are kept in LRU order (most recently used last) and bounded by TEAM_SCHEMA_CACHE_MAX_SIZE.
+TEAM_SCHEMA_CACHE: Dict[int, Tuple["TeamSchema", float]] = {}
+TEAM_SCHEMA_CACHE_MAX_SIZE = 1000
+TEAM_SCHEMA_CACHE_TTL_SECONDS = 300
+
+APPEND_TEAM_SCHEMA_SQL = """
+UPDATE posthog_team SET
+    event_names = event_names || (
+        SELECT COALESCE(jsonb_agg(name ORDER BY position), '[]'::jsonb)
+        FROM jsonb_array_elements(%(event_names)s::jsonb) WITH ORDINALITY AS new(name, position)
+        WHERE NOT posthog_team.event_names @> jsonb_build_array(name)
+    ),
+    event_names_with_usage = event_names_with_usage || (
+        SELECT COALESCE(
+            jsonb_agg(jsonb_build_object('event', name, 'usage_count', NULL, 'volume', NULL) ORDER BY position),
+            '[]'::jsonb
+        )
+        FROM jsonb_array_elements(%(event_names)s::jsonb) WITH ORDINALITY AS new(name, position)
+        WHERE NOT posthog_team.event_names @> jsonb_build_array(name)
+    ),
+    event_properties = event_properties || (
+        SELECT COALESCE(jsonb_agg(key ORDER BY position), '[]'::jsonb)
+        FROM jsonb_array_elements(%(event_properties)s::jsonb) WITH ORDINALITY AS new(key, position)
+        WHERE NOT posthog_team.event_properties @> jsonb_build_array(key)
+    ),
+    event_properties_with_usage = event_properties_with_usage || (
+        SELECT COALESCE(
+            jsonb_agg(jsonb_build_object('key', key, 'usage_count', NULL, 'volume', NULL) ORDER BY position),
+            '[]'::jsonb
+        )
+        FROM jsonb_array_elements(%(event_properties)s::jsonb) WITH ORDINALITY AS new(key, position)
+        WHERE NOT posthog_team.event_properties @> jsonb_build_array(key)
+    ),
+    event_properties_numerical = event_properties_numerical || (
+        SELECT COALESCE(jsonb_agg(key ORDER BY position), '[]'::jsonb)
+        FROM jsonb_array_elements(%(event_properties_numerical)s::jsonb) WITH ORDINALITY AS new(key, position)
+        WHERE NOT posthog_team.event_properties_numerical @> jsonb_build_array(key)
+    )
+WHERE id = %(team_id)s
+"""
+
+
+class TeamSchema:
+    """Event names and property keys known for a team, plus the ones discovered since the last flush."""
+
+    def __init__(self, event_names: List[str], event_properties: List[str], event_properties_numerical: List[str]):
+        self.event_names: Set[str] = set(event_names)
+        self.event_properties: Set[str] = set(event_properties)
+        self.event_properties_numerical: Set[str] = set(event_properties_numerical)
+        self.new_event_names: List[str] = []
+        self.new_event_properties: List[str] = []
+        self.new_event_properties_numerical: List[str] = []
+
+    def add(self, event: str, properties: Dict) -> None:
+        if event not in self.event_names:
+            self.event_names.add(event)
+            self.new_event_names.append(event)
+        for key, value in properties.items():
+            if key not in self.event_properties:
+                self.event_properties.add(key)
+                self.new_event_properties.append(key)
+            if isinstance(value, Number) and key not in self.event_properties_numerical:
+                self.event_properties_numerical.add(key)
+                self.new_event_properties_numerical.append(key)
+
+    def flush(self, team_id: int) -> None:
+        """Append only the newly discovered names and keys to the team, skipping any another worker already added."""
+        if not self.new_event_names and not self.new_event_properties and not self.new_event_properties_numerical:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                APPEND_TEAM_SCHEMA_SQL,
+                {
+                    "team_id": team_id,
+                    "event_names": json.dumps(self.new_event_names),
+                    "event_properties": json.dumps(self.new_event_properties),
+                    "event_properties_numerical": json.dumps(self.new_event_properties_numerical),
+                },
+            )
+        self.new_event_names, self.new_event_properties, self.new_event_properties_numerical = [], [], []
+
+
+def get_cached_team_schema(team_id: int) -> Optional[TeamSchema]:
+    entry = TEAM_SCHEMA_CACHE.pop(team_id, None)
+    if entry is None or entry[1] < time.monotonic():
+        return None
+    TEAM_SCHEMA_CACHE[team_id] = entry  # re-insert to mark as most recently used
+    return entry[0]
+
+
+def _get_team_schema(team: Team) -> TeamSchema:
+    schema = get_cached_team_schema(team.pk)
+    if schema is None:
+        if {"event_names", "event_properties", "event_properties_numerical"} & team.get_deferred_fields():
+            event_names, event_properties, event_properties_numerical = Team.objects.values_list(
+                "event_names", "event_properties", "event_properties_numerical"
+            ).get(pk=team.pk)
+        else:
+            event_names, event_properties, event_properties_numerical = (
+                team.event_names,
+                team.event_properties,
+                team.event_properties_numerical,
+            )
+        schema = TeamSchema(event_names, event_properties, event_properties_numerical)
+        while len(TEAM_SCHEMA_CACHE) >= TEAM_SCHEMA_CACHE_MAX_SIZE:
+            del TEAM_SCHEMA_CACHE[next(iter(TEAM_SCHEMA_CACHE))]
+        TEAM_SCHEMA_CACHE[team.pk] = (schema, time.monotonic() + TEAM_SCHEMA_CACHE_TTL_SECONDS)
+    return schema
+
+
 def store_names_and_properties(team: Team, event: str, properties: Dict) -> None:
-    # In _capture we only prefetch a couple of fields in Team to avoid fetching too much data
-    save = False
+    update_names_and_properties(team, event, properties)
+    flush_team_schema(team)
+
+
+def flush_team_schema(team: Team) -> None:
+    _get_team_schema(team).flush(team.pk)
+
+
+def update_names_and_properties(team: Team, event: str, properties: Dict) -> None:
+    """Record the event name and property keys of an event. New ones get written on the next schema flush."""
     if not team.ingested_event:
         # First event for the team captured
         for user in team.organization.members.all():
             posthoganalytics.capture(user.distinct_id, "first team event ingested", {"team": str(team.uuid)})
 
         team.ingested_event = True
-        save = True
-    if event not in team.event_names:
-        save = True
-        team.event_names.append(event)
-        team.event_names_with_usage.append({"event": event, "usage_count": None, "volume": None})
-    for key, value in properties.items():
-        if key not in team.event_properties:
-            team.event_properties.append(key)
-            team.event_properties_with_usage.append({"key": key, "usage_count": None, "volume": None})
-            save = True
-        if isinstance(value, Number) and key not in team.event_properties_numerical:
-            team.event_properties_numerical.append(key)
-            save = True
-    if save:
-        team.save()
+        Team.objects.filter(pk=team.pk).update(ingested_event=True)
+    _get_team_schema(team).add(event, properties)
+
+
+def _get_elements(properties: Dict) -> Optional[List[Element]]:
+    elements = properties.get("$elements")
+    if not elements:
+        return None
+    del properties["$elements"]
+    return [
+        Element(
+            text=el["$el_text"][0:400] if el.get("$el_text") else None,
+            tag_name=el["tag_name"],
+            href=el["attr__href"][0:2048] if el.get("attr__href") else None,
+            attr_class=el["attr__class"].split(" ") if el.get("attr__class") else None,
+            attr_id=el.get("attr__id"),
+            nth_child=el.get("nth_child"),
+            nth_of_type=el.get("nth_of_type"),
+            attributes={key: value for key, value in el.items() if key.startswith("attr__")},
+        )
+        for index, el in enumerate(elements)
+    ]
+
+
+def get_team_for_capture(team_id: int) -> Team:
+    # Only prefetch the fields of Team we need, as the event names and properties arrays can be huge.
+    # They're only loaded if this worker doesn't know the team's schema yet.
+    fields = ["slack_incoming_webhook", "anonymize_ips", "ingested_event"]
+    if get_cached_team_schema(team_id) is None:
+        fields += ["event_names", "event_properties", "event_properties_numerical"]
+    return Team.objects.only(*fields).get(pk=team_id)
 
 
 def _capture(
@@ -99,33 +237,8 @@ def _capture(
     properties: Dict,
     timestamp: Union[datetime.datetime, str],
 ) -> None:
-    elements = properties.get("$elements")
-    elements_list = None
-    if elements:
-        del properties["$elements"]
-        elements_list = [
-            Element(
-                text=el["$el_text"][0:400] if el.get("$el_text") else None,
-                tag_name=el["tag_name"],
-                href=el["attr__href"][0:2048] if el.get("attr__href") else None,
-                attr_class=el["attr__class"].split(" ") if el.get("attr__class") else None,
-                attr_id=el.get("attr__id"),
-                nth_child=el.get("nth_child"),
-                nth_of_type=el.get("nth_of_type"),
-                attributes={key: value for key, value in el.items() if key.startswith("attr__")},
-            )
-            for index, el in enumerate(elements)
-        ]
-
-    team = Team.objects.only(
-        "slack_incoming_webhook",
-        "event_names",
-        "event_properties",
-        "event_names_with_usage",
-        "event_properties_with_usage",
-        "anonymize_ips",
-        "ingested_event",
-    ).get(pk=team_id)
+    elements_list = _get_elements(properties)
+    team = get_team_for_capture(team_id)
 
     if not team.anonymize_ips and "$ip" not in properties:
         properties["$ip"] = ip
@@ -137,7 +250,7 @@ def _capture(
         team=team,
         site_url=site_url,
         **({"timestamp": timestamp} if timestamp else {}),
-        **({"elements": elements_list} if elements_list else {})
+        **({"elements": elements_list} if elements_list else {}),
     )
     store_names_and_properties(team=team, event=event, properties=properties)
     if not Person.objects.distinct_ids_exist(team_id=team_id, distinct_ids=[str(distinct_id)]):
@@ -149,58 +262,60 @@ def _capture(
             pass
 
 
-def get_or_create_person(team_id: int, distinct_id: str) -> Tuple[Person, bool]:
-    person: Person
-    created = False
-
-    if not Person.objects.distinct_ids_exist(team_id=team_id, distinct_ids=[str(distinct_id)]):
-        try:
-            person = Person.objects.create(team_id=team_id, distinct_ids=[str(distinct_id)])
-            created = True
-        except IntegrityError:
-            person = Person.objects.get(
-                team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id=str(distinct_id)
+def _capture_batch(
+    ip: str, site_url: str, team_id: int, events: List[Tuple[str, str, Dict, datetime.datetime]]
+) -> None:
+    """Batch counterpart of _capture for (event, distinct_id, properties, timestamp) tuples of a single team.
+
+    Events are inserted with one bulk insert, while the team is fetched and updated at most once for the whole batch.
+    """
+    team = get_team_for_capture(team_id)
+    element_hashes: Dict[str, str] = {}
+    events_to_create: List[Event] = []
+    for event, distinct_id, properties, timestamp in events:
+        raw_elements = properties.get("$elements")
+        elements_list = _get_elements(properties)
+        elements_hash = None
+        if elements_list:
+            # Autocapture events in a batch often share the same element chain
+            raw_elements_key = json.dumps(raw_elements, sort_keys=True, default=str)
+            if raw_elements_key not in element_hashes:
+                element_hashes[raw_elements_key] = ElementGroup.objects.create(team=team, elements=elements_list).hash
+            elements_hash = element_hashes[raw_elements_key]
+
+        if not team.anonymize_ips and "$ip" not in properties:
+            properties["$ip"] = ip
+
+        events_to_create.append(
+            Event(
+                event=event,
+                distinct_id=distinct_id,
+                properties=properties,
+                team=team,
+                elements_hash=elements_hash,
+                **({"timestamp": timestamp} if timestamp else {}),
             )
-            created = False
-    else:
-        person = Person.objects.get(
-            team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id=str(distinct_id)
         )
-        created = False
+        update_names_and_properties(team, event, properties)
+
+    Event.objects.create_batch(events_to_create, site_url=site_url)
+    flush_team_schema(team)
 
-    return person, created
+    Person.objects.get_or_create_for_distinct_ids((team_id, distinct_id) for _, distinct_id, _, _ in events)
+
+
+def _get_person(team_id: int, distinct_id: str) -> Person:
+    return Person.objects.get_or_create_for_distinct_ids([(team_id, distinct_id)])[(team_id, str(distinct_id))]
 
 
 def _update_person_properties(team_id: int, distinct_id: str, properties: Dict) -> None:
-    try:
-        person = Person.objects.get(
-            team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id=str(distinct_id)
-        )
-    except Person.DoesNotExist:
-        try:
-            person = Person.objects.create(team_id=team_id, distinct_ids=[str(distinct_id)])
-        # Catch race condition where in between getting and creating, another request already created this person
-        except:
-            person = Person.objects.get(
-                team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id=str(distinct_id)
-            )
+    person = _get_person(team_id, distinct_id)
     person.properties.update(properties)
     person.save()
 
 
 def _set_is_identified(team_id: int, distinct_id: str, is_identified: bool = True) -> None:
-    try:
-        person = Person.objects.get(
-            team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id=str(distinct_id)
-        )
-    except Person.DoesNotExist:
-        try:
-            person = Person.objects.create(team_id=team_id, distinct_ids=[str(distinct_id)])
-        # Catch race condition where in between getting and creating, another request already created this person
-        except:
-            person = Person.objects.get(
-                team_id=team_id, persondistinctid__team_id=team_id, persondistinctid__distinct_id=str(distinct_id)
-            )
+    person = _get_person(team_id, distinct_id)
     if not person.is_identified:
         person.is_identified = is_identified
         person.save()
@@ -280,3 +395,34 @@ def process_event(
         properties=properties,
         timestamp=handle_timestamp(data, now, sent_at),
     )
+
+
+@shared_task(name="posthog.tasks.process_event.process_events_batch", ignore_result=True)
+def process_events_batch(
+    ip: str, site_url: str, events: List[Dict], team_id: int, now: str, sent_at: Optional[str],
+) -> None:
+    """Process a whole `/batch` payload in one task. `events` are dicts with the `distinct_id` and the event `data`."""
+    events_to_capture: List[Tuple[str, str, Dict, datetime.datetime]] = []
+    for item in events:
+        distinct_id, data = item["distinct_id"], item["data"]
+        properties = data.get("properties", {})
+        if data.get("$set"):
+            properties["$set"] = data["$set"]
+
+        # Identify and alias calls depend on the order of events, so they're handled one by one
+        handle_identify_or_alias(data["event"], properties, distinct_id, team_id)
+
+        if data["event"] == "$snapshot":
+            _store_session_recording_event(
+                team_id=team_id,
+                distinct_id=distinct_id,
+                session_id=data["properties"]["$session_id"],
+                timestamp=handle_timestamp(data, now, sent_at),
+                snapshot_data=data["properties"]["$snapshot_data"],
+            )
+            continue
+
+        events_to_capture.append((data["event"], distinct_id, properties, handle_timestamp(data, now, sent_at)))
+
+    if events_to_capture:
+        _capture_batch(ip=ip, site_url=site_url, team_id=team_id, events=events_to_capture)
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from django.utils import timezone
+
+from posthog.models import Cohort, Dashboard, DashboardItem, FeatureFlag
+from posthog.tasks.calculate_cohort import calculate_cohorts, referenced_cohort_ids, schedule_cohorts
+from posthog.test.base import BaseTest
+
+
+class TestCalculateCohort(BaseTest):
+    def _create_cohort(self, minutes_ago, duration=None, groups=None):
+        return Cohort.objects.create(
+            team=self.team,
+            groups=groups or [{"properties": {"$os": "Chrome"}}],
+            last_calculation=timezone.now() - timedelta(minutes=minutes_ago),
+            last_calculation_duration=duration,
+        )
+
+    def test_referenced_cohort_ids(self):
+        self.assertEqual(
+            referenced_cohort_ids(
+                {
+                    "events": [{"id": "$pageview", "properties": [{"key": "id", "value": 1, "type": "cohort"}]}],
+                    "properties": [{"key": "id", "value": "2", "type": "cohort"}, {"key": "$os", "value": "3"}],
+                    "breakdown_type": "cohort",
+                    "breakdown": '["all", 4]',
+                }
+            ),
+            {1, 2, 4},
+        )
+        self.assertEqual(referenced_cohort_ids([{"properties": {"$os": "Chrome"}}]), set())
+
+    @patch("posthog.tasks.calculate_cohort.calculate_cohort.delay")
+    def test_calculate_cohorts_by_usage_and_cost(self, patch_calculate_cohort: MagicMock):
+        user = self._create_user("tim")
+        unused = self._create_cohort(minutes_ago=60)
+        unused_for_long = self._create_cohort(minutes_ago=2 * 24 * 60)
+        in_flag = self._create_cohort(minutes_ago=30, duration=60)
+        in_insight = self._create_cohort(minutes_ago=30, duration=2)
+        fresh = self._create_cohort(minutes_ago=5)
+        FeatureFlag.objects.create(
+            team=self.team,
+            filters={"properties": [{"key": "id", "value": in_flag.pk, "type": "cohort"}]},
+            key="flag",
+            created_by=user,
+        )
+        DashboardItem.objects.create(
+            team=self.team,
+            dashboard=Dashboard.objects.create(team=self.team),
+            filters={
+                "events": [{"id": "$pageview"}],
+                "breakdown_type": "cohort",
+                "breakdown": [fresh.pk, in_insight.pk],
+            },
+        )
+
+        calculate_cohorts()
+
+        self.assertEqual(
+            [call[0][0] for call in patch_calculate_cohort.call_args_list],
+            [unused_for_long.pk, in_insight.pk, in_flag.pk],
+        )
+        self.assertNotIn(unused.pk, [call[0][0] for call in patch_calculate_cohort.call_args_list])
+
+    def test_schedule_dependencies_first(self):
+        base = self._create_cohort(minutes_ago=30)
+        dependent = self._create_cohort(
+            minutes_ago=60, groups=[{"properties": [{"key": "id", "value": base.pk, "type": "cohort"}]}]
+        )
+        other = self._create_cohort(minutes_ago=20)
+
+        # The dependent cohort waits for the next round, after its dependency has been recalculated
+        self.assertEqual(schedule_cohorts([dependent, base, other], set(), 5), [base, other])
+        self.assertEqual(schedule_cohorts([dependent, other], {base.pk}, 5), [other])
+        self.assertEqual(schedule_cohorts([dependent, other], set(), 5), [dependent, other])
+        self.assertEqual(schedule_cohorts([dependent, base, other], set(), 1), [base])
+
+    def test_schedule_cycle(self):
+        first = self._create_cohort(minutes_ago=30)
+        second = self._create_cohort(
+            minutes_ago=30, groups=[{"properties": [{"key": "id", "value": first.pk, "type": "cohort"}]}]
+        )
+        first.groups = [{"properties": [{"key": "id", "value": second.pk, "type": "cohort"}]}]
+        first.save()
+
+        self.assertEqual(schedule_cohorts([first, second], set(), 5), [second])
+
+    @patch("posthog.tasks.calculate_cohort.calculate_cohort.delay")
+    def test_calculate_cohorts_stuck_calculating(self, patch_calculate_cohort: MagicMock):
+        def scheduled():
+            cohort_ids = [call[0][0] for call in patch_calculate_cohort.call_args_list]
+            patch_calculate_cohort.reset_mock()
+            return cohort_ids
+
+        stuck = self._create_cohort(minutes_ago=30)
+        # Last calculated long ago, but its current calculation only just started
+        calculating = self._create_cohort(minutes_ago=2 * 24 * 60)
+        Cohort.objects.filter(pk=stuck.pk).update(
+            is_calculating=True, calculation_started_at=timezone.now() - timedelta(hours=2)
+        )
+        Cohort.objects.filter(pk=calculating.pk).update(
+            is_calculating=True, calculation_started_at=timezone.now() - timedelta(minutes=5)
+        )
+        on_stuck = self._create_cohort(
+            minutes_ago=2 * 24 * 60, groups=[{"properties": [{"key": "id", "value": stuck.pk, "type": "cohort"}]}]
+        )
+        self._create_cohort(
+            minutes_ago=2 * 24 * 60, groups=[{"properties": [{"key": "id", "value": calculating.pk, "type": "cohort"}]}]
+        )
+
+        calculate_cohorts()
+        self.assertEqual(scheduled(), [stuck.pk])
+
+        # Not scheduled again while waiting for a worker
+        calculate_cohorts()
+        self.assertEqual(scheduled(), [])
+
+        Cohort.objects.filter(pk=stuck.pk).update(is_calculating=False, last_calculation=timezone.now())
+        calculate_cohorts()
+        self.assertEqual(scheduled(), [on_stuck.pk])
@@ -1,10 +1,12 @@
 from datetime import timedelta
-from typing import Any, Callable, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 from unittest.mock import patch
 from uuid import UUID
 
 from django.conf import settings
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import now
 from freezegun import freeze_time
 
@@ -20,6 +22,7 @@ from posthog.models import (
     User,
 )
 from posthog.tasks.process_event import process_event as _process_event
+from posthog.tasks.process_event import process_events_batch
 from posthog.test.base import BaseTest, TransactionBaseTest
 
 
@@ -42,7 +45,7 @@ def test_process_event_factory(
             self.team.ingested_event = True  # avoid sending `first team event ingested` to PostHog
             self.team.save()
 
-            with self.assertNumQueries(30 if settings.EE_AVAILABLE else 28):  # extra queries to check for hooks
+            with self.assertNumQueries(27 if settings.EE_AVAILABLE else 25):  # extra queries to check for hooks
                 process_event(
                     2,
                     "",
@@ -748,3 +751,70 @@ def test_process_event_factory(
 
 class TestProcessEvent(test_process_event_factory(_process_event, Event.objects.all, SessionRecordingEvent.objects.all, get_elements)):  # type: ignore
     pass
+
+
+class TestProcessEventsBatch(BaseTest):
+    def test_process_events_batch(self) -> None:
+        self.team.ingested_event = True  # avoid sending `first team event ingested` to PostHog
+        self.team.save()
+        Person.objects.create(team=self.team, distinct_ids=["existing"])
+        elements = [{"tag_name": "a", "nth_child": 1, "nth_of_type": 2, "attr__class": "btn btn-sm"}]
+
+        process_events_batch(
+            "127.0.0.1",
+            "",
+            [
+                {"distinct_id": "existing", "data": {"event": "$pageview", "properties": {"$current_url": "/a"}}},
+                {"distinct_id": "new", "data": {"event": "$autocapture", "properties": {"$elements": elements}}},
+                {"distinct_id": "new", "data": {"event": "$autocapture", "properties": {"$elements": elements}}},
+                {"distinct_id": "new", "data": {"event": "$identify", "$set": {"email": "a@posthog.com"}}},
+            ],
+            self.team.pk,
+            now().isoformat(),
+            now().isoformat(),
+        )
+
+        events = Event.objects.order_by("id")
+        self.assertEqual([event.event for event in events], ["$pageview", "$autocapture", "$autocapture", "$identify"])
+        self.assertEqual(events[0].properties["$ip"], "127.0.0.1")
+        self.assertEqual(events[1].elements_hash, events[2].elements_hash)
+        self.assertEqual(ElementGroup.objects.count(), 1)
+        self.assertEqual(Person.objects.count(), 2)
+        new_person = Person.objects.get(persondistinctid__distinct_id="new")
+        self.assertTrue(new_person.is_identified)
+        self.assertEqual(new_person.properties, {"email": "a@posthog.com"})
+
+        team = Team.objects.get()
+        self.assertEqual(team.event_names, ["$pageview", "$autocapture", "$identify"])
+        self.assertIn("$current_url", team.event_properties)
+
+    def test_team_schema_appends_only_new_keys(self) -> None:
+        self.team.ingested_event = True
+        self.team.event_names = ["$pageview"]
+        self.team.event_properties = ["$current_url"]
+        self.team.save()
+
+        def _process(event: str, properties: Dict) -> None:
+            process_events_batch(
+                "",
+                "",
+                [{"distinct_id": "1", "data": {"event": event, "properties": properties}}],
+                self.team.pk,
+                now().isoformat(),
+                now().isoformat(),
+            )
+
+        _process("$pageview", {"$current_url": "/", "$ip": ""})
+        # Meanwhile another worker discovers the same property
+        Team.objects.filter(pk=self.team.pk).update(event_properties=["$current_url", "$ip", "plan"])
+
+        _process("purchase", {"plan": "pro", "price": 10})
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.event_names, ["$pageview", "purchase"])
+        self.assertEqual(self.team.event_properties, ["$current_url", "$ip", "plan", "price"])
+        self.assertEqual(self.team.event_properties_numerical, ["price"])
+        self.assertEqual([item["key"] for item in self.team.event_properties_with_usage], ["$ip", "price"])
+
+        with CaptureQueriesContext(connection) as queries:
+            _process("purchase", {"plan": "pro", "price": 20})
+        self.assertFalse([query for query in queries.captured_queries if "UPDATE posthog_team" in query["sql"]])
@@ -3,7 +3,16 @@ from unittest.mock import patch
 from django.test import tag
 from freezegun import freeze_time
 
-from posthog.models import Action, ActionStep, Cohort, Element, Event, Person, Team
+from posthog.models import (
+    Action,
+    ActionStep,
+    Cohort,
+    CohortPeople,
+    Element,
+    Event,
+    Person,
+    Team,
+)
 from posthog.test.base import BaseTest
 
 
@@ -76,3 +85,23 @@ class TestCohort(BaseTest):
 
         cohort2.calculate_people()
         self.assertFalse(Cohort.objects.get().is_calculating)
+
+    def test_recalculating_only_writes_changes(self):
+        person1 = Person.objects.create(distinct_ids=["person1"], team=self.team, properties={"$os": "Chrome"})
+        person2 = Person.objects.create(distinct_ids=["person2"], team=self.team, properties={"$os": "Chrome"})
+        person3 = Person.objects.create(distinct_ids=["person3"], team=self.team, properties={"$os": "Safari"})
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"$os": "Chrome"}}], name="cohort1")
+        cohort.calculate_people(use_clickhouse=False)
+        self.assertCountEqual(list(cohort.people.all()), [person1, person2])
+        person1_membership = CohortPeople.objects.get(cohort=cohort, person=person1)
+
+        person2.properties = {"$os": "Safari"}
+        person2.save()
+        person3.properties = {"$os": "Chrome"}
+        person3.save()
+        cohort.calculate_people(use_clickhouse=False)
+
+        self.assertCountEqual(list(cohort.people.all()), [person1, person3])
+        # Unchanged members are kept as they were
+        self.assertEqual(CohortPeople.objects.get(cohort=cohort, person=person1).pk, person1_membership.pk)
+        self.assertIsNotNone(Cohort.objects.get(pk=cohort.pk).last_calculation_duration)
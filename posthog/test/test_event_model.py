@@ -1,8 +1,24 @@
+import threading
 from unittest.mock import call, patch
 
-from posthog.models import Action, ActionStep, Element, ElementGroup, Event, Person, Team
+from django.db import connection, transaction
+from django.http import HttpRequest
+
+from posthog.models import (
+    Action,
+    ActionStep,
+    Cohort,
+    CohortPeople,
+    Element,
+    ElementGroup,
+    Event,
+    EventHydrator,
+    Person,
+    Team,
+)
 from posthog.models.event import Selector, SelectorPart
-from posthog.test.base import BaseTest
+from posthog.tasks.calculate_action import calculate_team_actions_in_chunks
+from posthog.test.base import BaseTest, TransactionBaseTest
 
 
 def filter_by_actions_factory(_create_event, _create_person, _get_events_for_action):
@@ -490,6 +506,89 @@ class TestActions(BaseTest):
         self.assertEqual(event.actions, [])
 
 
+class TestActionMatcher(BaseTest):
+    def _action(self, name: str, **step_kwargs) -> Action:
+        action = Action.objects.create(team=self.team, name=name)
+        ActionStep.objects.create(action=action, **step_kwargs)
+        return action
+
+    def test_event_properties(self):
+        exact = self._action("exact", event="paid", properties=[{"key": "price", "value": 10}])
+        is_not = self._action("is_not", event="paid", properties=[{"key": "price", "value": 5, "operator": "is_not"}])
+        gt = self._action("gt", event="paid", properties=[{"key": "price", "value": 9, "operator": "gt"}])
+        self._action("lt", event="paid", properties=[{"key": "price", "value": 9, "operator": "lt"}])
+        icontains = self._action(
+            "icontains", event="paid", properties=[{"key": "plan", "value": "PRO", "operator": "icontains"}]
+        )
+        self._action("regex", event="paid", properties=[{"key": "plan", "value": "^pro$", "operator": "regex"}])
+        is_set = self._action("is_set", event="paid", properties=[{"key": "plan", "value": "", "operator": "is_set"}])
+        not_set = self._action(
+            "is_not_set", event="paid", properties=[{"key": "coupon", "value": "", "operator": "is_not_set"}]
+        )
+        self._action("bool", event="paid", properties=[{"key": "trial", "value": "true"}])
+
+        event = Event.objects.create(
+            team=self.team, event="paid", distinct_id="1", properties={"price": 10, "plan": "pro yearly", "trial": 1}
+        )
+        self.assertEqual(event.actions, [exact, is_not, gt, icontains, is_set, not_set])
+
+    def test_url_matching(self):
+        contains = self._action("contains", event="$pageview", url="/pricing")
+        exact = self._action("exact", event="$pageview", url="https://posthog.com/pricing", url_matching="exact")
+        regex = self._action("regex", event="$pageview", url=r"posthog\.com/pric", url_matching="regex")
+        self._action("other", event="$pageview", url="/about")
+
+        event = Event.objects.create(
+            team=self.team,
+            event="$pageview",
+            distinct_id="1",
+            properties={"$current_url": "https://posthog.com/pricing"},
+        )
+        self.assertEqual(event.actions, [contains, exact, regex])
+
+    def test_person_property_and_cohort(self):
+        person = Person.objects.create(team=self.team, distinct_ids=["1"], properties={"email": "tim@posthog.com"})
+        Person.objects.create(team=self.team, distinct_ids=["2"], properties={"email": "jane@posthog.com"})
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"email": "tim@posthog.com"}}])
+        CohortPeople.objects.create(cohort=cohort, person=person)
+        action = self._action(
+            "person",
+            event="paid",
+            properties=[{"key": "email", "value": "posthog.com", "operator": "icontains", "type": "person"}],
+        )
+        in_cohort = self._action(
+            "cohort", event="paid", properties=[{"key": "id", "value": cohort.pk, "type": "cohort"}],
+        )
+        event = Event.objects.create(team=self.team, event="paid", distinct_id="1")
+        self.assertEqual(event.actions, [action, in_cohort])
+
+        event = Event.objects.create(team=self.team, event="paid", distinct_id="2")
+        self.assertEqual(event.actions, [action])
+
+        event = Event.objects.create(team=self.team, event="paid", distinct_id="no person")
+        self.assertEqual(event.actions, [])
+
+    def test_matcher_is_cached_and_invalidated(self):
+        action = self._action("paid", event="paid")
+        event = Event.objects.create(team=self.team, event="paid", distinct_id="1")
+        self.assertEqual(event.actions, [action])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(event.actions, [action])
+
+        step = action.steps.get()
+        step.event = "refunded"
+        step.save()
+        self.assertEqual(event.actions, [])
+
+        other_action = self._action("paid again", event="paid")
+        self.assertEqual(event.actions, [other_action])
+
+        other_action.deleted = True
+        other_action.save()
+        self.assertEqual(event.actions, [])
+
+
 class TestPreCalculation(BaseTest):
     def test_update_or_delete_action_steps(self):
         user_signed_up = Event.objects.create(event="user signed up", team=self.team)
@@ -522,6 +621,57 @@ class TestPreCalculation(BaseTest):
         action.calculate_events()
         self.assertEqual([e for e in action.events.all().order_by("id")], [])
 
+    def test_calculate_events_in_chunks(self):
+        user_signed_up = Event.objects.create(event="user signed up", team=self.team)
+        Event.objects.create(event="user logged in", team=self.team)
+        user_signed_up_2 = Event.objects.create(event="user signed up", team=self.team)
+        action = Action.objects.create(team=self.team, name="signed up")
+        step = ActionStep.objects.create(action=action, event="user signed up")
+
+        action.calculate_events_in_chunks(chunk_size=1)
+        self.assertEqual([e for e in action.events.all().order_by("id")], [user_signed_up, user_signed_up_2])
+        action.refresh_from_db()
+        self.assertEqual(action.last_calculated_event_id, user_signed_up_2.pk)
+        self.assertFalse(action.is_calculating)
+
+        # only events after the checkpoint get looked at
+        step.event = "user logged in"
+        step.save()
+        user_logged_in_2 = Event.objects.create(event="user logged in", team=self.team)
+        Action.events.through.objects.filter(event_id=user_logged_in_2.pk).delete()  # as if mapped asynchronously
+        action.calculate_events_in_chunks(chunk_size=2)
+        self.assertEqual(
+            [e for e in action.events.all().order_by("id")], [user_signed_up, user_signed_up_2, user_logged_in_2]
+        )
+
+        action.calculate_events_in_chunks(recalculate_all=True, chunk_size=2)
+        self.assertEqual([e.event for e in action.events.all()], ["user logged in", "user logged in"])
+
+    def test_calculate_team_actions_in_chunks(self):
+        signed_up = Action.objects.create(team=self.team, name="signed up")
+        ActionStep.objects.create(action=signed_up, event="user signed up")
+        clicked = Action.objects.create(team=self.team, name="clicked")
+        ActionStep.objects.create(action=clicked, event="$autocapture", selector="div > button")
+        signed_up.calculate_events_in_chunks()
+        clicked.calculate_events_in_chunks()
+
+        with self.settings(ASYNC_EVENT_ACTION_MAPPING=True):
+            user_signed_up = Event.objects.create(event="user signed up", team=self.team)
+            Event.objects.create(event="user logged in", team=self.team)
+            click = Event.objects.create(
+                event="$autocapture",
+                team=self.team,
+                elements=[Element(tag_name="button", text="Sign up!"), Element(tag_name="div")],
+            )
+            Event.objects.create(event="$autocapture", team=self.team, elements=[Element(tag_name="button")])
+            Event.objects.create(event="user signed up", team=Team.objects.create())
+
+        calculate_team_actions_in_chunks(self.team.pk, chunk_size=2, batch_size=1)
+        self.assertEqual([e for e in signed_up.events.all()], [user_signed_up])
+        self.assertEqual([e for e in clicked.events.all()], [click])
+        signed_up.refresh_from_db()
+        self.assertEqual(signed_up.last_calculated_event_id, Event.objects.latest("id").pk)
+
     def test_empty(self):
         Person.objects.create(team=self.team, distinct_ids=["person1"], properties={"$browser": "Chrome"})
         action = Action.objects.create(name="pageview", team=self.team)
@@ -532,6 +682,62 @@ class TestPreCalculation(BaseTest):
         self.assertEqual(action.events.count(), 0)
 
 
+class TestPreCalculationLocking(TransactionBaseTest):
+    def _hold_lock(self, action: Action, release: threading.Event) -> threading.Thread:
+        """Lock the action's row from another connection, as a worker calculating the action would, until release."""
+        locked = threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(Action.objects.select_for_update().filter(pk=action.pk))
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait(5)
+        return thread
+
+    def test_calculate_events_in_chunks_while_locked(self):
+        Event.objects.create(event="user signed up", team=self.team)
+        action = Action.objects.create(team=self.team, name="signed up", is_calculating=True)
+        ActionStep.objects.create(action=action, event="user signed up")
+
+        release = threading.Event()
+        thread = self._hold_lock(action, release)
+        threading.Timer(0.5, release.set).start()
+        action.calculate_events_in_chunks()
+        thread.join()
+
+        action.refresh_from_db()
+        self.assertEqual(action.events.count(), 0)
+        self.assertIsNone(action.last_calculated_event_id)
+        self.assertFalse(action.is_calculating)
+
+    def test_recalculate_all_waits_for_lock(self):
+        Event.objects.create(event="user signed up", team=self.team)
+        user_logged_in = Event.objects.create(event="user logged in", team=self.team)
+        action = Action.objects.create(team=self.team, name="signed up")
+        step = ActionStep.objects.create(action=action, event="user signed up")
+        action.calculate_events_in_chunks()
+        step.event = "user logged in"
+        step.save()
+
+        release = threading.Event()
+        thread = self._hold_lock(action, release)
+        threading.Timer(0.5, release.set).start()
+        action.calculate_events_in_chunks(recalculate_all=True)
+        thread.join()
+
+        action.refresh_from_db()
+        self.assertEqual([e for e in action.events.all()], [user_logged_in])
+        self.assertEqual(action.last_calculated_event_id, user_logged_in.pk)
+        self.assertFalse(action.is_calculating)
+
+
 class TestSendToSlack(BaseTest):
     @patch("celery.current_app.send_task")
     def test_send_to_slack(self, patch_post_to_slack):
@@ -657,3 +863,39 @@ class TestSelectors(BaseTest):
         self.assertEqual(selector1.parts[1].data, {"tag_name": "div"})
         self.assertEqual(selector1.parts[1].direct_descendant, False)
         self.assertEqual(selector1.parts[1].unique_order, 1)
+
+
+class TestEventHydrator(BaseTest):
+    def test_hydrates_persons_and_elements_once(self):
+        person = Person.objects.create(team=self.team, distinct_ids=["1", "2"], properties={"email": "a@b.com"})
+        Person.objects.create(team=self.team, distinct_ids=["3"])
+        Person.objects.create(team=Team.objects.create(), distinct_ids=["4"])
+        group = ElementGroup.objects.create(
+            team=self.team, elements=[Element(tag_name="a"), Element(tag_name="button")]
+        )
+
+        hydrator = EventHydrator(self.team.pk)
+        with self.assertNumQueries(1):
+            persons = hydrator.get_persons(["1", "2", "4", "unknown"])
+        self.assertEqual(persons, {"1": person, "2": person})
+        self.assertIs(persons["1"], persons["2"])
+        with self.assertNumQueries(0):
+            hydrator.get_persons(["1", "unknown"])
+        with self.assertNumQueries(1):
+            self.assertEqual(set(hydrator.get_persons(["2", "3"])), {"2", "3"})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(hydrator.get_person("1", with_distinct_ids=True).distinct_ids, ["1", "2"])
+
+        with self.assertNumQueries(1):
+            elements = hydrator.get_elements([group.hash, "unknown", None])
+        self.assertEqual([element.tag_name for element in elements[group.hash]], ["a", "button"])
+        with self.assertNumQueries(0):
+            hydrator.get_elements([group.hash])
+
+    def test_for_request(self):
+        request = HttpRequest()
+        self.assertIs(
+            EventHydrator.for_request(request, self.team.pk), EventHydrator.for_request(request, self.team.pk)
+        )
+        self.assertIsNot(EventHydrator.for_request(request, self.team.pk), EventHydrator.for_request(HttpRequest(), 1))
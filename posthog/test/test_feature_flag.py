@@ -1,4 +1,5 @@
 from posthog.models import Cohort, FeatureFlag, Person
+from posthog.models.feature_flag_matcher import FeatureFlagMatcher
 from posthog.test.base import BaseTest
 
 
@@ -74,3 +75,60 @@ class TestFeatureFlag(BaseTest):
 
         self.assertTrue(feature_flag.distinct_id_matches("example_id"))
         self.assertFalse(feature_flag.distinct_id_matches("another_id"))
+
+    def test_matcher(self):
+        user = self._create_user("tim")
+        person = Person.objects.create(
+            team=self.team, distinct_ids=["example_id"], properties={"email": "tim@posthog.com", "age": 30}
+        )
+        Person.objects.create(team=self.team, distinct_ids=["another_id"], properties={"email": "example@example.com"})
+        cohort = Cohort.objects.create(team=self.team, groups=[{"properties": {"age": 30}}], name="cohort1")
+        cohort.people.add(person)
+        flags = [
+            FeatureFlag.objects.create(
+                team=self.team,
+                filters={"properties": [{"key": "email", "value": "posthog", "operator": "icontains"}]},
+                name="Contains",
+                key="contains",
+                created_by=user,
+            ),
+            FeatureFlag.objects.create(
+                team=self.team,
+                filters={"properties": [{"key": "age", "value": "25", "operator": "gt", "type": "person"}]},
+                name="Greater than",
+                key="greater-than",
+                created_by=user,
+            ),
+            FeatureFlag.objects.create(
+                team=self.team,
+                filters={"properties": [{"key": "id", "value": cohort.pk, "type": "cohort"}]},
+                name="Cohort",
+                key="cohort",
+                created_by=user,
+            ),
+            FeatureFlag.objects.create(
+                team=self.team,
+                filters={"properties": [{"key": "email", "value": "posthog", "operator": "not_icontains"}]},
+                name="Doesn't contain",
+                key="not-contains",
+                created_by=user,
+            ),
+            FeatureFlag.objects.create(
+                team=self.team, rollout_percentage=50, name="Beta feature", key="beta-feature", created_by=user,
+            ),
+        ]
+        matcher = FeatureFlagMatcher(self.team.pk, flags)
+
+        # The person and their cohorts, however many flags there are
+        with self.assertNumQueries(2):
+            self.assertEqual(
+                matcher.get_active_flags("example_id"), ["contains", "greater-than", "cohort", "beta-feature"]
+            )
+        self.assertEqual(matcher.get_active_flags("another_id"), ["not-contains"])
+        self.assertEqual(matcher.get_active_flags("no_person"), ["beta-feature"])
+        # Same as filtering persons in Postgres
+        for flag in flags[:4]:
+            for distinct_id in ["example_id", "another_id", "no_person"]:
+                self.assertEqual(
+                    flag.key in matcher.get_active_flags(distinct_id), flag._match_distinct_id(distinct_id)
+                )
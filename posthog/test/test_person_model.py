@@ -2,7 +2,7 @@ import datetime
 
 import pytz
 
-from posthog.models import Action, ActionStep, Cohort, Event, Person
+from posthog.models import Action, ActionStep, Cohort, Event, Person, Team
 from posthog.test.base import BaseTest
 
 
@@ -50,3 +50,22 @@ class TestPerson(BaseTest):
         person_anonymous = Person.objects.create(team=self.team)
         self.assertEqual(person_identified.is_identified, True)
         self.assertEqual(person_anonymous.is_identified, False)
+
+    def test_get_or_create_for_distinct_ids(self):
+        other_team = Team.objects.create(organization=self.organization)
+        existing = Person.objects.create(team=self.team, distinct_ids=["existing", "alias"])
+
+        with self.assertNumQueries(1):
+            people = Person.objects.get_or_create_for_distinct_ids(
+                [(self.team.pk, "existing"), (self.team.pk, "alias")]
+            )
+        self.assertEqual(people, {(self.team.pk, "existing"): existing, (self.team.pk, "alias"): existing})
+
+        people = Person.objects.get_or_create_for_distinct_ids(
+            [(self.team.pk, "existing"), (self.team.pk, "new"), (other_team.pk, "existing")]
+        )
+        self.assertEqual(people[(self.team.pk, "existing")], existing)
+        self.assertEqual(people[(self.team.pk, "new")].distinct_ids, ["new"])
+        self.assertEqual(people[(other_team.pk, "existing")].team_id, other_team.pk)
+        self.assertNotEqual(people[(other_team.pk, "existing")], existing)
+        self.assertEqual(Person.objects.count(), 3)
@@ -313,6 +313,8 @@ urlpatterns = [
     path("shared_dashboard/<str:share_token>", dashboard.shared_dashboard),
     re_path(r"^demo.*", decorators.login_required(demo)),
     # ingestion
+    opt_slash_path("decide/batch", decide.get_decide_batch),
+    opt_slash_path("decide/flag_definitions", decide.get_flag_definitions),
     opt_slash_path("decide", decide.get_decide),
     opt_slash_path("e", capture.get_event),
     opt_slash_path("engage", capture.get_event),
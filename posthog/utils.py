@@ -1,14 +1,28 @@
 import base64
+import csv
 import datetime
 import gzip
 import hashlib
+import itertools
 import json
 import os
 import re
 import subprocess
 import time
 import uuid
-from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from urllib.parse import urljoin, urlparse
 
 import lzstring
@@ -17,7 +31,7 @@ from dateutil import parser
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 from django.db.utils import DatabaseError
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.template.loader import get_template
 from django.utils import timezone
 from rest_framework.exceptions import APIException
@@ -279,6 +293,38 @@ def cors_response(request, response):
     return response
 
 
+T = TypeVar("T")
+
+
+def batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Echo:
+    """File-like object returning what is written to it, so csv.writer hands us each formatted row."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def streaming_csv_response(
+    header: Sequence[str], rows: Iterable[Sequence[Any]], filename: str
+) -> StreamingHttpResponse:
+    """Write rows as CSV while they are being read, without keeping them in memory."""
+    writer = csv.writer(_Echo())
+    content = (writer.writerow(row) for row in itertools.chain([header], rows))
+    response = StreamingHttpResponse(content, content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
+    return response
+
+
 def generate_cache_key(stringified: str) -> str:
     return "cache_" + hashlib.md5(stringified.encode("utf-8")).hexdigest()
 